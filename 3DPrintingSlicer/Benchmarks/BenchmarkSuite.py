@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from GCode.GCodeGenerator import GCodeGenerator
+from LayerSlicing.ZSlicer import ZSlicer
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STL_DIR = os.path.join(ROOT_DIR, "STLFiles")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+MODELS = [
+    "20mm_cube.stl",
+    "LowPolyBenchy.stl",
+    "OLD_VERSION_READ_DESCRIPTION_pikachu_1gen_flowalistik.STL",
+    "mini_mjolnir.stl",
+]
+LAYER_HEIGHTS = [1.0, 0.5]
+WALL_COUNTS = [2, 4]
+LINE_WIDTH = 0.5
+
+STAGES = ["load", "slice", "perimeter", "infill", "gcode"]
+
+
+def measure(fn, repeat=1):
+    # best wall time over `repeat` plain runs, then one extra traced run for peak memory
+    best_time = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best_time = min(best_time, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, best_time, peak
+
+
+class BenchmarkSuite:
+    def __init__(self, models=None, layer_heights=None, wall_counts=None,
+                 line_width=LINE_WIDTH, repeat=1):
+        self.models = models if models else MODELS
+        self.layer_heights = layer_heights if layer_heights else LAYER_HEIGHTS
+        self.wall_counts = wall_counts if wall_counts else WALL_COUNTS
+        self.line_width = line_width
+        self.repeat = repeat
+
+    def case_name(self, model, layer_height, wall_count):
+        return f"{os.path.basename(model)}|h={layer_height}|walls={wall_count}"
+
+    def run_case(self, file_name, layer_height, wall_count, specify_height=True):
+        results = {}
+        z_slicer = ZSlicer()
+
+        def load():
+            z_slicer.load_stl(file_name)
+            return z_slicer
+
+        _, t, peak = measure(load, self.repeat)
+        results["load"] = {"time_s": t, "peak_bytes": peak,
+                           "output": {"vertices": int(len(z_slicer.vertices)),
+                                      "faces": int(len(z_slicer.faces))}}
+
+        z_range = z_slicer.compute_z_range(specify_height, layer_height)
+        if z_range is None:
+            return None
+
+        def slice_layers():
+            z_slicer.slice_layers(z_range)
+            return z_slicer.get_slices()
+
+        slices, t, peak = measure(slice_layers, self.repeat)
+        results["slice"] = {"time_s": t, "peak_bytes": peak,
+                            "output": {"layers": len(slices),
+                                       "contour_edges": int(sum(len(s.edges) for s in slices))}}
+
+        perimeter_results, t, peak = measure(
+            lambda: z_slicer.generate_perimeters(self.line_width, wall_count), self.repeat)
+        results["perimeter"] = {"time_s": t, "peak_bytes": peak,
+                                "output": {"perimeters": int(sum(len(p) for _, p in perimeter_results)),
+                                           "perimeter_vertices": int(sum(len(poly.exterior.coords)
+                                                                         for _, p in perimeter_results
+                                                                         for poly in p))}}
+
+        def infill():
+            z_slicer.generate_infill(perimeter_results, self.line_width, wall_count)
+            return z_slicer.infill_slices
+
+        infill_slices, t, peak = measure(infill, self.repeat)
+        results["infill"] = {"time_s": t, "peak_bytes": peak,
+                             "output": {"infill_edges": int(sum(len(s.infill_edges) for s in infill_slices))}}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, "benchmark.gcode")
+            _, t, peak = measure(
+                lambda: GCodeGenerator(infill_slices).generate_gcode(output_file), self.repeat)
+            results["gcode"] = {"time_s": t, "peak_bytes": peak,
+                                "output": {"gcode_bytes": os.path.getsize(output_file)}}
+
+        return results
+
+    def run(self, verbose=True):
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "line_width": self.line_width,
+                "repeat": self.repeat,
+            },
+            "cases": {},
+        }
+
+        for model in self.models:
+            file_name = model if os.path.isabs(model) else os.path.join(STL_DIR, model)
+            for layer_height in self.layer_heights:
+                for wall_count in self.wall_counts:
+                    name = self.case_name(model, layer_height, wall_count)
+                    results = self.run_case(file_name, layer_height, wall_count)
+                    if results is None:
+                        print(f"Skipping {name}: invalid layer height.")
+                        continue
+                    report["cases"][name] = results
+                    if verbose:
+                        print_case(name, results)
+
+        return report
+
+
+def print_case(name, results):
+    print(name)
+    for stage in STAGES:
+        stage_result = results[stage]
+        outputs = ", ".join(f"{k}={v}" for k, v in stage_result["output"].items())
+        print(f"  {stage:<10} {stage_result['time_s'] * 1000:10.2f} ms "
+              f"{stage_result['peak_bytes'] / 1024:10.1f} KiB  {outputs}")
+
+
+def compare_reports(baseline, current, threshold=0.25, min_time_delta=0.005, min_memory_delta=64 * 1024):
+    # returns a list of human readable regressions, empty if everything is within the threshold
+    regressions = []
+
+    for name, stages in current["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        for stage, result in stages.items():
+            old = baseline["cases"][name].get(stage)
+            if old is None:
+                continue
+
+            old_time, new_time = old["time_s"], result["time_s"]
+            if new_time > old_time * (1 + threshold) and new_time - old_time > min_time_delta:
+                regressions.append(f"{name} [{stage}] time {old_time * 1000:.2f} ms -> {new_time * 1000:.2f} ms")
+
+            old_peak, new_peak = old["peak_bytes"], result["peak_bytes"]
+            if new_peak > old_peak * (1 + threshold) and new_peak - old_peak > min_memory_delta:
+                regressions.append(f"{name} [{stage}] peak memory {old_peak / 1024:.1f} KiB -> {new_peak / 1024:.1f} KiB")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the slicing pipeline over the bundled STL files.")
+    parser.add_argument("--models", nargs="*", help="STL files to benchmark (default: bundled STLFiles)")
+    parser.add_argument("--layer-heights", nargs="*", type=float, help="Layer heights in mm")
+    parser.add_argument("--wall-counts", nargs="*", type=int, help="Wall counts")
+    parser.add_argument("--line-width", type=float, default=LINE_WIDTH)
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per stage, best is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative regression before failing (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    suite = BenchmarkSuite(args.models, args.layer_heights, args.wall_counts,
+                           args.line_width, args.repeat)
+    report = suite.run()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first.")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = compare_reports(baseline, report, args.threshold)
+    if regressions:
+        print("Performance regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
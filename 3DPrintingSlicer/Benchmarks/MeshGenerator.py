@@ -0,0 +1,317 @@
+import argparse
+import os
+import struct
+
+import numpy as np
+
+
+# Every generator yields chunks of triangles as (k, 3, 3) float32 arrays so that
+# meshes with 1e7 triangles can be streamed to disk without holding them in memory.
+
+CHUNK_TRIANGLES = 1 << 20
+
+
+def stitch_rings(rings_a, rings_b):
+    # rings_a, rings_b: (k, n, 3) closed loops, returns the (2kn, 3, 3) band between them
+    next_a = np.roll(rings_a, -1, axis=1)
+    next_b = np.roll(rings_b, -1, axis=1)
+    first = np.stack([rings_a, next_a, next_b], axis=2)
+    second = np.stack([rings_a, next_b, rings_b], axis=2)
+    return np.concatenate([first, second], axis=1).reshape(-1, 3, 3)
+
+
+def fan(ring, apex, reverse=False):
+    # closes a ring of shape (n, 3) with triangles to a single apex point
+    n = len(ring)
+    apex = np.broadcast_to(np.asarray(apex, dtype=np.float32), (n, 3))
+    next_ring = np.roll(ring, -1, axis=0)
+    if reverse:
+        return np.stack([ring, apex, next_ring], axis=1)
+    return np.stack([ring, next_ring, apex], axis=1)
+
+
+def banded(rings, wrap=False):
+    # stitches consecutive rings of an (m, n, 3) array, a few hundred rings at a time
+    m, n = rings.shape[:2]
+    last = m if wrap else m - 1
+    step = max(1, CHUNK_TRIANGLES // (2 * n))
+    for start in range(0, last, step):
+        stop = min(start + step, last)
+        idx = np.arange(start, stop)
+        yield stitch_rings(rings[idx], rings[(idx + 1) % m])
+
+
+def sphere(triangles=1000, radius=10.0):
+    # UV sphere with pole fans, roughly 4 * n_lat^2 triangles
+    n_lat = max(3, int(round(np.sqrt(triangles / 4))))
+    n_lon = 2 * n_lat
+
+    theta = np.linspace(0, np.pi, n_lat + 1)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, n_lon, endpoint=False)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    rings = radius * np.stack([np.sin(t) * np.cos(p),
+                               np.sin(t) * np.sin(p),
+                               np.cos(t) + 1.0], axis=-1).astype(np.float32)
+
+    yield fan(rings[0], (0, 0, 2 * radius))
+    yield from banded(rings[::-1])
+    yield fan(rings[-1], (0, 0, 0), reverse=True)
+
+
+def torus(triangles=1000, major_radius=15.0, minor_radius=5.0):
+    # torus lying flat on the bed, 2 * n_u * n_v triangles with n_u = 3 * n_v
+    n_v = max(3, int(round(np.sqrt(triangles / 6))))
+    n_u = 3 * n_v
+
+    u = np.linspace(0, 2 * np.pi, n_u, endpoint=False)
+    v = np.linspace(0, 2 * np.pi, n_v, endpoint=False)
+    uu, vv = np.meshgrid(u, v, indexing="ij")
+    r = major_radius + minor_radius * np.cos(vv)
+    rings = np.stack([r * np.cos(uu), r * np.sin(uu),
+                      minor_radius * (1.0 - np.sin(vv))], axis=-1).astype(np.float32)
+
+    yield from banded(rings, wrap=True)
+
+
+def tower(triangles=1000, radius=2.0, height=100.0):
+    # tall cylinder, the number of rings grows with the triangle count to stress layer count
+    n_around = max(8, int(round(np.sqrt(triangles / 20))))
+    n_rings = max(2, int(round(triangles / (2 * n_around))))
+
+    phi = np.linspace(0, 2 * np.pi, n_around, endpoint=False)
+    z = np.linspace(0, height, n_rings)
+    zz, pp = np.meshgrid(z, phi, indexing="ij")
+    rings = np.stack([radius * np.cos(pp), radius * np.sin(pp), zz], axis=-1).astype(np.float32)
+
+    yield fan(rings[0], (0, 0, 0), reverse=True)
+    yield from banded(rings)
+    yield fan(rings[-1], (0, 0, height))
+
+
+def square_ring(cx, cy, half, n):
+    # n points (n divisible by 4) going counter clockwise around a square, starting at angle 0
+    side = n // 4
+    t = np.arange(side) / side * 2 - 1
+    right = np.column_stack([np.ones(side), t])
+    top = np.column_stack([-t, np.ones(side)])
+    left = np.column_stack([-np.ones(side), -t])
+    bottom = np.column_stack([t, -np.ones(side)])
+    # rotate so the first point sits at angle 0 like the circle
+    pts = np.roll(np.concatenate([right, top, left, bottom]), -(side // 2), axis=0)
+    return np.column_stack([cx + half * pts[:, 0], cy + half * pts[:, 1]])
+
+
+def perforated_plates(triangles=1000, plates=3, cell=4.0, hole_ratio=0.6, thickness=1.0, gap=1.0):
+    # stack of separate plates, each a grid of cells with one round hole per cell
+    n = 16
+    per_cell = 8 * n  # top, bottom, hole wall bands
+    cells = max(1, int(round(np.sqrt(triangles / (plates * per_cell)))))
+
+    half = cell / 2
+    circle = np.column_stack([np.cos(np.linspace(0, 2 * np.pi, n, endpoint=False)),
+                              np.sin(np.linspace(0, 2 * np.pi, n, endpoint=False))])
+
+    centers = (np.arange(cells) + 0.5) * cell
+    cx, cy = [c.ravel() for c in np.meshgrid(centers, centers, indexing="ij")]
+    squares = np.stack([square_ring(x, y, half, n) for x, y in zip(cx, cy)])  # (c, n, 2)
+    holes = np.stack([cx[:, None] + hole_ratio * half * circle[:, 0],
+                      cy[:, None] + hole_ratio * half * circle[:, 1]], axis=-1)  # (c, n, 2)
+
+    def lift(xy, z):
+        return np.concatenate([xy, np.full(xy.shape[:-1] + (1,), z)], axis=-1).astype(np.float32)
+
+    # outer walls reuse the sample points of the boundary cells so there are no T-junctions
+    size = cells * cell
+    starts = squares.reshape(-1, 2)
+    ends = np.roll(squares, -1, axis=1).reshape(-1, 2)
+    on_outline = np.zeros(len(starts), dtype=bool)
+    for axis in range(2):
+        for value in (0.0, size):
+            on_outline |= np.isclose(starts[:, axis], value) & np.isclose(ends[:, axis], value)
+    starts, ends = starts[on_outline], ends[on_outline]
+
+    for plate in range(plates):
+        z0 = plate * (thickness + gap)
+        z1 = z0 + thickness
+        yield stitch_rings(lift(squares, z1), lift(holes, z1))
+        yield stitch_rings(lift(holes, z0), lift(squares, z0))
+        yield stitch_rings(lift(holes, z1), lift(holes, z0))
+        a0, b0, a1, b1 = lift(starts, z0), lift(ends, z0), lift(starts, z1), lift(ends, z1)
+        yield np.concatenate([np.stack([a0, b0, b1], axis=1), np.stack([a0, b1, a1], axis=1)])
+
+
+def gyroid_field(x, y, z):
+    return np.sin(x) * np.cos(y) + np.sin(y) * np.cos(z) + np.sin(z) * np.cos(x)
+
+
+# cube corners and the six tetrahedra sharing the 0-6 diagonal
+CUBE_CORNERS = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                         [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]])
+CUBE_TETS = np.array([[0, 5, 1, 6], [0, 1, 2, 6], [0, 2, 3, 6],
+                      [0, 3, 7, 6], [0, 7, 4, 6], [0, 4, 5, 6]])
+
+
+def marching_tetrahedra(values, points, iso=0.0):
+    # values: (t, 4), points: (t, 4, 3) -> triangles of the iso surface, oriented outwards
+    inside = values < iso
+    count = inside.sum(axis=1)
+
+    def interp(a, b, rows):
+        va, vb = values[rows, a], values[rows, b]
+        t = ((iso - va) / np.where(vb == va, 1, vb - va))[:, None]
+        return points[rows, a] + t * (points[rows, b] - points[rows, a])
+
+    triangles = []
+    rows = []
+
+    # one vertex differs from the other three: a single triangle
+    single = np.flatnonzero((count == 1) | (count == 3))
+    if len(single):
+        lone_inside = count[single] == 1
+        order = np.argsort(inside[single] != lone_inside[:, None], axis=1, kind="stable")
+        a, b, c, d = order.T
+        triangles.append(np.stack([interp(a, b, single), interp(a, c, single), interp(a, d, single)], axis=1))
+        rows.append(single)
+
+    # two inside, two outside: a quad split into two triangles
+    double = np.flatnonzero(count == 2)
+    if len(double):
+        order = np.argsort(~inside[double], axis=1, kind="stable")
+        a, b, c, d = order.T
+        ac, ad = interp(a, c, double), interp(a, d, double)
+        bc, bd = interp(b, c, double), interp(b, d, double)
+        triangles.append(np.stack([ac, ad, bd], axis=1))
+        triangles.append(np.stack([ac, bd, bc], axis=1))
+        rows.extend([double, double])
+
+    if not triangles:
+        return np.empty((0, 3, 3), dtype=np.float32)
+
+    triangles = np.concatenate(triangles)
+    rows = np.concatenate(rows)
+
+    # flip triangles whose normal points from the outside corners towards the inside ones
+    weight = inside[rows, :, None].astype(points.dtype)
+    inside_mean = (points[rows] * weight).sum(axis=1) / weight.sum(axis=1)
+    outside_mean = (points[rows] * (1 - weight)).sum(axis=1) / (1 - weight).sum(axis=1)
+    normal = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    flip = np.einsum("ij,ij->i", normal, outside_mean - inside_mean) < 0
+    triangles[flip] = triangles[flip][:, [0, 2, 1]]
+    return triangles.astype(np.float32)
+
+
+def gyroid_lattice_slabs(periods, samples_per_period=8, thickness=0.6):
+    # solid gyroid sheet inside a cube of `periods` periods, closed against the box walls
+    res = periods * samples_per_period + 1
+    axis = np.linspace(0, 2 * np.pi * periods, res)
+    step = axis[1] - axis[0]
+
+    x, y = np.meshgrid(axis, axis, indexing="ij")
+    corner_offsets = CUBE_CORNERS[CUBE_TETS]  # (6, 4, 3)
+
+    def field(k):
+        z = np.full_like(x, axis[k])
+        values = np.abs(gyroid_field(x, y, z)) - thickness
+        # force the outside of the box to be empty so the surface is closed
+        values = np.pad(values, 1, constant_values=1.0)
+        return values
+
+    # the planes below and above the box are empty as well
+    previous = field(0)
+    yield from _gyroid_layer(np.ones_like(previous), previous, -1, axis, step, corner_offsets)
+    for k in range(1, res):
+        current = field(k)
+        yield from _gyroid_layer(previous, current, k - 1, axis, step, corner_offsets)
+        previous = current
+    yield from _gyroid_layer(previous, np.ones_like(previous), res - 1, axis, step, corner_offsets)
+
+
+def _gyroid_layer(lower, upper, k, axis, step, corner_offsets):
+    # marching tetrahedra over one slab of cubes between two padded z planes
+    values = np.stack([lower, upper], axis=-1)  # (nx, ny, 2)
+    nx, ny = values.shape[0] - 1, values.shape[1] - 1
+    ix, iy = np.meshgrid(np.arange(nx), np.arange(ny), indexing="ij")
+    ix, iy = ix.ravel(), iy.ravel()
+
+    # only cubes with a sign change contain surface
+    corner_values = values[ix[:, None] + CUBE_CORNERS[:, 0], iy[:, None] + CUBE_CORNERS[:, 1], CUBE_CORNERS[:, 2]]
+    inside = corner_values < 0
+    active = inside.any(axis=1) & ~inside.all(axis=1)
+    ix, iy, corner_values = ix[active], iy[active], corner_values[active]
+    if len(ix) == 0:
+        return
+
+    origin = np.column_stack([(ix - 1) * step + axis[0], (iy - 1) * step + axis[0],
+                              np.full(len(ix), k * step + axis[0])])
+    tet_values = corner_values[:, CUBE_TETS].reshape(-1, 4)
+    tet_points = (origin[:, None, None, :] + corner_offsets[None] * step).reshape(-1, 4, 3)
+    yield marching_tetrahedra(tet_values, tet_points)
+
+
+def gyroid_lattice(triangles=1000, samples_per_period=8):
+    # calibrate on a single period: triangles grow with samples^2 inside one period
+    # and with periods^3 once the lattice gets bigger
+    base_count = sum(len(chunk) for chunk in gyroid_lattice_slabs(1, samples_per_period))
+
+    periods = max(1, int((triangles / base_count) ** (1 / 3)))
+    samples = max(3, int(round(samples_per_period * np.sqrt(triangles / (base_count * periods ** 3)))))
+    yield from gyroid_lattice_slabs(periods, samples)
+
+
+SHAPES = {
+    "sphere": sphere,
+    "torus": torus,
+    "gyroid": gyroid_lattice,
+    "plates": perforated_plates,
+    "tower": tower,
+}
+
+
+def write_binary_stl(file_name, chunks, header=b"3DPrintingSlicer synthetic mesh"):
+    # streams triangle chunks to a binary STL and patches the triangle count at the end
+    record = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")])
+    total = 0
+
+    with open(file_name, "wb") as f:
+        f.write(header[:80].ljust(80, b" "))
+        f.write(struct.pack("<I", 0))
+
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            normals = np.cross(chunk[:, 1] - chunk[:, 0], chunk[:, 2] - chunk[:, 0])
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            normals = normals / np.where(lengths == 0, 1, lengths)
+
+            data = np.zeros(len(chunk), dtype=record)
+            data["normal"] = normals
+            data["vertices"] = chunk
+            f.write(data.tobytes())
+            total += len(chunk)
+
+        f.seek(80)
+        f.write(struct.pack("<I", total))
+
+    return total
+
+
+def generate(shape, triangles, file_name):
+    if shape not in SHAPES:
+        print(f"Unknown shape {shape}, expected one of {', '.join(SHAPES)}.")
+        return 0
+    return write_binary_stl(file_name, SHAPES[shape](triangles))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate parametric binary STL meshes for scaling benchmarks.")
+    parser.add_argument("shape", choices=sorted(SHAPES))
+    parser.add_argument("triangles", type=float, help="Approximate triangle count, e.g. 1e5")
+    parser.add_argument("output", help="Output .stl file")
+    args = parser.parse_args(argv)
+
+    total = generate(args.shape, int(args.triangles), args.output)
+    print(f"Wrote {total} triangles to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+from GCode.GCodeColumns import GCodeColumns
+from GCode.MachineState import MachineState
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GCODE = os.path.join(ROOT_DIR, "GCodeFiles",
+                             "OLD_VERSION_READ_DESCRIPTION_pikachu_1gen_flowalistik_0.25mm_ASA_Generic Klipper Printer_52m8s.gcode")
+
+
+class LegacyGCodeOp:
+    # The original GCodeOp, kept here as the "before" of the comparison: a dict of bound methods and a
+    # numpy end position per instance, arguments parsed from their strings on every execute.
+    def __init__(self, cmd, args):
+        self.cmd = cmd
+        self.args = args
+        self.isMoving = False
+        self.end_pos = np.zeros(3)
+        self.next_filament_height = 0
+        self.next_is_absolute = True
+        self.reset_pos = None
+        self.next_feedrate = 0
+
+        self.cmds = {
+            'G0': self.handle_g0,
+            'G1': self.handle_g1,
+            'G90': self.handle_g90,
+            'G91': self.handle_g91,
+            'G92': self.handle_g92,
+        }
+
+    def execute(self, current_state):
+        self.next_is_absolute = current_state.is_absolute
+        self.next_feedrate = current_state.current_feedrate
+        self.next_filament_height = current_state.filament_height
+        self.end_pos = np.copy(current_state.actual_position)
+
+        if self.cmd in self.cmds:
+            self.cmds[self.cmd]()
+
+    def handle_g0(self):
+        self.handle_g1()
+
+    def handle_g1(self):
+        self.isMoving = True
+        for param in self.args:
+            if param[0] == 'X':
+                self.end_pos[0] = float(param[1:])
+            if param[0] == 'Y':
+                self.end_pos[1] = float(param[1:])
+            if param[0] == 'Z':
+                self.end_pos[2] = float(param[1:])
+            if param[0] == 'F':
+                self.next_feedrate = float(param[1:])
+            if param[0] == 'E':
+                self.next_filament_height = float(param[1:])
+
+    def handle_g90(self):
+        self.next_is_absolute = True
+
+    def handle_g91(self):
+        self.next_is_absolute = False
+
+    def handle_g92(self):
+        for param in self.args:
+            if param[0] == 'E':
+                self.next_filament_height = float(param[1:])
+
+
+class LegacyState:
+    # the original evaluator's state and stepping, numpy positions
+    def __init__(self):
+        self.expected_position = np.zeros(3)
+        self.actual_position = np.zeros(3)
+        self.current_feedrate = 0
+        self.filament_height = 0
+        self.is_absolute = True
+
+    def execute(self, operation):
+        operation.execute(self)
+        self.is_absolute = operation.next_is_absolute
+        self.current_feedrate = operation.next_feedrate
+        self.filament_height = operation.next_filament_height
+        if operation.isMoving:
+            self.actual_position += operation.end_pos - self.expected_position
+            self.expected_position = operation.end_pos
+
+
+def legacy_operations(lines):
+    # the original parser loop: one LegacyGCodeOp per G line with arguments
+    operations = []
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('G'):
+            continue
+        parts = line.split(';')[0].split()
+        if len(parts) < 2:
+            continue
+        operations.append(LegacyGCodeOp(parts[0], parts[1:]))
+    return operations
+
+
+def slotted_operations(columns):
+    return [columns.operation(index) for index in range(len(columns))]
+
+
+def measure_operations(build, state):
+    # bytes held per op once built and once every op has been executed
+    tracemalloc.start()
+    try:
+        operations = build()
+        built, _ = tracemalloc.get_traced_memory()
+        for operation in operations:
+            state.execute(operation)
+        executed, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(operations), built / len(operations), executed / len(operations), state.actual_position
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory per G-code operation object, original against slotted GCodeOp.")
+    parser.add_argument("gcode_file", nargs="?", default=DEFAULT_GCODE)
+    args = parser.parse_args(argv)
+
+    with open(args.gcode_file, 'r') as f:
+        lines = f.readlines()
+    with open(args.gcode_file, 'rb') as f:
+        columns = GCodeColumns.from_bytes(f.read())
+
+    count, legacy_built, legacy_executed, legacy_end = measure_operations(lambda: legacy_operations(lines), LegacyState())
+    _, slotted_built, slotted_executed, slotted_end = measure_operations(lambda: slotted_operations(columns), MachineState())
+    column_bytes = sum(array.nbytes for array in columns.to_arrays().values()) / len(columns)
+
+    print(f"{os.path.basename(args.gcode_file)}: {count} operations")
+    print(f"  original GCodeOp  {legacy_built:8.0f} bytes/op built  {legacy_executed:8.0f} bytes/op executed")
+    print(f"  slotted GCodeOp   {slotted_built:8.0f} bytes/op built  {slotted_executed:8.0f} bytes/op executed")
+    print(f"  {legacy_executed / slotted_executed:.1f}x less per executed op; the parsed columns themselves take "
+          f"{column_bytes:.0f} bytes/op")
+    if not np.allclose(legacy_end, slotted_end):
+        print(f"  final positions differ: {legacy_end} against {slotted_end}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from Benchmarks.BenchmarkSuite import BenchmarkSuite, STAGES
+from Benchmarks.MeshGenerator import SHAPES, generate
+
+
+DEFAULT_SIZES = [1e3, 3e3, 1e4]
+DEFAULT_LAYERS = [10, 20, 40, 80]
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scaling")
+
+
+def fit_exponent(xs, ys):
+    # slope of the log-log fit, i.e. the k in O(n^k)
+    xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+    valid = (xs > 0) & (ys > 0)
+    if valid.sum() < 2:
+        return float("nan")
+    return float(np.polyfit(np.log(xs[valid]), np.log(ys[valid]), 1)[0])
+
+
+class ScalingBenchmark:
+    def __init__(self, shapes=None, sizes=None, layer_counts=None, fixed_layers=20,
+                 fixed_size=1e3, wall_count=2, line_width=0.5):
+        self.shapes = shapes if shapes else list(SHAPES)
+        self.sizes = [int(s) for s in (sizes if sizes else DEFAULT_SIZES)]
+        self.layer_counts = layer_counts if layer_counts else DEFAULT_LAYERS
+        self.fixed_layers = fixed_layers
+        self.fixed_size = int(fixed_size)
+        self.wall_count = wall_count
+        self.suite = BenchmarkSuite(line_width=line_width)
+
+    def run_point(self, file_name, layers):
+        # the number of layers is fixed through specify_height=False so only one axis varies
+        results = self.suite.run_case(file_name, layers, self.wall_count, specify_height=False)
+        if results is None:
+            return None
+        return {stage: {"time_s": results[stage]["time_s"], "peak_bytes": results[stage]["peak_bytes"]}
+                for stage in STAGES}
+
+    def run(self, tmp_dir):
+        report = {"triangles": {}, "layers": {}}
+
+        for shape in self.shapes:
+            report["triangles"][shape] = []
+            for size in self.sizes:
+                file_name = os.path.join(tmp_dir, f"{shape}_{size}.stl")
+                triangles = generate(shape, size, file_name)
+                results = self.run_point(file_name, self.fixed_layers)
+                if results is not None:
+                    report["triangles"][shape].append({"x": triangles, "stages": results})
+                    print(f"{shape:<8} {triangles:>10} triangles  " + stage_summary(results))
+                os.remove(file_name)
+
+            file_name = os.path.join(tmp_dir, f"{shape}_layers.stl")
+            generate(shape, self.fixed_size, file_name)
+            report["layers"][shape] = []
+            for layers in self.layer_counts:
+                results = self.run_point(file_name, layers)
+                if results is not None:
+                    report["layers"][shape].append({"x": layers, "stages": results})
+                    print(f"{shape:<8} {layers:>10} layers     " + stage_summary(results))
+            os.remove(file_name)
+
+        report["exponents"] = self.exponents(report)
+        return report
+
+    def exponents(self, report):
+        exponents = {}
+        for sweep in ("triangles", "layers"):
+            exponents[sweep] = {}
+            for shape, points in report[sweep].items():
+                xs = [p["x"] for p in points]
+                exponents[sweep][shape] = {
+                    stage: fit_exponent(xs, [p["stages"][stage]["time_s"] for p in points])
+                    for stage in STAGES}
+        return exponents
+
+    def plot(self, report, output_dir):
+        paths = []
+        for sweep, label in (("triangles", "Triangle count"), ("layers", "Layer count")):
+            fig = Figure(figsize=(4 * len(STAGES), 7))
+            axes = fig.subplots(2, len(STAGES), squeeze=False)
+
+            for column, stage in enumerate(STAGES):
+                time_ax, memory_ax = axes[0][column], axes[1][column]
+                for shape, points in report[sweep].items():
+                    if not points:
+                        continue
+                    xs = [p["x"] for p in points]
+                    exponent = report["exponents"][sweep][shape][stage]
+                    time_ax.loglog(xs, [p["stages"][stage]["time_s"] for p in points], "o-",
+                                   label=f"{shape} (k={exponent:.2f})")
+                    memory_ax.loglog(xs, [p["stages"][stage]["peak_bytes"] / 1024 ** 2 for p in points], "o-",
+                                     label=shape)
+
+                time_ax.set_title(stage)
+                time_ax.set_ylabel("Wall time (s)")
+                memory_ax.set_ylabel("Peak memory (MiB)")
+                memory_ax.set_xlabel(label)
+                time_ax.legend(fontsize=7)
+
+            fig.suptitle(f"Pipeline scaling vs {label.lower()}")
+            fig.tight_layout()
+            path = os.path.join(output_dir, f"scaling_{sweep}.png")
+            fig.savefig(path, dpi=100)
+            paths.append(path)
+        return paths
+
+
+def stage_summary(results):
+    return "  ".join(f"{stage}={results[stage]['time_s'] * 1000:.1f}ms" for stage in STAGES)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how each pipeline stage scales with triangle and layer count.")
+    parser.add_argument("--shapes", nargs="*", choices=sorted(SHAPES))
+    parser.add_argument("--sizes", nargs="*", type=float, help="Triangle counts, up to 1e7")
+    parser.add_argument("--layers", nargs="*", type=int, help="Layer counts for the layer sweep")
+    parser.add_argument("--fixed-layers", type=int, default=20, help="Layer count used in the triangle sweep")
+    parser.add_argument("--fixed-size", type=float, default=1e3, help="Triangle count used in the layer sweep")
+    parser.add_argument("--wall-count", type=int, default=2)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    benchmark = ScalingBenchmark(args.shapes, args.sizes, args.layers, args.fixed_layers,
+                                 args.fixed_size, args.wall_count)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = benchmark.run(tmp_dir)
+
+    with open(os.path.join(args.output_dir, "scaling.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    for path in benchmark.plot(report, args.output_dir):
+        print(f"Plot written to {path}")
+
+    print("Fitted complexity exponents (time ~ n^k):")
+    for sweep, shapes in report["exponents"].items():
+        for shape, stages in shapes.items():
+            print(f"  {sweep:<9} {shape:<8} " + "  ".join(f"{s}={k:.2f}" for s, k in stages.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
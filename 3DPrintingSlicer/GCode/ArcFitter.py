@@ -0,0 +1,183 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# A path after arc fitting: the points it still visits and, for each move between them,
+# the G command (1 line, 2 clockwise arc, 3 counterclockwise arc) and the arc center (NaN for lines).
+FittedPath = namedtuple('FittedPath', ['points', 'kinds', 'centers'])
+
+
+def straight_path(points):
+    moves = max(len(points) - 1, 0)
+    return FittedPath(points, np.ones(moves, dtype=np.int8), np.full((moves, 2), np.nan))
+
+
+def circumcircles(a, b, c):
+    # centers and radii of the circles through each triple of points, inf radius if collinear
+    d = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1]) + c[:, 0] * (a[:, 1] - b[:, 1]))
+    a2, b2, c2 = (a ** 2).sum(axis=1), (b ** 2).sum(axis=1), (c ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ux = (a2 * (b[:, 1] - c[:, 1]) + b2 * (c[:, 1] - a[:, 1]) + c2 * (a[:, 1] - b[:, 1])) / d
+        uy = (a2 * (c[:, 0] - b[:, 0]) + b2 * (a[:, 0] - c[:, 0]) + c2 * (b[:, 0] - a[:, 0])) / d
+    centers = np.column_stack([ux, uy])
+    radii = np.hypot(*(a - centers).T)
+    radii[~np.isfinite(radii)] = np.inf
+    return centers, radii
+
+
+def cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def arc_sweeps(starts, ends, centers, kinds):
+    # signed angle swept by each arc move, negative for clockwise (G2)
+    start_angles = np.arctan2(starts[:, 1] - centers[:, 1], starts[:, 0] - centers[:, 0])
+    end_angles = np.arctan2(ends[:, 1] - centers[:, 1], ends[:, 0] - centers[:, 0])
+    counterclockwise = np.mod(end_angles - start_angles, 2 * np.pi)
+    return np.where(kinds == 3, counterclockwise, counterclockwise - 2 * np.pi)
+
+
+class ArcFitter:
+    # Replaces runs of short segments that stay within tolerance of a circle by single G2/G3 arcs.
+    # Candidate runs come from consecutive vertices with matching circumcircles, each candidate is then
+    # checked against the circle through its ends and middle point and split in half until it fits.
+
+    def __init__(self, tolerance=0.02, min_segments=3, max_radius=500.0):
+        self.tolerance = tolerance # largest distance in mm between the original polyline and the arc
+        self.min_segments = min_segments # shorter runs stay as G1 moves
+        self.max_radius = max_radius # flatter runs are left to G1, firmware arc math loses precision
+
+        self.segments_before = 0
+        self.segments_after = 0
+
+    def fit(self, points):
+        points = np.asarray(points, dtype=float)
+        self.segments_before += max(len(points) - 1, 0)
+
+        if len(points) < self.min_segments + 1:
+            self.segments_after += max(len(points) - 1, 0)
+            return straight_path(points)
+
+        arcs = []
+        for start, end in self.candidate_runs(points):
+            # neighbouring runs can share their end vertices, arcs must not overlap
+            if arcs:
+                start = max(start, arcs[-1][1])
+            self.fit_run(points, start, end, arcs)
+
+        if not arcs:
+            self.segments_after += len(points) - 1
+            return straight_path(points)
+
+        # keep every point that is not strictly inside an arc
+        keep = np.ones(len(points), dtype=bool)
+        arc_moves = {}
+        for start, end, center, kind in arcs:
+            keep[start + 1:end] = False
+            arc_moves[start] = (center, kind)
+
+        kept = np.flatnonzero(keep)
+        kinds = np.ones(len(kept) - 1, dtype=np.int8)
+        centers = np.full((len(kept) - 1, 2), np.nan)
+        move_of_point = {point: move for move, point in enumerate(kept[:-1].tolist())}
+        for start, (center, kind) in arc_moves.items():
+            kinds[move_of_point[start]] = kind
+            centers[move_of_point[start]] = center
+
+        self.segments_after += len(kinds)
+        return FittedPath(points[kept], kinds, centers)
+
+    def candidate_runs(self, points):
+        # (start, end) point ranges where every interior vertex lies on roughly the same circle
+        centers, radii = circumcircles(points[:-2], points[1:-1], points[2:])
+        turns = cross(points[1:-1] - points[:-2], points[2:] - points[1:-1])
+        curved = np.isfinite(radii) & (radii < self.max_radius) & (np.abs(turns) > 1e-12)
+
+        with np.errstate(invalid='ignore'):
+            slack = 0.25 * np.minimum(radii[1:], radii[:-1]) + self.tolerance
+            similar = (curved[1:] & curved[:-1]
+                       & (np.sign(turns[1:]) == np.sign(turns[:-1]))
+                       & (np.hypot(*(centers[1:] - centers[:-1]).T) <= slack)
+                       & (np.abs(radii[1:] - radii[:-1]) <= slack))
+
+        # interior vertex k is point k + 1, a run of similar neighbours k..m spans points k..m + 2
+        edges = np.diff(np.concatenate([[0], similar.astype(np.int8), [0]]))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        return [(int(s), int(e) + 2) for s, e in zip(run_starts, run_ends) if e + 2 - s >= self.min_segments]
+
+    def fit_run(self, points, start, end, arcs):
+        # one arc for points start..end if it is within tolerance, otherwise both halves are tried
+        if end - start < self.min_segments:
+            return
+
+        middle = (start + end) // 2
+        run = points[start:end + 1]
+        centers, radii = circumcircles(points[[start]], points[[middle]], points[[end]])
+        center, radius = centers[0], radii[0]
+
+        if np.isfinite(radius) and radius < self.max_radius and self.within_tolerance(run, center, radius):
+            kind = 3 if cross(points[middle] - points[start], points[end] - points[middle]) > 0 else 2
+            arcs.append((start, end, center, kind))
+            return
+
+        self.fit_run(points, start, middle, arcs)
+        self.fit_run(points, middle, end, arcs)
+
+    def within_tolerance(self, run, center, radius):
+        offsets = run - center
+        distances = np.hypot(*offsets.T)
+        if np.abs(distances - radius).max() > self.tolerance:
+            return False
+
+        # chord midpoints sag inside the arc
+        midpoints = (run[1:] + run[:-1]) / 2
+        if np.abs(np.hypot(*(midpoints - center).T) - radius).max() > self.tolerance:
+            return False
+
+        # the points must advance around the center in one direction, less than a full turn
+        angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+        steps = np.mod(np.diff(angles) + np.pi, 2 * np.pi) - np.pi
+        if not ((steps > 0).all() or (steps < 0).all()):
+            return False
+        return np.abs(steps).max() < np.pi / 2 and np.abs(steps.sum()) < 2 * np.pi - 1e-3
+
+    def report(self):
+        if not self.segments_after:
+            return "Arc fitting: no paths fitted"
+        return (f"Arc fitting: {self.segments_before} moves -> {self.segments_after} "
+                f"({self.segments_before / self.segments_after:.2f}x fewer)")
+
+
+def arc_chord_counts(starts, ends, centers, clockwise, segments_per_radian=8):
+    # sweep of each G2/G3 move (a full circle when it ends where it starts) and the number of chords
+    # arc_segments draws it with
+    clockwise = np.asarray(clockwise, dtype=bool)
+    sweeps = arc_sweeps(starts[:, :2], ends[:, :2], centers[:, :2], np.where(clockwise, 2, 3))
+    full_circle = (starts[:, 0] == ends[:, 0]) & (starts[:, 1] == ends[:, 1])
+    sweeps = np.where(full_circle, np.where(clockwise, -2 * np.pi, 2 * np.pi), sweeps)
+    return sweeps, np.maximum(np.ceil(np.abs(sweeps) * segments_per_radian), 1).astype(np.int64)
+
+
+def arc_segments(starts, ends, centers, clockwise, segments_per_radian=8):
+    # (M, 2, 3) chords drawing many G2/G3 moves at once, about segments_per_radian per radian of each arc,
+    # and the number of chords of each arc. Z moves evenly along the arc, the last chord ends exactly at end.
+    starts, ends, centers = np.asarray(starts, dtype=float), np.asarray(ends, dtype=float), np.asarray(centers, dtype=float)
+    sweeps, counts = arc_chord_counts(starts, ends, centers, clockwise, segments_per_radian)
+
+    # chord k of every arc as one flat array: its arc and its position along that arc
+    arc = np.repeat(np.arange(len(counts)), counts)
+    first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    k = np.arange(len(arc)) - first[arc]
+
+    radii = np.hypot(*(starts[:, :2] - centers[:, :2]).T)[arc]
+    start_angles = np.arctan2(starts[:, 1] - centers[:, 1], starts[:, 0] - centers[:, 0])[arc]
+    segments = np.empty((len(arc), 2, 3))
+    for side, t in enumerate((k / counts[arc], (k + 1) / counts[arc])):
+        angles = start_angles + sweeps[arc] * t
+        segments[:, side, 0] = centers[arc, 0] + radii * np.cos(angles)
+        segments[:, side, 1] = centers[arc, 1] + radii * np.sin(angles)
+        segments[:, side, 2] = starts[arc, 2] + (ends[arc, 2] - starts[arc, 2]) * t
+    segments[first + counts - 1, 1] = ends
+    return segments, counts
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from GCode.GCodeColumns import GCodeColumns
+from GCode.GCodeLayers import GCodeLayers
+from GCode.GCodeTrajectory import GCodeTrajectory
+
+
+# Sidecar layout: magic, header length, a JSON header listing each array's name, dtype, shape and
+# offset, then the raw arrays, each aligned so they can be memory mapped in place.
+SIDECAR_MAGIC = b"GCCACHE\x00"
+SIDECAR_LENGTH = struct.Struct("<Q")
+SIDECAR_ALIGNMENT = 64
+CACHE_VERSION = 3 # part of every key, bump when parsing or evaluation changes their results
+WRITE_CHUNK_BYTES = 16 << 20 # arrays are written this much at a time, memory mapped ones are never copied whole
+
+# the parsed objects stored in a sidecar, each listing its arrays in to_arrays and rebuilt by from_arrays
+CACHED_CLASSES = {'columns': GCodeColumns, 'trajectory': GCodeTrajectory, 'layers': GCodeLayers}
+
+
+def aligned(offset):
+    return -(-offset // SIDECAR_ALIGNMENT) * SIDECAR_ALIGNMENT
+
+
+def write_sidecar(path, arrays):
+    entries = []
+    offset = 0
+    for name, array in arrays.items():
+        entries.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset = aligned(offset + array.nbytes)
+    header = json.dumps(entries).encode()
+    data_start = aligned(len(SIDECAR_MAGIC) + SIDECAR_LENGTH.size + len(header))
+
+    with open(path, 'wb') as f:
+        f.write(SIDECAR_MAGIC + SIDECAR_LENGTH.pack(len(header)) + header)
+        for entry, array in zip(entries, arrays.values()):
+            f.seek(data_start + entry['offset'])
+            array = np.atleast_1d(array)
+            step = max(1, WRITE_CHUNK_BYTES // max(array[:1].nbytes, 1)) # rows per write
+            for start in range(0, len(array), step):
+                np.ascontiguousarray(array[start:start + step]).tofile(f)
+        f.truncate(data_start + offset)
+
+
+def read_sidecar(path):
+    # arrays of a sidecar, memory mapped read only
+    with open(path, 'rb') as f:
+        if f.read(len(SIDECAR_MAGIC)) != SIDECAR_MAGIC:
+            raise ValueError(f"{path} is not a G-code cache file")
+        header_length, = SIDECAR_LENGTH.unpack(f.read(SIDECAR_LENGTH.size))
+        entries = json.loads(f.read(header_length))
+    data_start = aligned(len(SIDECAR_MAGIC) + SIDECAR_LENGTH.size + header_length)
+
+    arrays = {}
+    for entry in entries:
+        dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+        if 0 in shape:
+            arrays[entry['name']] = np.empty(shape, dtype=dtype) # empty arrays cannot be mapped
+        else:
+            arrays[entry['name']] = np.memmap(path, dtype=dtype, mode='r', offset=data_start + entry['offset'], shape=shape)
+    return arrays
+
+
+class GCodeCache:
+    # Parsed columns, trajectory and layer index of G-code files, stored as memory mapped sidecar files in
+    # cache_dir. Entries are keyed by the file's size, modification time and content hash; the least
+    # recently used ones are deleted once the directory holds more than max_disk_bytes.
+
+    def __init__(self, cache_dir=".gcode_cache", max_disk_bytes=4 << 30):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, file_name, block_size=1 << 20):
+        stat = os.stat(file_name)
+        digest = hashlib.sha1(f"{CACHE_VERSION}|{stat.st_size}|{stat.st_mtime_ns}|".encode())
+        with open(file_name, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, key):
+        # (columns, trajectory, layers) mapped from the sidecar, or None
+        path = self.disk_path(key)
+        try:
+            arrays = read_sidecar(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        parsed = []
+        try:
+            for prefix, cls in CACHED_CLASSES.items():
+                parsed.append(cls.from_arrays({name.split('.', 1)[1]: array for name, array in arrays.items()
+                                               if name.startswith(prefix + '.')}))
+        except KeyError:
+            # written before a field was added
+            self.misses += 1
+            return None
+
+        os.utime(path) # mark as recently used for eviction
+        self.hits += 1
+        return tuple(parsed)
+
+    def put(self, key, columns, trajectory, layers):
+        arrays = {}
+        for prefix, value in zip(CACHED_CLASSES, (columns, trajectory, layers)):
+            arrays.update({f"{prefix}.{name}": array for name, array in value.to_arrays().items()})
+
+        # write to a temporary file first so readers never see a partial sidecar
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        write_sidecar(tmp_path, arrays)
+        os.replace(tmp_path, self.disk_path(key))
+        self.evict_disk()
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.gcc")
+
+    def evict_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.gcc'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue # still mapped on platforms that lock mapped files
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.gcc'):
+                os.remove(os.path.join(self.cache_dir, name))
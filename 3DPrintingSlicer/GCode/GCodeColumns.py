@@ -0,0 +1,256 @@
+import re
+import sys
+import warnings
+from collections.abc import Sequence
+
+import numpy as np
+
+from GCode.GCodeFormats import ARC_BITS, ARC_TAIL_FIELDS, PARAM_BITS
+from GCode.GCodeOp import GCodeOp
+
+
+COLUMN_LETTERS = "XYZEFIJ"
+# commands that change the machine state without arguments, kept even when they have none:
+# homing, G90/G91 and the G10/G11 firmware retract and unretract
+BARE_CODES = (10, 11, 28, 90, 91)
+# Patterns matched at the first non-blank character of the comment and M lines:
+# layer change comments: ";LAYER:3" (Cura), ";LAYER_CHANGE" (PrusaSlicer) and "; LAYER Z=0.20 mm" (GCodeGenerator)
+LAYER_COMMENT = re.compile(rb';[ \t]*LAYER(?::|_CHANGE|[ \t])')
+# M82 absolute / M83 relative extrusion, the only M commands that change how the file replays
+EXTRUSION_MODE_COMMAND = re.compile(rb'M8([23])(?![0-9.])')
+# feature comments: ";TYPE:Outer wall" (PrusaSlicer, OrcaSlicer) and ";TYPE:WALL-OUTER" (Cura)
+FEATURE_COMMENT = re.compile(rb';[ \t]*TYPE:([^\r\n;]*)')
+
+# line numbers and values of the lines between operations that matter to GCodeTrajectory and GCodeLayers
+EVENT_FIELDS = {
+    'layer_lines': np.int64, # layer change comments
+    'extrusion_mode_lines': np.int64, # M82 / M83
+    'extrusion_relative': bool, # True for M83
+    'feature_lines': np.int64, # ;TYPE: comments
+    'feature_names': str, # the feature each of them names
+}
+
+IS_COLUMN_LETTER = np.zeros(256, dtype=bool)
+IS_COLUMN_LETTER[[ord(letter) for letter in COLUMN_LETTERS]] = True
+
+
+def parse_floats(text, count):
+    # whitespace separated numbers to floats in one C-level pass; if a token is not a number
+    # the tokens are converted one by one with NaN for the bad ones
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            values = np.fromstring(text, dtype=np.float64, sep=' ')
+        if len(values) == count:
+            return values
+    except ValueError:
+        pass
+
+    tokens = text.split()
+    values = np.empty(len(tokens))
+    for k, token in enumerate(tokens):
+        try:
+            values[k] = float(token)
+        except ValueError:
+            values[k] = np.nan
+    return values
+
+
+class GCodeColumns:
+    # Parsed G-code as one array per field, one entry per operation: the G number, the X Y Z E F I J
+    # values (NaN where the command does not set them) and the 1-based source line number.
+    # Operations are the G commands with at least one argument, plus the BARE_CODES ones.
+    # The EVENT_FIELDS arrays hold what happens between them: layer change comments, M82/M83
+    # and ;TYPE: comments, by line number.
+
+    def __init__(self, code, columns, line, events=None):
+        self.code = code
+        self.x, self.y, self.z = columns['X'], columns['Y'], columns['Z']
+        self.e, self.f = columns['E'], columns['F']
+        self.i, self.j = columns['I'], columns['J']
+        self.line = line
+
+        events = events if events is not None else {}
+        for name, dtype in EVENT_FIELDS.items():
+            setattr(self, name, events.get(name, np.empty(0, dtype=dtype)))
+
+    def events(self):
+        return {name: getattr(self, name) for name in EVENT_FIELDS}
+
+    def to_arrays(self):
+        # every field by name, rebuilt by from_arrays (GCodeCache)
+        arrays = {'code': self.code, 'line': self.line}
+        arrays.update({letter.lower(): self.column(letter) for letter in COLUMN_LETTERS})
+        arrays.update(self.events())
+        return {name: np.asarray(array) for name, array in arrays.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['code'], {letter: arrays[letter.lower()] for letter in COLUMN_LETTERS}, arrays['line'],
+                   {name: arrays[name] for name in EVENT_FIELDS})
+
+    def __len__(self):
+        return len(self.code)
+
+    def column(self, letter):
+        return getattr(self, letter.lower())
+
+    @classmethod
+    def empty(cls, events=None):
+        return cls(np.empty(0, dtype=np.int16), {letter: np.empty(0) for letter in COLUMN_LETTERS},
+                   np.empty(0, dtype=np.int64), events)
+
+    @classmethod
+    def from_bytes(cls, data, first_line=1):
+        # One pass of array operations over the whole buffer: find the G lines, cut their comments,
+        # split them into words, then convert every number with a single call.
+        buf = np.frombuffer(data, dtype=np.uint8)
+        n = len(buf)
+        if n == 0:
+            return cls.empty()
+
+        newlines = np.flatnonzero(buf == ord('\n'))
+        line_starts = np.concatenate([[0], newlines + 1])
+        line_ends = np.concatenate([newlines, [n]])
+        line_numbers = np.arange(first_line, first_line + len(line_starts))
+        valid = line_starts < n
+        line_starts, line_ends, line_numbers = line_starts[valid], line_ends[valid], line_numbers[valid]
+
+        # leading whitespace, a few passes at most
+        content_starts = line_starts.copy()
+        while True:
+            inside = content_starts < line_ends
+            blank = np.zeros(len(content_starts), dtype=bool)
+            blank[inside] = buf[content_starts[inside]] <= ord(' ')
+            if not blank.any():
+                break
+            content_starts[blank] += 1
+
+        inside = content_starts < line_ends
+        first_bytes = np.zeros(len(content_starts), dtype=np.uint8)
+        first_bytes[inside] = buf[content_starts[inside]]
+
+        # the few comment and M lines are matched one by one for the events between operations
+        maybe_event = (first_bytes == ord(';')) | (first_bytes == ord('M'))
+        events = cls.line_events(data, content_starts[maybe_event], line_numbers[maybe_event])
+
+        is_g = first_bytes == ord('G')
+        content_starts, line_ends, line_numbers = content_starts[is_g], line_ends[is_g], line_numbers[is_g]
+        if len(content_starts) == 0:
+            return cls.empty(events)
+
+        # everything after ';' is a comment
+        semicolons = np.flatnonzero(buf == ord(';'))
+        next_semicolon = np.append(semicolons, n)[np.searchsorted(semicolons, content_starts)]
+        content_ends = np.minimum(next_semicolon, line_ends)
+
+        # words of the G lines
+        boundary = np.zeros(n + 1, dtype=np.int8)
+        boundary[content_starts] += 1
+        boundary[content_ends] -= 1
+        in_content = np.cumsum(boundary[:-1], dtype=np.int8).astype(bool)
+        is_word = in_content & (buf > ord(' ')) # space, tab, CR and other control bytes separate words
+        word_starts = np.flatnonzero(is_word & ~np.concatenate([[False], is_word[:-1]]))
+        word_ends = np.flatnonzero(is_word & ~np.concatenate([is_word[1:], [False]])) + 1
+        word_lines = np.searchsorted(content_starts, word_starts, side='right') - 1
+
+        # commands without arguments are dropped once their number is known
+        has_args = np.bincount(word_lines, minlength=len(content_starts)) >= 2
+
+        # the number of each word is everything after its letter; command words and known parameters are kept
+        is_command = word_starts == content_starts[word_lines]
+        letters = buf[word_starts]
+        is_param = ~is_command & IS_COLUMN_LETTER[letters]
+        numbered = (is_command | is_param) & (word_ends - word_starts > 1)
+        starts, ends = word_starts[numbered] + 1, word_ends[numbered]
+
+        # blank out everything but the numbers so a single split yields them in order
+        spans = np.zeros(n + 1, dtype=np.int8)
+        spans[starts] += 1
+        spans[ends] -= 1
+        numbers = np.where(np.cumsum(spans[:-1], dtype=np.int8).astype(bool), buf, ord(' ')).tobytes()
+        values = parse_floats(numbers, len(starts))
+
+        ops = len(content_starts)
+        code = np.full(ops, -1, dtype=np.int16)
+        command_values = values[is_command[numbered]]
+        code[word_lines[numbered & is_command]] = np.nan_to_num(command_values, nan=-1).astype(np.int16)
+
+        columns = {}
+        param_ops = word_lines[numbered & is_param]
+        param_letters = letters[numbered & is_param]
+        param_values = values[is_param[numbered]]
+        for letter in COLUMN_LETTERS:
+            column = np.full(ops, np.nan)
+            selected = param_letters == ord(letter)
+            column[param_ops[selected]] = param_values[selected]
+            columns[letter] = column
+
+        keep = has_args | np.isin(code, BARE_CODES)
+        return cls(code[keep], {letter: column[keep] for letter, column in columns.items()}, line_numbers[keep], events)
+
+    @staticmethod
+    def line_events(data, starts, line_numbers):
+        # EVENT_FIELDS of the lines whose content starts at the given offsets
+        events = {name: [] for name in EVENT_FIELDS}
+        for start, line in zip(starts.tolist(), line_numbers.tolist()):
+            if LAYER_COMMENT.match(data, start):
+                events['layer_lines'].append(line)
+            elif match := FEATURE_COMMENT.match(data, start):
+                events['feature_lines'].append(line)
+                events['feature_names'].append(match.group(1).strip().decode('utf-8', 'replace'))
+            elif match := EXTRUSION_MODE_COMMAND.match(data, start):
+                events['extrusion_mode_lines'].append(line)
+                events['extrusion_relative'].append(match.group(1) == b'3')
+        return {name: np.array(values, dtype=EVENT_FIELDS[name]) for name, values in events.items()}
+
+    @classmethod
+    def from_records(cls, records):
+        # columns of a binary move file, the record index stands in for the line number
+        mask = records['mask']
+        fields = {letter: records[letter.lower()] for letter in COLUMN_LETTERS if letter.lower() in records.dtype.names}
+        kept = np.ones(len(records), dtype=bool)
+        if 'i' not in records.dtype.names:
+            # from version 3 the I J of a G2/G3 are in the record after it (none in version 1 files)
+            arcs = np.flatnonzero(mask & ARC_BITS)
+            arcs = arcs[arcs + 1 < len(records)] # an interrupted writer may have cut off the last tail
+            kept[arcs + 1] = False
+            for letter, field in ARC_TAIL_FIELDS.items():
+                fields[letter] = np.zeros(len(records), dtype=np.float32)
+                fields[letter][arcs] = records[field][arcs + 1]
+
+        columns = {}
+        for letter in COLUMN_LETTERS:
+            column = np.full(len(records), np.nan)
+            if letter in fields:
+                present = (mask & PARAM_BITS[letter]) != 0
+                column[present] = fields[letter][present]
+            columns[letter] = column[kept]
+        return cls(records['code'][kept].astype(np.int16), columns, np.flatnonzero(kept) + 1)
+
+    def operation(self, index):
+        params = {}
+        for letter in COLUMN_LETTERS:
+            value = self.column(letter)[index]
+            if value == value: # not NaN
+                params[letter] = float(value)
+        return GCodeOp(sys.intern(f"G{self.code[index]}"), (), params) # one shared string per command name
+
+
+class OperationList(Sequence):
+    # GCodeOp objects built on access from the columns, so parsing never creates one per command
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("operation index out of range")
+        return self.columns.operation(index)
@@ -0,0 +1,132 @@
+import gzip
+import os
+import struct
+
+import numpy as np
+
+try:
+    from compression import zstd  # standard library from Python 3.14
+except ImportError:
+    zstd = None
+
+
+# Compact binary move format: a header followed by fixed-width records, one per G command with
+# arguments (the commands GCodeEvaluator keeps when parsing text). Each record holds the G number,
+# a mask of the parameters present and their values; a G2/G3 (a record with I or J in its mask) is
+# followed by a second record holding only its arc center offsets. Older versions are still read.
+BINARY_MAGIC = b"GCBIN\x00"
+BINARY_VERSION = 3
+BINARY_HEADER = struct.Struct("<6sHHQ") # magic, version, record size, record count
+
+PARAM_LETTERS = "XYZEFIJ"
+PARAM_BITS = {letter: 1 << i for i, letter in enumerate(PARAM_LETTERS)}
+ARC_TAIL_FIELDS = {'I': 'x', 'J': 'y'} # fields of the record after a G2/G3 that hold its I and J
+ARC_BITS = PARAM_BITS['I'] | PARAM_BITS['J']
+
+RECORD_FIELDS = [
+    ('code', '<u1'), # G number
+    ('mask', '<u1'), # bit i set if PARAM_LETTERS[i] is present
+    ('pad', '<u2'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('e', '<f4'),
+    ('f', '<f4'),
+]
+# version 2 added the arc center offsets of G2/G3 to every record, version 3 moved them to a record
+# after each arc so that lines stay at 24 bytes
+RECORD_DTYPES = {1: np.dtype(RECORD_FIELDS), 2: np.dtype(RECORD_FIELDS + [('i', '<f4'), ('j', '<f4')]),
+                 3: np.dtype(RECORD_FIELDS)}
+RECORD_DTYPE = RECORD_DTYPES[BINARY_VERSION]
+
+OUTPUT_BUFFER_SIZE = 16 * 1024 * 1024
+OUTPUT_EXTENSIONS = {".gz": "gzip", ".zst": "zstd", ".gbin": "binary"}
+
+
+def output_format_for(file_name):
+    # output format implied by the file extension, plain text otherwise
+    return OUTPUT_EXTENSIONS.get(os.path.splitext(file_name)[1].lower(), "text")
+
+
+def open_gcode_output(file_name, output_format):
+    # text handle for plain or compressed G-code, streamed through the standard library codecs
+    if output_format == "gzip":
+        return gzip.open(file_name, 'wt', compresslevel=6)
+    if output_format == "zstd":
+        if zstd is None:
+            raise RuntimeError("zstd output needs the compression.zstd module (Python 3.14+)")
+        return zstd.open(file_name, 'wt')
+    return open(file_name, 'w', buffering=OUTPUT_BUFFER_SIZE)
+
+
+def open_gcode_binary(file_name, fileobj=None):
+    # byte handle for reading plain or compressed G-code text, from fileobj if given (file_name then only
+    # decides the format)
+    source = fileobj if fileobj is not None else file_name
+    output_format = output_format_for(file_name)
+    if output_format == "gzip":
+        return gzip.open(source, 'rb')
+    if output_format == "zstd":
+        if zstd is None:
+            raise RuntimeError("reading zstd G-code needs the compression.zstd module (Python 3.14+)")
+        return zstd.open(source, 'rb')
+    return fileobj if fileobj is not None else open(file_name, 'rb')
+
+
+def is_binary_gcode(file_name):
+    with open(file_name, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def binary_header(record_count):
+    return BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, RECORD_DTYPE.itemsize, record_count)
+
+
+def encode_lines(text):
+    # records for the G commands of a small block of G-code text, e.g. the start and end sequences
+    records = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith('G'):
+            continue
+        parts = line.split(';')[0].split()
+        if len(parts) < 2 and parts[0] not in ('G10', 'G11', 'G28', 'G90', 'G91'):
+            continue
+
+        record, tail = np.zeros(2, dtype=RECORD_DTYPE)
+        record['code'] = int(parts[0][1:])
+        for part in parts[1:]:
+            letter = part[0]
+            if letter in ARC_TAIL_FIELDS:
+                record['mask'] |= PARAM_BITS[letter]
+                tail[ARC_TAIL_FIELDS[letter]] = float(part[1:])
+            elif letter in PARAM_BITS:
+                record['mask'] |= PARAM_BITS[letter]
+                record[letter.lower()] = float(part[1:])
+        records.append(record)
+        if record['mask'] & ARC_BITS:
+            records.append(tail)
+
+    return np.array(records, dtype=RECORD_DTYPE)
+
+
+def read_binary(file_name):
+    # records of a binary move file, memory mapped
+    with open(file_name, 'rb') as f:
+        magic, version, record_size, record_count = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{file_name} is not a binary G-code move file")
+    if version not in RECORD_DTYPES or record_size != RECORD_DTYPES[version].itemsize:
+        raise ValueError(f"Unsupported binary G-code version {version} (record size {record_size})")
+    dtype = RECORD_DTYPES[version]
+
+    # a writer that was interrupted never patched the count, fall back on the file size
+    available = (os.path.getsize(file_name) - BINARY_HEADER.size) // record_size
+    if record_count == 0 or record_count > available:
+        record_count = available
+    if record_count == 0:
+        return np.zeros(0, dtype=dtype)
+
+    return np.memmap(file_name, dtype=dtype, mode='r', offset=BINARY_HEADER.size, shape=(record_count,))
+
@@ -1,26 +1,336 @@
+import io
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
 import shapely as sp
 
+from GCode.ArcFitter import FittedPath, arc_sweeps, straight_path
+from GCode.GCodeFormats import (ARC_BITS, ARC_TAIL_FIELDS, OUTPUT_BUFFER_SIZE, PARAM_BITS, RECORD_DTYPE,
+                                binary_header, encode_lines, open_gcode_output, output_format_for, zstd)
+
+
+def chain_edges(edges):
+    # Splits an (E, 2) edge list into polylines wherever an edge does not start where the previous one ended.
+    # Returns a list of vertex index arrays, one per polyline.
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    if len(edges) == 0:
+        return []
+
+    breaks = np.flatnonzero(edges[1:, 0] != edges[:-1, 1]) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(edges)]])
+
+    return [np.concatenate([edges[start:start + 1, 0], edges[start:end, 1]])
+            for start, end in zip(starts, ends)]
+
+def slice_paths(infill_slice):
+    # perimeter loops and infill polylines of a layer as (N, 2) coordinate arrays
+    perimeters = [np.asarray(polygon.exterior.coords, dtype=float)[:, :2]
+                  for polygon in infill_slice.polygons if polygon.is_valid and not polygon.is_empty]
+
+    infill_vertices = np.asarray(infill_slice.infill_vertices, dtype=float)
+    infill_paths = [infill_vertices[path, :2] for path in chain_edges(infill_slice.infill_edges)]
+
+    return perimeters, infill_paths
+
+PERIMETER_START = ("; New perimeter\n"
+                   "G1 X%.2f Y%.2f F3000 ; Move to start of perimeter\n"
+                   "G1 E0 ; Start extrusion\n")
+PERIMETER_MOVES = {1: "G1 X%.2f Y%.2f E%.5f F1500 ; Extrude\n",
+                   2: "G2 X%.2f Y%.2f I%.3f J%.3f E%.5f F1500 ; Extrude arc\n",
+                   3: "G3 X%.2f Y%.2f I%.3f J%.3f E%.5f F1500 ; Extrude arc\n"}
+PERIMETER_CLOSE = "G1 X%.2f Y%.2f E%.5f F1500 ; Close perimeter\n"
+INFILL_START = ("G1 X%.2f Y%.2f F3000 ; Move to start of infill line\n"
+                "G1 E0 ; Start extrusion\n")
+# feedrate is modal, only set on the first move of the path
+INFILL_FIRST_MOVES = {1: "G1 X%.2f Y%.2f E%.5f F1500\n",
+                      2: "G2 X%.2f Y%.2f I%.3f J%.3f E%.5f F1500\n",
+                      3: "G3 X%.2f Y%.2f I%.3f J%.3f E%.5f F1500\n"}
+INFILL_MOVES = {1: "G1 X%.2f Y%.2f E%.5f\n",
+                2: "G2 X%.2f Y%.2f I%.3f J%.3f E%.5f\n",
+                3: "G3 X%.2f Y%.2f I%.3f J%.3f E%.5f\n"}
+RETRACT = "G1 E-1 F3000 ; Retract filament\n"
+
+
+def close_path(path):
+    # a closed path ends with a straight move back to its first vertex
+    return FittedPath(np.vstack([path.points, path.points[:1]]), np.append(path.kinds, 1),
+                      np.vstack([path.centers, [[np.nan, np.nan]]]))
+
+
+def path_moves(paths, closed, extrusion_per_mm, e_start=0.0):
+    # Moves of a group of paths as arrays, with the bed offset applied: the start of each path, the target of
+    # every extrusion move, its cumulative E (from e_start), the moves per path, the G command of each move
+    # (1 line, 2/3 arc) and the arc center relative to the move start (I J, NaN for lines).
+    # paths are (N, 2) arrays or FittedPaths from the ArcFitter.
+    if not paths:
+        return (np.empty((0, 2)), np.empty((0, 2)), np.empty(0), np.empty(0, dtype=int),
+                np.empty(0, dtype=np.int8), np.empty((0, 2)))
+
+    paths = [path if isinstance(path, FittedPath) else straight_path(path) for path in paths]
+    paths = [close_path(path) if is_closed else path for path, is_closed in zip(paths, closed)]
+    lengths = np.array([len(path.points) for path in paths])
+    coords = np.vstack([path.points for path in paths]) + 117
+    kinds = np.concatenate([path.kinds for path in paths])
+    centers = np.vstack([path.centers for path in paths]) + 117
+
+    # moves between consecutive vertices, dropping the ones that join two different paths
+    path_starts = np.cumsum(lengths) - lengths
+    keep = np.ones(len(coords) - 1, dtype=bool)
+    keep[path_starts[1:] - 1] = False
+    move_starts = coords[:-1][keep]
+    targets = coords[1:][keep]
+
+    segments = targets - move_starts
+    distances = np.sqrt(segments[:, 0] ** 2 + segments[:, 1] ** 2)
+    arcs = kinds != 1
+    if arcs.any():
+        radii = np.hypot(*(move_starts[arcs] - centers[arcs]).T)
+        distances[arcs] = radii * np.abs(arc_sweeps(move_starts[arcs], targets[arcs], centers[arcs], kinds[arcs]))
+    extrusion = e_start + np.cumsum(distances * extrusion_per_mm)
+
+    return coords[path_starts], targets, extrusion, lengths - 1, kinds, centers - move_starts
+
+
+def move_index(move_counts):
+    # position of every move within its path
+    return np.arange(move_counts.sum()) - np.repeat(np.cumsum(move_counts) - move_counts, move_counts)
+
+
+def interleave_moves(starts, targets, extrusion, move_counts, kinds, offsets):
+    # one flat value array in text order: X Y of the travel to each path, then X Y [I J] E per extrusion move
+    path_items = np.arange(len(starts)) + np.cumsum(move_counts) - move_counts
+    is_move = np.ones(len(starts) + len(targets), dtype=bool)
+    is_move[path_items] = False
+
+    value_counts = np.full(len(is_move), 2)
+    value_counts[is_move] = np.where(kinds == 1, 3, 5)
+    item_offsets = np.cumsum(value_counts) - value_counts
+    values = np.empty(value_counts.sum())
+
+    values[item_offsets[path_items]] = starts[:, 0]
+    values[item_offsets[path_items] + 1] = starts[:, 1]
+
+    move_offsets = item_offsets[is_move]
+    values[move_offsets] = targets[:, 0]
+    values[move_offsets + 1] = targets[:, 1]
+    arcs = kinds != 1
+    values[move_offsets[arcs] + 2] = offsets[arcs, 0]
+    values[move_offsets[arcs] + 3] = offsets[arcs, 1]
+    values[move_offsets + value_counts[is_move] - 1] = extrusion
+    return values
+
+
+def last_extrusion(extrusion, e_start=0.0):
+    return extrusion[-1] if len(extrusion) else e_start
+
+
+def path_kinds(kinds, move_counts):
+    # the move commands of each path, or None for paths that are all straight moves
+    if (kinds == 1).all():
+        return [None] * len(move_counts)
+    return [None if (path == 1).all() else path.tolist() for path in np.split(kinds, np.cumsum(move_counts)[:-1])]
+
+
+def format_layer(z0, perimeters, infill_paths, extrusion_per_mm=0.05):
+    # the G-code text of one layer, formatted in bulk from the move arrays
+    perimeter_moves = path_moves(perimeters, [True] * len(perimeters), extrusion_per_mm)
+    infill_moves = path_moves(infill_paths, [False] * len(infill_paths), extrusion_per_mm,
+                              last_extrusion(perimeter_moves[2]))
+
+    # moves per path include the closing move of perimeters
+    template = "".join(
+        PERIMETER_START
+        + (PERIMETER_MOVES[1] * (count - 1) if kinds is None else "".join(PERIMETER_MOVES[k] for k in kinds[:-1]))
+        + PERIMETER_CLOSE + RETRACT
+        for count, kinds in zip(perimeter_moves[3].tolist(), path_kinds(perimeter_moves[4], perimeter_moves[3])))
+    perimeter_text = template % tuple(interleave_moves(*perimeter_moves).tolist())
+
+    template = "".join(
+        INFILL_START
+        + (INFILL_FIRST_MOVES[1] + INFILL_MOVES[1] * (count - 1) if kinds is None else
+           INFILL_FIRST_MOVES[kinds[0]] + "".join(INFILL_MOVES[k] for k in kinds[1:]))
+        + RETRACT
+        for count, kinds in zip(infill_moves[3].tolist(), path_kinds(infill_moves[4], infill_moves[3])))
+    infill_text = template % tuple(interleave_moves(*infill_moves).tolist())
+
+    return (f"; LAYER Z={z0:.2f} mm\n"
+            f"G1 Z{z0:.2f} F1000 ; Move to layer height\n"
+            "G92 E0 ; Reset extrusion distance\n"
+            "G1 F1500 ; Set feedrate\n"
+            "; Beginning perimeters\n"
+            + perimeter_text +
+            "; End of perimeters, beginning infill\n"
+            + infill_text +
+            "; Finished infill.\n"
+            f"; End of layer Z={z0:.2f} mm\n\n")
+
+
+def group_records(starts, targets, extrusion, move_counts, kinds, offsets, modal_feedrate):
+    # binary records mirroring the text of a path group: travel, G1 E0, extrusion moves, retract;
+    # every arc move takes a second record for its I J
+    arcs = kinds != 1
+    move_slots = 1 + arcs.astype(np.int64)
+    path_of_move = np.repeat(np.arange(len(move_counts)), move_counts)
+    path_slots = np.bincount(path_of_move, weights=move_slots, minlength=len(move_counts)).astype(np.int64)
+    record_counts = path_slots + 3
+    path_offsets = np.cumsum(record_counts) - record_counts
+    records = np.zeros(record_counts.sum(), dtype=RECORD_DTYPE)
+    records['code'] = 1
+
+    travel = records[path_offsets]
+    travel['x'], travel['y'], travel['f'] = np.round(starts[:, 0], 2), np.round(starts[:, 1], 2), 3000
+    travel['mask'] = PARAM_BITS['X'] | PARAM_BITS['Y'] | PARAM_BITS['F']
+    records[path_offsets] = travel
+    records['mask'][path_offsets + 1] = PARAM_BITS['E'] # e stays 0
+
+    # the record of each move follows the moves (and arc tails) before it in its path
+    index = move_index(move_counts)
+    slots_before = np.cumsum(move_slots) - move_slots
+    path_slots_before = np.cumsum(path_slots) - path_slots
+    move_offsets = np.repeat(path_offsets + 2 - path_slots_before, move_counts) + slots_before
+    moves = records[move_offsets]
+    moves['code'] = kinds
+    moves['x'], moves['y'], moves['e'] = np.round(targets[:, 0], 2), np.round(targets[:, 1], 2), np.round(extrusion, 5)
+    # feedrate on every move, or only on the first move of each path where it is modal
+    with_feedrate = index == 0 if modal_feedrate else np.ones(len(index), dtype=bool)
+    moves['f'] = np.where(with_feedrate, 1500, 0)
+    moves['mask'] = (PARAM_BITS['X'] | PARAM_BITS['Y'] | PARAM_BITS['E']
+                     | np.where(with_feedrate, PARAM_BITS['F'], 0) | np.where(arcs, ARC_BITS, 0))
+    records[move_offsets] = moves
+
+    tails = move_offsets[arcs] + 1
+    records['code'][tails] = 0
+    records[ARC_TAIL_FIELDS['I']][tails] = np.round(offsets[arcs, 0], 3)
+    records[ARC_TAIL_FIELDS['J']][tails] = np.round(offsets[arcs, 1], 3)
+
+    retract = path_offsets + record_counts - 1
+    records['e'][retract], records['f'][retract] = -1, 3000
+    records['mask'][retract] = PARAM_BITS['E'] | PARAM_BITS['F']
+    return records
+
+
+def layer_records(z0, perimeters, infill_paths, extrusion_per_mm=0.05):
+    # the binary move records of one layer, the same commands format_layer writes as text
+    perimeter_moves = path_moves(perimeters, [True] * len(perimeters), extrusion_per_mm)
+    infill_moves = path_moves(infill_paths, [False] * len(infill_paths), extrusion_per_mm,
+                              last_extrusion(perimeter_moves[2]))
+
+    header = encode_lines(f"G1 Z{z0:.2f} F1000\nG92 E0\nG1 F1500\n")
+    return np.concatenate([header,
+                           group_records(*perimeter_moves, modal_feedrate=False),
+                           group_records(*infill_moves, modal_feedrate=True)])
+
+
+def layer_record_bytes(z0, perimeters, infill_paths):
+    return layer_records(z0, perimeters, infill_paths).tobytes()
+
+
 class GCodeGenerator:
-    def __init__(self, infill_slice_info):
+    def __init__(self, infill_slice_info, path_orderer=None, workers=1, use_threads=False, arc_fitter=None):
         self.infill_slice_info = infill_slice_info  # List of shapely Polygon objects representing infill perimeters
                                                     # List of vertices (x, y, z) and edges (start_idx, end_idx) for infill
                                                     # z0 corresponds to the layer height
+        self.path_orderer = path_orderer # optional PathOrderer that reorders each layer's paths to shorten travel
+        self.position = np.zeros(2) # where the nozzle ends after the last written layer, in slicer coordinates
+        self.workers = workers # layers formatted in parallel, 1 formats them in this thread
+        self.use_threads = use_threads # thread pool instead of process pool, avoids copying the paths to workers
+        self.arc_fitter = arc_fitter # optional ArcFitter that turns runs of short moves into G2/G3 arcs
 
 
 
-    def generate_gcode(self, output_file):
+    def generate_gcode(self, output_file, output_format=None):
+        # output_format is "text", "gzip", "zstd" or "binary", by default implied by the extension
+        # (.gz, .zst, .gbin, anything else is text)
 
         if not self.infill_slice_info:
             print("No infill slice information available.")
             return False
 
-        with open(output_file, 'w') as f:
-            self.g_code_setup(f)
+        output_format = output_format or output_format_for(output_file)
+        if output_format == "zstd" and zstd is None:
+            print("zstd output needs the compression.zstd module (Python 3.14+).")
+            return False
+
+        if output_format == "binary":
+            with open(output_file, 'wb', buffering=OUTPUT_BUFFER_SIZE) as f:
+                self.write_binary(f)
+        else:
+            with open_gcode_output(output_file, output_format) as f:
+                self.write_gcode(f)
+
+        return True
+
+    def write_gcode(self, f):
+        self.position = np.zeros(2)
+        self.g_code_setup(f)
+        if self.workers > 1:
+            self.write_layers_parallel(f, format_layer)
+        else:
             for infill_slice in self.infill_slice_info:
                 self.g_code_for_slice(infill_slice, f)
-            self.g_code_conclusion(f)
+        self.g_code_conclusion(f)
 
-        return True
+    def write_binary(self, f):
+        # the header's record count is patched once every layer is written, f must be seekable
+        self.position = np.zeros(2)
+        f.write(binary_header(0))
+        size = f.write(self.encode_text(self.g_code_setup).tobytes())
+
+        if self.workers > 1:
+            size += self.write_layers_parallel(f, layer_record_bytes)
+        else:
+            for infill_slice in self.infill_slice_info:
+                size += f.write(layer_record_bytes(*self.layer_paths(infill_slice)))
+
+        size += f.write(self.encode_text(self.g_code_conclusion).tobytes())
+        f.seek(0)
+        f.write(binary_header(size // RECORD_DTYPE.itemsize))
+        f.seek(0, io.SEEK_END)
+
+    def encode_text(self, write):
+        buffer = io.StringIO()
+        write(buffer)
+        return encode_lines(buffer.getvalue())
+
+    def write_layers_parallel(self, f, formatter):
+        # Every layer starts with G92 E0, so layers are formatted independently on the pool.
+        # Path ordering stays here since each layer starts where the previous one ended.
+        # Finished layers wait in a reorder buffer until all layers before them are written.
+        # formatter(z0, perimeters, infill_paths) returns the layer's text or bytes; returns the amount written.
+        executor_class = ThreadPoolExecutor if self.use_threads else ProcessPoolExecutor
+        max_in_flight = 4 * self.workers # bounds the memory held by queued and buffered layers
+
+        with executor_class(max_workers=self.workers) as executor:
+            in_flight = {}
+            finished = {}
+            next_index = 0
+            written = 0
+
+            def collect(block):
+                if block:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                else:
+                    done = [future for future in in_flight if future.done()]
+                for future in done:
+                    finished[in_flight.pop(future)] = future.result()
+
+            for index, infill_slice in enumerate(self.infill_slice_info):
+                in_flight[executor.submit(formatter, *self.layer_paths(infill_slice))] = index
+
+                collect(block=len(in_flight) + len(finished) >= max_in_flight)
+                while next_index in finished:
+                    written += f.write(finished.pop(next_index))
+                    next_index += 1
+
+            while in_flight or finished:
+                if next_index not in finished:
+                    collect(block=True)
+                while next_index in finished:
+                    written += f.write(finished.pop(next_index))
+                    next_index += 1
+
+        return written
 
 
     def g_code_setup(self, f):
@@ -53,78 +363,14 @@ class GCodeGenerator:
         f.write("; Finished G-code generation\n")
         f.write("; --------------------------------\n")
 
-    def g_code_for_slice(self, infill_slice, f):
-        f.write(f"; LAYER Z={infill_slice.z0:.2f} mm\n")
-        f.write(f"G1 Z{infill_slice.z0:.2f} F1000 ; Move to layer height\n")
-
-        f.write("G92 E0 ; Reset extrusion distance\n")
-
-        f.write("G1 F1500 ; Set feedrate\n")
-
-        extrusion_per_mm = 0.05
-        total_extrusion = 0.0
-
-        f.write(f"; Beginning perimeters\n")
-
-        for polygon in infill_slice.polygons:
-            if not polygon.is_valid or polygon.is_empty:
-                continue
-
-            f.write(f"; New perimeter\n")
-
-            exterior_coords = list(polygon.exterior.coords)
-            f.write(f"G1 X{exterior_coords[0][0] + 117:.2f} Y{exterior_coords[0][1] + 117:.2f} F3000 ; Move to start of perimeter\n")
-            f.write("G1 E0 ; Start extrusion\n")
-
-            for i in range(1, len(exterior_coords)):
-                x, y = exterior_coords[i]
-                prev_x, prev_y = exterior_coords[i - 1]
-                distance = ((x - prev_x) ** 2 + (y - prev_y) ** 2) ** 0.5
-                extrusion_amount = distance * extrusion_per_mm
-                total_extrusion += extrusion_amount
-                f.write(f"G1 X{x + 117:.2f} Y{y + 117:.2f} E{total_extrusion:.5f} F1500 ; Extrude\n")
-
-            prev_x, prev_y = exterior_coords[-1]
-            x, y = exterior_coords[0]
-            distance = ((x - prev_x) ** 2 + (y - prev_y) ** 2) ** 0.5
-            extrusion_amount = distance * extrusion_per_mm
-            total_extrusion += extrusion_amount
-            f.write(f"G1 X{x + 117:.2f} Y{y + 117:.2f} E{total_extrusion:.5f} F1500 ; Close perimeter\n")
-
-            f.write(f"G1 E-1 F3000 ; Retract filament\n")
-
-        f.write(f"; End of perimeters, beginning infill\n")
-
-        for edge in infill_slice.infill_edges:
-            start_vertex = infill_slice.infill_vertices[edge[0]]
-            end_vertex = infill_slice.infill_vertices[edge[1]]
-
-            x1, y1 = start_vertex[0], start_vertex[1]
-            x2, y2 = end_vertex[0], end_vertex[1]
-
-            f.write(f"G1 X{x1 + 117:.2f} Y{y1 + 117:.2f} F3000 ; Move to start of infill line\n")
-            f.write("G1 E0 ; Start extrusion\n")
-
-            distance = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
-            extrusion_amount = distance * extrusion_per_mm
-            total_extrusion += extrusion_amount
-            f.write(f"G1 X{x2 + 117:.2f} Y{y2 + 117:.2f} E{total_extrusion:.5f} F1500 ; Extrude infill line\n")
-
-            f.write(f"G1 E-1 F3000 ; Retract filament\n")
-
-
-        f.write("; Finished infill.\n")
-
-
-        f.write(f"; End of layer Z={infill_slice.z0:.2f} mm\n\n")
-
-
-
-
-
-
-
-
-
-
+    def layer_paths(self, infill_slice):
+        perimeters, infill_paths = slice_paths(infill_slice)
+        if self.path_orderer is not None:
+            perimeters, infill_paths, self.position = self.path_orderer.order_layer(perimeters, infill_paths, self.position)
+        if self.arc_fitter is not None:
+            perimeters = [self.arc_fitter.fit(path) for path in perimeters]
+            infill_paths = [self.arc_fitter.fit(path) for path in infill_paths]
+        return infill_slice.z0, perimeters, infill_paths
 
+    def g_code_for_slice(self, infill_slice, f):
+        f.write(format_layer(*self.layer_paths(infill_slice)))
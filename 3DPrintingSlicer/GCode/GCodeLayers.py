@@ -0,0 +1,174 @@
+import numpy as np
+
+from GCode.ArcFitter import arc_chord_counts, arc_segments
+from GCode.GCodeStream import allocate_array
+from GCode.GCodeTrajectory import CHUNK_OPS
+
+
+def layer_starts(columns, trajectory, chunk_ops=CHUNK_OPS):
+    # first operation of every layer: the one after each layer change comment if the file has them,
+    # otherwise the one after the last extrusion below each new Z, so travel and Z hops join the layer they lead to
+    if len(columns.layer_lines):
+        starts = np.searchsorted(columns.line, columns.layer_lines)
+        starts = starts[starts < len(columns)]
+        starts = starts[1:] # the commands before the first comment (start sequence, purge line) join the first layer
+    else:
+        # extruding moves chunk by chunk, each compared with the last one of the chunks before it
+        starts, last_op = [], np.empty(0, dtype=np.int64)
+        for first in range(0, len(columns), chunk_ops):
+            stop = min(first + chunk_ops, len(columns))
+            ops = np.concatenate([last_op, np.flatnonzero(trajectory.extruding(first, stop)) + first])
+            z = trajectory.position[ops + 1, 2]
+            changes = np.flatnonzero(z[1:] != z[:-1]) + 1
+            starts.append(ops[changes - 1] + 1)
+            last_op = ops[-1:]
+        starts = np.concatenate([np.empty(0, dtype=np.int64)] + starts)
+
+    return np.unique(np.concatenate([[0], starts])).astype(np.int64)
+
+
+def arc_moves(columns, trajectory, ops):
+    # the G2/G3 moves among the operations ops, as indices into ops, and the arguments of
+    # arc_chord_counts / arc_segments for them
+    arcs = np.flatnonzero(np.isin(columns.code[ops], (2, 3)))
+    arc_ops = ops[arcs]
+    starts, ends = trajectory.position[arc_ops], trajectory.position[arc_ops + 1]
+    centers = starts[:, :2] + np.nan_to_num(np.column_stack([columns.i[arc_ops], columns.j[arc_ops]]))
+    return arcs, (starts, ends, centers, columns.code[arc_ops] == 2)
+
+
+def segment_counts(columns, trajectory, ops):
+    # rows each of the extruding operations ops takes in segments, one per straight move and one per chord of an arc
+    counts = np.ones(len(ops), dtype=np.int64)
+    arcs, arc_args = arc_moves(columns, trajectory, ops)
+    if len(arcs):
+        counts[arcs] = arc_chord_counts(*arc_args)[1]
+    return counts
+
+
+def extruded_segments(columns, trajectory, ops):
+    # (M, 2, 3) segments of the given extruding operations in order, arcs split into short chords,
+    # and the index of the first segment of each operation (plus the total)
+    starts, ends = trajectory.position[ops], trajectory.position[ops + 1]
+    arcs, arc_args = arc_moves(columns, trajectory, ops)
+    if len(arcs) == 0:
+        return np.stack([starts, ends], axis=1), np.arange(len(ops) + 1)
+
+    # all arcs are expanded in one batch, the chords of each take its rows from first[op] on
+    arc_chords, arc_counts = arc_segments(*arc_args)
+
+    counts = np.ones(len(ops), dtype=np.int64)
+    counts[arcs] = arc_counts
+    first = np.concatenate([[0], np.cumsum(counts)])
+
+    segments = np.empty((first[-1], 2, 3))
+    straight = np.ones(len(ops), dtype=bool)
+    straight[arcs] = False
+    segments[first[:-1][straight], 0] = starts[straight]
+    segments[first[:-1][straight], 1] = ends[straight]
+    arc_rows = np.repeat(first[arcs] - np.concatenate([[0], np.cumsum(arc_counts)[:-1]]), arc_counts)
+    segments[arc_rows + np.arange(len(arc_chords))] = arc_chords
+    return segments, first
+
+
+class GCodeLayers:
+    # Layer index of a parsed file. Layer k covers operations starts[k]..stops[k]-1 and prints at z[k];
+    # extrusion is the filament its extruding moves push (mm of E), bounds_min / bounds_max the box around
+    # its extruding moves (NaN for a layer without any). segments holds every extruding move as one
+    # (start, end) row in file order, so a layer's moves are the slice segment_starts[k]..segment_starts[k + 1]
+    # and op_segments[k] is the number of rows drawn by operations 0..k-1.
+
+    def __init__(self, starts, stops, z, extrusion, bounds_min, bounds_max, segments, segment_starts, op_segments):
+        self.starts = starts
+        self.stops = stops
+        self.z = z
+        self.extrusion = extrusion
+        self.bounds_min = bounds_min
+        self.bounds_max = bounds_max
+        self.segments = segments
+        self.segment_starts = segment_starts
+        self.op_segments = op_segments
+
+    # every field, in the order of __init__; to_arrays / from_arrays store and rebuild them (GCodeCache)
+    ARRAY_FIELDS = ('starts', 'stops', 'z', 'extrusion', 'bounds_min', 'bounds_max', 'segments', 'segment_starts',
+                    'op_segments')
+
+    def __len__(self):
+        return len(self.starts)
+
+    def to_arrays(self):
+        return {name: np.asarray(getattr(self, name)) for name in self.ARRAY_FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*(arrays[name] for name in cls.ARRAY_FIELDS))
+
+    @classmethod
+    def from_trajectory(cls, columns, trajectory, directory=None, chunk_ops=CHUNK_OPS):
+        # Built chunk_ops operations at a time like the trajectory: a first pass sums up each layer and
+        # counts the segment rows of every operation, a second one fills segments, which is then allocated
+        # to its exact size (memory mapped from a temporary file in directory if one is given).
+        count = len(columns)
+        if count == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, empty, np.empty(0), np.empty(0), np.empty((0, 3)), np.empty((0, 3)),
+                       np.empty((0, 2, 3)), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))
+
+        starts = layer_starts(columns, trajectory, chunk_ops)
+        stops = np.append(starts[1:], count)
+        extrusion = np.zeros(len(starts))
+        bounds_min = np.full((len(starts), 3), np.inf)
+        bounds_max = np.full((len(starts), 3), -np.inf)
+        has_extrusion = np.zeros(len(starts), dtype=bool)
+        z = trajectory.position[stops, 2].copy() # the nozzle height at the end of a layer without extrusion
+        op_segments = allocate_array(count + 1, np.int64, directory)
+        op_segments[0] = 0
+
+        chunks = [(first, min(first + chunk_ops, count)) for first in range(0, count, chunk_ops)]
+        for first, stop in chunks:
+            ops = np.flatnonzero(trajectory.extruding(first, stop)) + first
+            counts = np.zeros(stop - first, dtype=np.int64)
+            counts[ops - first] = segment_counts(columns, trajectory, ops)
+            op_segments[first + 1:stop + 1] = op_segments[first] + np.cumsum(counts)
+            if len(ops) == 0:
+                continue
+
+            # the layers run in order, so the extruding moves of each layer in the chunk are one reduceat group
+            op_layers = np.searchsorted(starts, ops, side='right') - 1
+            groups = np.flatnonzero(np.diff(op_layers, prepend=-1))
+            layers = op_layers[groups]
+
+            # filament laid down by each extruding move, retractions and G92 resets do not count
+            extrusion[layers] += np.add.reduceat(trajectory.e[ops + 1] - trajectory.e[ops], groups)
+
+            before, after = trajectory.position[ops], trajectory.position[ops + 1]
+            bounds_min[layers] = np.minimum(bounds_min[layers], np.minimum.reduceat(np.minimum(before, after), groups))
+            bounds_max[layers] = np.maximum(bounds_max[layers], np.maximum.reduceat(np.maximum(before, after), groups))
+
+            # height of the first extrusion in each layer
+            new = ~has_extrusion[layers]
+            z[layers[new]] = after[groups[new], 2]
+            has_extrusion[layers] = True
+
+        bounds_min[~has_extrusion] = np.nan
+        bounds_max[~has_extrusion] = np.nan
+
+        segments = allocate_array((op_segments[count], 2, 3), np.float64, directory)
+        for first, stop in chunks:
+            ops = np.flatnonzero(trajectory.extruding(first, stop)) + first
+            segments[op_segments[first]:op_segments[stop]] = extruded_segments(columns, trajectory, ops)[0]
+        segment_starts = op_segments[np.append(starts, count)]
+
+        return cls(starts, stops, z, extrusion, bounds_min, bounds_max, segments, segment_starts, op_segments)
+
+    def layer_of(self, index):
+        # layer of an operation index
+        return int(np.searchsorted(self.starts, index, side='right')) - 1
+
+    def segment_ops(self):
+        # operation index of every row of segments
+        return np.repeat(np.arange(len(self.op_segments) - 1), np.diff(self.op_segments))
+
+    def layer_segments(self, layer):
+        # extruding moves of one layer as a view into segments
+        return self.segments[self.segment_starts[layer]:self.segment_starts[layer + 1]]
@@ -1,103 +1,107 @@
-import numpy as np
+def parse_params(args):
+    # ['X10.5', 'E0.2'] -> {'X': 10.5, 'E': 0.2}, a repeated letter keeps its last value
+    params = {}
+    for param in args:
+        try:
+            params[param[0]] = float(param[1:])
+        except ValueError:
+            continue
+    return params
 
 
 class GCodeOp:
-    def __init__(self, cmd, args):
+    # One G command. Handlers come from the class-level HANDLERS table and positions are plain floats,
+    # so an op carries no per-instance dispatch dict or numpy array; __slots__ drops the instance dict too.
+    __slots__ = ('cmd', 'args', 'params', 'isMoving', 'isTeleport', 'end_x', 'end_y', 'end_z',
+                 'next_filament_height', 'next_is_absolute', 'reset_pos', 'next_feedrate', 'arc_offset', 'clockwise')
+
+    def __init__(self, cmd, args=(), params=None):
         self.cmd = cmd
         self.args = args
+        self.params = params if params is not None else parse_params(args) # values of the arguments by letter
         self.isMoving = False
-        self.end_pos = np.zeros(3)
+        self.isTeleport = False
+        self.end_x = self.end_y = self.end_z = 0.0
         self.next_filament_height = 0
         self.next_is_absolute = True
-        self.reset_pos = None
+        self.reset_pos = None # G-code coordinates after a G92 (x, y, z); for G28 0 for the homed axes, None for the others
         self.next_feedrate = 0
+        self.arc_offset = None # center of a G2/G3 arc relative to the start position, (I, J)
+        self.clockwise = cmd == 'G2'
+        if cmd in ('G2', 'G3'):
+            self.arc_offset = (self.params.get('I', 0.0), self.params.get('J', 0.0))
 
-        self.cmds = {
-            'G0': self.handle_g0,   # Rapid linear move
-            'G1': self.handle_g1,   # Linear move
-            'G28': self.handle_g28, # Move to home position
-            'G90': self.handle_g90, # Set to absolute positioning
-            'G91': self.handle_g91, # Set to relative positioning
-            'G92': self.handle_g92, # Change position without moving
-        }
-
+    @property
+    def end_pos(self):
+        return (self.end_x, self.end_y, self.end_z)
 
     def execute(self, current_state):
+        # current_state: a MachineState or GCodeEvaluator, positions are read as three numbers
         self.next_is_absolute = current_state.is_absolute
         self.next_feedrate = current_state.current_feedrate
         self.next_filament_height = current_state.filament_height
-        self.end_pos = np.copy(current_state.actual_position)
-
-        if self.cmd in self.cmds:
-            self.cmds[self.cmd]()
-
-
-    def handle_g0(self):
-        self.isMoving = True
 
-        for param in self.args:
-            if param[0] == 'X':
-                self.end_pos[0] = float(param[1:])
-            if param[0] == 'Y':
-                self.end_pos[1] = float(param[1:])
-            if param[0] == 'Z':
-                self.end_pos[2] = float(param[1:])
+        # absolute moves leave the axes they do not name where they are, relative moves leave them unchanged
+        if current_state.is_absolute:
+            self.end_x, self.end_y, self.end_z = (float(v) for v in current_state.expected_position)
+        else:
+            self.end_x = self.end_y = self.end_z = 0.0
 
-            if param[0] == 'F':
-                self.next_feedrate = float(param[1:])
-            if param[0] == 'E':
-                self.next_filament_height = float(param[1:])
+        handler = self.HANDLERS.get(self.cmd)
+        if handler is not None:
+            handler(self, current_state)
 
 
-    def handle_g1(self):
+    def handle_g1(self, current_state):
         self.isMoving = True
 
-        for param in self.args:
-            if param[0] == 'X':
-                self.end_pos[0] = float(param[1:])
-            if param[0] == 'Y':
-                self.end_pos[1] = float(param[1:])
-            if param[0] == 'Z':
-                self.end_pos[2] = float(param[1:])
-
-            if param[0] == 'F':
-                self.next_feedrate = float(param[1:])
-            if param[0] == 'E':
-                self.next_filament_height = float(param[1:])
-
-    def handle_g28(self):
+        for letter, value in self.params.items():
+            if letter == 'X':
+                self.end_x = value
+            elif letter == 'Y':
+                self.end_y = value
+            elif letter == 'Z':
+                self.end_z = value
+            elif letter == 'F':
+                self.next_feedrate = value
+            elif letter == 'E':
+                self.next_filament_height = value if current_state.is_absolute else self.next_filament_height + value
+
+    def handle_g28(self, current_state):
         self.isTeleport = True
 
-        if len(self.args) == 0:
-            self.end_pos = np.zeros(3)
-            return
-
-        for param in self.args:
-            if param[0] == 'X':
-                self.end_pos[0] = 0
-            if param[0] == 'Y':
-                self.end_pos[1] = 0
-            if param[0] == 'Z':
-                self.end_pos[2] = 0
+        named = [letter for letter in 'XYZ' if letter in self.params] or ['X', 'Y', 'Z']
+        self.reset_pos = tuple(0.0 if letter in named else None for letter in 'XYZ')
 
 
-    def handle_g90(self):
+    def handle_g90(self, current_state):
         self.next_is_absolute = True
 
 
-    def handle_g91(self):
+    def handle_g91(self, current_state):
         self.next_is_absolute = False
 
 
-    def handle_g92(self):
-
-        for param in self.args:
-            if param[0] == 'X':
-                self.reset_pos[0] = float(param[1:])
-            if param[0] == 'Y':
-                self.reset_pos[1] = float(param[1:])
-            if param[0] == 'Z':
-                self.reset_pos[2] = float(param[1:])
-
-            if param[0] == 'E':
-                self.next_filament_height = float(param[1:])
\ No newline at end of file
+    def handle_g92(self, current_state):
+        x, y, z = (float(v) for v in current_state.expected_position)
+        for letter, value in self.params.items():
+            if letter == 'X':
+                x = value
+            elif letter == 'Y':
+                y = value
+            elif letter == 'Z':
+                z = value
+            elif letter == 'E':
+                self.next_filament_height = value
+        self.reset_pos = (x, y, z)
+
+    HANDLERS = {
+        'G0': handle_g1,   # Rapid linear move
+        'G1': handle_g1,   # Linear move
+        'G2': handle_g1,   # Clockwise arc move, drawn from arc_offset
+        'G3': handle_g1,   # Counterclockwise arc move
+        'G28': handle_g28, # Move to home position
+        'G90': handle_g90, # Set to absolute positioning
+        'G91': handle_g91, # Set to relative positioning
+        'G92': handle_g92, # Change position without moving
+    }
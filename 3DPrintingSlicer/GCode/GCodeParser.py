@@ -1,12 +1,26 @@
+import os
+
 import numpy as np
 
-from GCode.GCodeOp import GCodeOp
+from GCode.GCodeColumns import GCodeColumns, OperationList
+from GCode.GCodeFormats import is_binary_gcode, open_gcode_binary, read_binary
+from GCode.GCodeLayers import GCodeLayers
+from GCode.GCodeStream import CHUNK_SIZE, stream_columns
+from GCode.GCodeTrajectory import GCodeTrajectory
+from GCode.PrintTimeEstimator import PrintTimeEstimator
 
 
 class GCodeEvaluator:
-    def __init__(self):
+    def __init__(self, chunk_size=CHUNK_SIZE, workers=1, memmap_dir=None, cache=None):
         self.file_name = ""
-        self.operations = []
+        self.chunk_size = chunk_size # text is parsed this many bytes at a time
+        self.workers = workers # chunks parsed in parallel, 1 parses them in this thread
+        self.memmap_dir = memmap_dir # directory for disk backed columns of very large files, None keeps them in memory
+        self.cache = cache # optional GCodeCache, reopened files are mapped from it instead of parsed
+        self.columns = GCodeColumns.empty() # parsed commands as arrays, see GCodeColumns
+        self.operations = OperationList(self.columns) # GCodeOp for each command, built when accessed
+        self.trajectory = GCodeTrajectory.from_columns(self.columns) # state before and after every command
+        self.layers = GCodeLayers.from_trajectory(self.columns, self.trajectory) # operation ranges per layer
         self.expected_position = np.zeros(3)
         self.actual_position = np.zeros(3)
         self.current_feedrate = 0
@@ -22,10 +36,6 @@ class GCodeEvaluator:
         self.is_absolute = True
         self.index = 0
 
-    def evaluate_command(self, cmd, args):
-        operation = GCodeOp(cmd, args)
-        self.operations.append(operation)
-
     def can_draw(self):
         return self.filament_height > 0
 
@@ -33,56 +43,69 @@ class GCodeEvaluator:
         if self.index >= len(self.operations):
             return None
 
-        operation = self.operations[self.index]
-        operation.execute(self)
-
-        self.is_absolute = operation.next_is_absolute
-        self.current_feedrate = operation.next_feedrate
-        self.filament_height = operation.next_filament_height
-
-        if operation.reset_pos is not None:
-            self.expected_position = operation.reset_pos
-
-        if operation.isMoving:
-            if self.is_absolute:
-                self.actual_position += operation.end_pos - self.expected_position
-                self.expected_position = operation.end_pos
-            else:
-                self.actual_position += operation.end_pos
-                self.expected_position += operation.end_pos
-
-
-        self.index += 1
-
-
-    def parse(self, file_name):
-
+        self.seek(self.index + 1)
+
+    def seek(self, index):
+        # state once the first index operations have run, read from the precomputed trajectory
+        index = min(max(index, 0), len(self.operations))
+        self.actual_position = self.trajectory.position[index].copy()
+        self.expected_position = self.trajectory.logical[index].copy()
+        self.current_feedrate = float(self.trajectory.feedrate[index])
+        self.filament_height = float(self.trajectory.e[index])
+        self.is_absolute = bool(self.trajectory.absolute[index])
+        self.index = index
+
+    def seek_layer(self, layer):
+        # state once every operation up to the end of layer has run
+        self.seek(self.layers.stops[layer])
+
+    def estimate_print(self, estimator=None):
+        # PrintEstimate of the parsed file: time and filament in total and per layer
+        estimator = estimator if estimator is not None else PrintTimeEstimator()
+        return estimator.estimate(self.columns, self.trajectory, self.layers)
+
+    def parse(self, file_name, progress=None):
+        # progress(bytes_done, bytes_total) is called as the file is read
         self.file_name = file_name
-        self.operations = []
         self.reset()
 
-        with open(self.file_name, 'r') as file:
-            lines = file.readlines()
-            for line in lines:
-                line = line.strip()
-                if not line.startswith('G') or not line:
-                    continue
-
-                if ';' in line:
-                    line = line.split(';')[0].strip()
+        key = self.cache.key(file_name) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.set_columns(*cached)
+                print(f"Loaded {len(self.operations)} G-code operations for {self.file_name} from the cache.")
+                return
 
-                parts = line.split()
+        self.parse_file(file_name, progress)
 
-                cmd = parts[0]
+        if key is not None:
+            self.cache.put(key, self.columns, self.trajectory, self.layers)
 
-                if len(parts) < 2:
-                    continue
+    def parse_file(self, file_name, progress=None):
+        if is_binary_gcode(file_name):
+            self.parse_binary(file_name)
+            return
 
-                args = parts[1:]
-
-                self.evaluate_command(cmd, args)
+        total = os.path.getsize(file_name)
+        with open(file_name, 'rb') as raw, open_gcode_binary(file_name, raw) as file:
+            # position in the file on disk, for compressed files the decompressed size is unknown
+            report = None if progress is None else (lambda _: progress(raw.tell(), total))
+            self.set_columns(stream_columns(file, self.chunk_size, self.workers,
+                                            directory=self.memmap_dir, progress=report))
 
         print(f"Parsed {len(self.operations)} G-code operations from {self.file_name}.")
 
+    def parse_binary(self, file_name):
+        # binary move files already hold the parsed commands, one record per operation
+        self.file_name = file_name
+        self.reset()
+        self.set_columns(GCodeColumns.from_records(read_binary(file_name)))
 
+        print(f"Loaded {len(self.operations)} G-code operations from {self.file_name}.")
 
+    def set_columns(self, columns, trajectory=None, layers=None):
+        self.columns = columns
+        self.operations = OperationList(columns)
+        self.trajectory = trajectory if trajectory is not None else GCodeTrajectory.from_columns(columns, directory=self.memmap_dir)
+        self.layers = layers if layers is not None else GCodeLayers.from_trajectory(columns, self.trajectory, self.memmap_dir)
@@ -0,0 +1,132 @@
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from GCode.GCodeColumns import COLUMN_LETTERS, EVENT_FIELDS, GCodeColumns
+
+
+CHUNK_SIZE = 8 * 1024 * 1024 # bytes parsed at a time, the parser needs roughly 20x this while working on a chunk
+
+
+def parse_chunk(data, first_line):
+    return GCodeColumns.from_bytes(data, first_line)
+
+
+def read_chunks(file, chunk_size):
+    # (data, first_line) blocks of whole lines; the partial line at the end of each read is carried into the next
+    carry = b""
+    first_line = 1
+    while True:
+        block = file.read(chunk_size)
+        if not block:
+            break
+        data = carry + block
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            carry = data # a single line longer than a chunk
+            continue
+        carry = data[cut:]
+        yield data[:cut], first_line
+        first_line += data.count(b"\n", 0, cut)
+
+    if carry:
+        yield carry, first_line
+
+
+class ColumnBuffer:
+    # Growable arrays for the columns of a streamed parse, doubling when full. With a directory the
+    # arrays are memory mapped from unnamed temporary files in it, so they live on disk, not in memory.
+
+    FIELDS = [('code', np.int16)] + [(letter.lower(), np.float64) for letter in COLUMN_LETTERS] + [('line', np.int64)]
+
+    def __init__(self, directory=None, capacity=1 << 16):
+        self.directory = directory
+        self.size = 0
+        self.events = {name: [] for name in EVENT_FIELDS} # small per chunk, joined at the end
+        self.files = {}
+        self.arrays = {name: self.allocate(name, dtype, capacity) for name, dtype in self.FIELDS}
+
+    def allocate(self, name, dtype, capacity, old=None):
+        if self.directory is None:
+            array = np.empty(capacity, dtype=dtype)
+            if old is not None:
+                array[:len(old)] = old
+            return array
+
+        # growing a mapping extends its file, the values already written stay where they are
+        if name not in self.files:
+            self.files[name] = tempfile.TemporaryFile(dir=self.directory)
+        return np.memmap(self.files[name], dtype=dtype, mode='r+', shape=(capacity,))
+
+    def append(self, columns):
+        count = len(columns)
+        needed = self.size + count
+        capacity = len(self.arrays['code'])
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            self.arrays = {name: self.allocate(name, dtype, capacity, self.arrays[name][:self.size])
+                           for name, dtype in self.FIELDS}
+
+        self.arrays['code'][self.size:needed] = columns.code
+        for letter in COLUMN_LETTERS:
+            self.arrays[letter.lower()][self.size:needed] = columns.column(letter)
+        self.arrays['line'][self.size:needed] = columns.line
+        for name, values in columns.events().items():
+            self.events[name].append(values)
+        self.size = needed
+
+    def columns(self):
+        arrays = {name: array[:self.size] for name, array in self.arrays.items()}
+        return GCodeColumns(arrays['code'], {letter: arrays[letter.lower()] for letter in COLUMN_LETTERS},
+                            arrays['line'], {name: np.concatenate([np.empty(0, dtype=EVENT_FIELDS[name])] + values)
+                                             for name, values in self.events.items()})
+
+
+def allocate_array(shape, dtype, directory=None):
+    # an uninitialized array, memory mapped from an unnamed temporary file in directory if one is given
+    # (a file cannot map zero bytes, so empty arrays stay in memory)
+    if directory is None or np.prod(shape) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(tempfile.TemporaryFile(dir=directory), dtype=dtype, mode='w+', shape=shape)
+
+
+def stream_columns(file, chunk_size=CHUNK_SIZE, workers=1, use_threads=False, directory=None, progress=None):
+    # Parses G-code from a byte stream chunk by chunk into a ColumnBuffer. Chunks carry no machine state
+    # (GCodeTrajectory replays positions and modes over the columns afterwards), so with workers > 1
+    # they are parsed on a pool and appended in file order. progress(bytes_read) is called after each chunk.
+    buffer = ColumnBuffer(directory)
+    bytes_read = 0
+
+    if workers <= 1:
+        for data, first_line in read_chunks(file, chunk_size):
+            buffer.append(parse_chunk(data, first_line))
+            bytes_read += len(data)
+            if progress is not None:
+                progress(bytes_read)
+        return buffer.columns()
+
+    executor_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    max_in_flight = 2 * workers # bounds the chunks held in memory
+
+    with executor_class(max_workers=workers) as executor:
+        in_flight = deque()
+
+        def collect():
+            nonlocal bytes_read
+            future, size = in_flight.popleft()
+            buffer.append(future.result())
+            bytes_read += size
+            if progress is not None:
+                progress(bytes_read)
+
+        for data, first_line in read_chunks(file, chunk_size):
+            in_flight.append((executor.submit(parse_chunk, data, first_line), len(data)))
+            if len(in_flight) >= max_in_flight:
+                collect()
+        while in_flight:
+            collect()
+
+    return buffer.columns()
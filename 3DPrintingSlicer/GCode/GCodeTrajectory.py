@@ -0,0 +1,159 @@
+import numpy as np
+
+from GCode.GCodeStream import allocate_array
+
+
+MOVE_CODES = (0, 1, 2, 3)
+RETRACT_CODES = (10, 11) # firmware retract and unretract
+FIRMWARE_RETRACT_LENGTH = 0.8 # mm of filament a G10 pulls back and a G11 pushes again, set in the printer's firmware
+CHUNK_OPS = 1 << 18 # commands replayed at a time, their temporaries take roughly 120 bytes per command
+
+
+def forward_fill(values, initial):
+    # each NaN takes the last value before it, initial if there is none
+    present = ~np.isnan(values)
+    last = np.where(present, np.arange(len(values)), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, values[np.maximum(last, 0)], initial)
+
+
+def restarting_cumsum(values, restarts):
+    # running sum of values that starts over from zero at every restart index
+    totals = np.cumsum(values)
+    return totals - forward_fill(np.where(restarts, totals, np.nan), 0.0)
+
+
+def axis_positions(values, moves, absolute, resets, initial=0.0):
+    # Logical position of one axis after each command, starting from initial. Absolute moves and G92 set it,
+    # relative moves add to it: a running sum of the relative steps, anchored at the last command that set the axis.
+    given = ~np.isnan(values)
+    steps = np.cumsum(np.where(given & moves & ~absolute, values, 0.0))
+    sets = given & ((moves & absolute) | resets)
+    positions = forward_fill(np.where(sets, values - steps, np.nan), initial) + steps
+    positions[sets] = values[sets]
+    return positions
+
+
+class GCodeTrajectory:
+    # Machine state before the first command and after every command of a parsed file, computed for the
+    # whole file up front: row k is the state once commands 0..k-1 have run, so seeking to any command
+    # is an array lookup. position is where the nozzle is, logical is the position in G-code coordinates
+    # (they differ after a G92), e the extruder position, feedrate the last F, absolute the G90/G91 mode
+    # and relative_e whether E values are relative (M83). moves has one entry per command, whether it is
+    # a G0-G3 move or a G10/G11 firmware retraction; feature is the index in feature_names of the ;TYPE:
+    # comment the command follows, -1 before the first one.
+
+    def __init__(self, position, logical, e, feedrate, absolute, relative_e, moves, feature, feature_names):
+        self.position = position
+        self.logical = logical
+        self.e = e
+        self.feedrate = feedrate
+        self.absolute = absolute
+        self.relative_e = relative_e
+        self.moves = moves
+        self.feature = feature
+        self.feature_names = feature_names
+
+    # every field, in the order of __init__; to_arrays / from_arrays store and rebuild them (GCodeCache)
+    ARRAY_FIELDS = ('position', 'logical', 'e', 'feedrate', 'absolute', 'relative_e', 'moves', 'feature', 'feature_names')
+
+    def __len__(self):
+        return len(self.e)
+
+    def to_arrays(self):
+        return {name: np.asarray(getattr(self, name)) for name in self.ARRAY_FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*(arrays[name] for name in cls.ARRAY_FIELDS))
+
+    @classmethod
+    def from_columns(cls, columns, retract_length=FIRMWARE_RETRACT_LENGTH, directory=None, chunk_ops=CHUNK_OPS):
+        # The commands are replayed chunk_ops at a time, each chunk going on from the state row the one
+        # before it ended on, so the temporaries stay the size of a chunk. With a directory the state arrays
+        # are memory mapped from temporary files in it, like the columns of a ColumnBuffer.
+        count = len(columns)
+        trajectory = cls(allocate_array((count + 1, 3), np.float64, directory),
+                         allocate_array((count + 1, 3), np.float64, directory),
+                         allocate_array(count + 1, np.float64, directory), allocate_array(count + 1, np.float64, directory),
+                         allocate_array(count + 1, bool, directory), allocate_array(count + 1, bool, directory),
+                         allocate_array(count, bool, directory), allocate_array(count, np.int16, directory), None)
+
+        # M82/M83 sit between operations, they set the state row of the operation after them; of several
+        # M82/M83 in a row the last one counts
+        mode_rows = np.searchsorted(columns.line, columns.extrusion_mode_lines)
+        last = np.searchsorted(mode_rows, mode_rows, side='right') - 1
+        mode_relative = columns.extrusion_relative[last]
+
+        trajectory.position[0] = trajectory.logical[0] = 0.0
+        trajectory.e[0] = trajectory.feedrate[0] = 0.0
+        trajectory.absolute[0] = True
+        trajectory.relative_e[0] = len(mode_rows) > 0 and mode_rows[0] == 0 and mode_relative[0]
+
+        # the ;TYPE: comments, -1 (the last entry) for commands above the first one
+        trajectory.feature_names, comment_features = np.unique(columns.feature_names, return_inverse=True)
+        comment_features = np.append(comment_features, -1)
+
+        for first in range(0, count, chunk_ops):
+            trajectory.replay(columns, first, min(first + chunk_ops, count), retract_length, mode_rows, mode_relative,
+                              comment_features)
+        return trajectory
+
+    def replay(self, columns, first, stop, retract_length, mode_rows, mode_relative, comment_features):
+        # fills state rows first+1..stop and the per command entries of commands first..stop-1, going on
+        # from state row first
+        commands = slice(first, stop)
+        rows = slice(first + 1, stop + 1)
+        code = columns.code[commands]
+        x, y, z = columns.x[commands], columns.y[commands], columns.z[commands]
+        resets = code == 92
+        homes = code == 28
+
+        # the mode a command runs in is the one left by the G90/G91 before it
+        modes = np.where(code == 90, 1.0, np.where(code == 91, 0.0, np.nan))
+        self.absolute[rows] = forward_fill(modes, self.absolute[first])
+        absolute_before = self.absolute[first:stop]
+
+        # G28 homes the axes it names, all of them if it names none
+        names_axis = ~(np.isnan(x) & np.isnan(y) & np.isnan(z))
+
+        # a G10 naming axes sets tool offsets, only the bare ones retract
+        retracts = np.isin(code, RETRACT_CODES) & ~names_axis
+        moves = np.isin(code, MOVE_CODES) | retracts
+        self.moves[commands] = moves
+
+        for axis, values in enumerate((x, y, z)):
+            homed = homes & (~np.isnan(values) | ~names_axis)
+            values = np.where(homed, 0.0, values)
+            start = self.logical[first, axis]
+            axis_logical = axis_positions(values, moves, absolute_before, resets | homed, start)
+
+            # G92 moves the coordinate system, not the nozzle: the offset between the two grows by
+            # how far the logical position jumped, and homing brings both back to zero
+            previous = np.concatenate([[start], axis_logical[:-1]])
+            jumps = np.where(resets & ~np.isnan(values), previous - axis_logical, 0.0)
+            offsets = restarting_cumsum(jumps, homed)
+            offsets[~np.logical_or.accumulate(homed)] += self.position[first, axis] - start
+            self.logical[rows, axis] = axis_logical
+            self.position[rows, axis] = axis_logical + offsets
+
+        # E follows whichever came last of G90/G91 and M82/M83 (M83 then G90 makes it absolute again, as in Marlin)
+        e_modes = np.where(code == 90, 0.0, np.where(code == 91, 1.0, np.nan))
+        events = slice(np.searchsorted(mode_rows, first, side='right'), np.searchsorted(mode_rows, stop, side='right'))
+        e_modes[mode_rows[events] - first - 1] = mode_relative[events]
+        self.relative_e[rows] = forward_fill(e_modes, self.relative_e[first])
+
+        # firmware retractions are relative E moves of the retract length in either mode
+        e_values = np.where(retracts, np.where(code == 10, -retract_length, retract_length), columns.e[commands])
+        self.e[rows] = axis_positions(e_values, moves, ~self.relative_e[first:stop] & ~retracts, resets, self.e[first])
+        self.feedrate[rows] = forward_fill(np.where(moves, columns.f[commands], np.nan), self.feedrate[first])
+
+        # the last ;TYPE: comment above each command
+        self.feature[commands] = comment_features[np.searchsorted(columns.feature_lines, columns.line[commands]) - 1]
+
+    def extruding(self, first=0, stop=None):
+        # whether each command first..stop-1 is a move that pushes filament, travel moves and retractions are not
+        stop = len(self.moves) if stop is None else stop
+        before, after = slice(first, stop), slice(first + 1, stop + 1)
+        moved = (self.position[after] != self.position[before]).any(axis=1)
+        return self.moves[before] & moved & (self.e[after] > self.e[before])
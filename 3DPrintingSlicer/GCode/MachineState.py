@@ -0,0 +1,34 @@
+class MachineState:
+    # Printer state for stepping GCodeOp objects one at a time, positions as lists of three floats.
+    # GCodeTrajectory computes the same states for a whole file at once; this is for code that still
+    # walks operations individually.
+    __slots__ = ('expected_position', 'actual_position', 'current_feedrate', 'filament_height', 'is_absolute')
+
+    def __init__(self):
+        self.expected_position = [0.0, 0.0, 0.0] # G-code coordinates, moved by G92
+        self.actual_position = [0.0, 0.0, 0.0] # nozzle position
+        self.current_feedrate = 0
+        self.filament_height = 0
+        self.is_absolute = True
+
+    def execute(self, operation):
+        operation.execute(self)
+
+        self.is_absolute = operation.next_is_absolute
+        self.current_feedrate = operation.next_feedrate
+        self.filament_height = operation.next_filament_height
+
+        if operation.isTeleport:
+            # homing moves the nozzle as well as the coordinates
+            for axis, value in enumerate(operation.reset_pos):
+                if value is not None:
+                    self.actual_position[axis] = self.expected_position[axis] = value
+        elif operation.reset_pos is not None:
+            self.expected_position = list(operation.reset_pos)
+
+        if operation.isMoving:
+            end = operation.end_pos
+            for axis in range(3):
+                step = end[axis] - self.expected_position[axis] if self.is_absolute else end[axis]
+                self.actual_position[axis] += step
+                self.expected_position[axis] += step
@@ -0,0 +1,118 @@
+from collections import namedtuple
+
+import numpy as np
+
+from GCode.ArcFitter import arc_sweeps
+
+
+# total_time in seconds, filament_length in mm of filament and filament_mass in grams, for the whole print
+# and per layer of the file's GCodeLayers; move_times holds the seconds each operation takes (0 if it does not move)
+PrintEstimate = namedtuple('PrintEstimate', ['total_time', 'filament_length', 'filament_mass',
+                                             'layer_times', 'layer_filament', 'layer_mass', 'move_times'])
+
+
+def limited_speeds(limits, reach):
+    # Squared junction speeds no higher than limits and no more than reach[k] apart between junction k and k + 1
+    # (2 * acceleration * distance of the move between them). The planner's forward pass
+    # w[k + 1] = min(limits[k + 1], w[k] + reach[k]) unrolls to a running minimum over the prefix sums,
+    # and the backward pass is the same over the reversed arrays.
+    totals = np.concatenate([[0.0], np.cumsum(reach)])
+    forward = totals + np.minimum.accumulate(limits - totals)
+
+    back_totals = totals[-1] - totals
+    return back_totals + np.minimum.accumulate((forward - back_totals)[::-1])[::-1]
+
+
+def trapezoid_times(entry, exit, cruise, distances, acceleration):
+    # time of each move accelerating from entry to at most cruise and slowing to exit, speeds in mm/s
+    accelerate = (cruise ** 2 - entry ** 2) / (2 * acceleration)
+    decelerate = (cruise ** 2 - exit ** 2) / (2 * acceleration)
+    reaches_cruise = accelerate + decelerate <= distances
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cruising = np.where(reaches_cruise,
+                            (cruise - entry + cruise - exit) / acceleration
+                            + (distances - accelerate - decelerate) / cruise, 0.0)
+    peak = np.sqrt(np.maximum((2 * acceleration * distances + entry ** 2 + exit ** 2) / 2, 0.0))
+    triangle = (2 * peak - entry - exit) / acceleration
+    return np.where(reaches_cruise, cruising, triangle)
+
+
+class PrintTimeEstimator:
+    # Print time and filament use of a parsed file from its trajectory, without stepping through it.
+    # Moves follow a trapezoidal speed profile: constant acceleration up to the commanded feedrate and
+    # down again, entering and leaving each move at its junction speed. A junction is limited by the
+    # feedrates on both sides and by jerk, the largest instant change in velocity at a corner.
+
+    def __init__(self, acceleration=1000.0, jerk=10.0, default_feedrate=3000.0,
+                 filament_diameter=1.75, filament_density=1.24):
+        self.acceleration = acceleration # mm/s^2
+        self.jerk = jerk # mm/s
+        self.default_feedrate = default_feedrate # mm/min for moves before the first F
+        self.filament_diameter = filament_diameter # mm
+        self.filament_density = filament_density # g/cm^3, 1.24 for PLA
+
+    def estimate(self, columns, trajectory, layers):
+        count = len(columns)
+        move_times = np.zeros(count)
+
+        before, after = trajectory.position[:-1], trajectory.position[1:]
+        deltas = after - before
+        e_deltas = np.diff(trajectory.e)
+        distances = np.sqrt((deltas ** 2).sum(axis=1))
+
+        # arcs travel along their circle, not the chord
+        arcs = np.flatnonzero(trajectory.moves & np.isin(columns.code, (2, 3)))
+        if len(arcs):
+            centers = before[arcs, :2] + np.nan_to_num(np.column_stack([columns.i[arcs], columns.j[arcs]]))
+            sweeps = arc_sweeps(before[arcs, :2], after[arcs, :2], centers, columns.code[arcs])
+            full_circle = (deltas[arcs, 0] == 0) & (deltas[arcs, 1] == 0)
+            sweeps = np.where(full_circle, np.where(columns.code[arcs] == 2, -2 * np.pi, 2 * np.pi), sweeps)
+            radii = np.hypot(*(before[arcs, :2] - centers).T)
+            distances[arcs] = np.hypot(radii * np.abs(sweeps), deltas[arcs, 2])
+
+        # extruder only moves (retractions) take as long as the filament takes to move
+        distances = np.where(distances > 0, distances, np.abs(e_deltas))
+        ops = np.flatnonzero(trajectory.moves & (distances > 0))
+
+        if len(ops):
+            feedrates = trajectory.feedrate[ops + 1]
+            cruise = np.where(feedrates > 0, feedrates, self.default_feedrate) / 60.0
+            lengths = distances[ops]
+
+            # a corner may be taken at the speed where the change in velocity stays within jerk
+            norms = np.sqrt((deltas[ops] ** 2).sum(axis=1))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                directions = np.where(norms[:, None] > 0, deltas[ops] / norms[:, None], 0.0)
+                turns = np.sqrt(((directions[1:] - directions[:-1]) ** 2).sum(axis=1))
+                corner = np.where(turns > 0, self.jerk / turns, np.inf)
+
+            # the print starts and ends at rest, the first and last move start and stop within jerk
+            junctions = np.concatenate([[min(self.jerk, cruise[0])],
+                                        np.minimum(np.minimum(cruise[:-1], cruise[1:]), corner),
+                                        [min(self.jerk, cruise[-1])]])
+            speeds = np.sqrt(limited_speeds(junctions ** 2, 2 * self.acceleration * lengths))
+
+            move_times[ops] = trapezoid_times(speeds[:-1], speeds[1:], cruise, lengths, self.acceleration)
+
+        # filament laid down by extruding moves, retractions and their recoveries are not counted
+        filament = np.where(trajectory.extruding(), e_deltas, 0.0)
+        grams_per_mm = np.pi * (self.filament_diameter / 2) ** 2 * self.filament_density / 1000.0
+
+        if len(layers):
+            layer_times = np.add.reduceat(move_times, layers.starts)
+            layer_filament = np.add.reduceat(filament, layers.starts)
+        else:
+            layer_times, layer_filament = np.zeros(0), np.zeros(0)
+
+        return PrintEstimate(float(move_times.sum()), float(filament.sum()), float(filament.sum() * grams_per_mm),
+                             layer_times, layer_filament, layer_filament * grams_per_mm, move_times)
+
+
+def format_duration(seconds):
+    # 3125.4 -> "52m 5s", 7265 -> "2h 1m 5s"
+    seconds = int(round(seconds))
+    hours, minutes, seconds = seconds // 3600, seconds // 60 % 60, seconds % 60
+    if hours:
+        return f"{hours}h {minutes}m {seconds}s"
+    return f"{minutes}m {seconds}s"
@@ -10,7 +10,12 @@ class TopBottomDetection:
     def __init__(self, zslicer):
         self.zslicer = zslicer
         
-        self.layer_height =  zslicer.z_slices[1].z0 - zslicer.z_slices[0].z0
+        # the spacing of the slicing planes, from the slices only if compute_z_range() has not run
+        z_range = getattr(zslicer, 'z_range', None)
+        if z_range is not None and len(z_range) >= 2:
+            self.layer_height = z_range[1] - z_range[0]
+        else:
+            self.layer_height =  zslicer.z_slices[1].z0 - zslicer.z_slices[0].z0
 
     def getSurfaces(self, tolerance=.5):
         top_normals = []
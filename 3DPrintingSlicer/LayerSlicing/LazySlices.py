@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import numpy as np
+
+from LayerSlicing.ZSlice import ZSlice
+from Perimeters.PerimeterGenerator import PerimeterGenerator
+
+
+def estimate_layer_bytes(z_slice):
+    # rough footprint of a computed layer: its arrays plus 16 bytes per polygon coordinate
+    total = z_slice.vertices.nbytes + z_slice.edges.nbytes
+    infill_slice = z_slice.infill_slice
+    if infill_slice is not None:
+        for array in (infill_slice.infill_vertices, infill_slice.infill_edges,
+                      infill_slice.all_vertices, infill_slice.all_edges):
+            total += np.asarray(array).nbytes
+        total += sum(16 * len(polygon.exterior.coords) for polygon in infill_slice.polygons)
+    return total
+
+
+class LazySlices(Sequence):
+    # ZSlices that are sliced, perimetered and infilled the first time they are accessed,
+    # kept in an LRU under a memory cap and filled in by a background thread
+
+    def __init__(self, z_slicer, z_range, line_width, wall_count, memory_cap=256 * 1024 * 1024, prefetch_window=5):
+        self.z_slicer = z_slicer
+        self.z_range = np.asarray(z_range)
+        self.line_width = line_width
+        self.wall_count = wall_count
+        self.memory_cap = memory_cap # bytes of computed layers kept before the least recently used are dropped
+        self.prefetch_window = prefetch_window # layers on each side of the focus computed ahead of time
+
+        self.layers = OrderedDict() # index -> ZSlice, least recently used first
+        self.layer_bytes = {} # index -> estimated bytes
+        self.total_bytes = 0
+        self.lock = threading.RLock()
+        self.in_flight = set() # indices being computed, by the background thread or a reader
+        self.layer_done = threading.Condition(self.lock) # notified whenever an in-flight layer finishes
+        self.failed = {} # index -> error of layers the background thread could not compute, not retried by it
+
+        self.focus = 0
+        self.requested = set() # window layers already computed for the current focus
+        self.fill_all = False
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def __len__(self):
+        return len(self.z_range)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("layer index out of range")
+
+        with self.lock:
+            while index in self.in_flight:
+                # another thread is computing it, wait for that instead of computing it twice
+                self.layer_done.wait()
+            if index in self.layers:
+                self.layers.move_to_end(index)
+                return self.layers[index]
+            self.in_flight.add(index)
+
+        return self.compute_and_store(index)
+
+    def is_computed(self, index):
+        with self.lock:
+            return index in self.layers
+
+    def computed(self, index):
+        # the layer if it is cached, None otherwise; never computes it
+        with self.lock:
+            z_slice = self.layers.get(index)
+            if z_slice is not None:
+                self.layers.move_to_end(index)
+            return z_slice
+
+    def computed_count(self):
+        with self.lock:
+            return len(self.layers)
+
+    def compute_layer(self, index):
+        z_slice = ZSlice(self.z_range[index])
+        z_slice.slice_mesh(self.z_slicer.vertices, self.z_slicer.faces, self.z_slicer.normals)
+
+        perimeter_generator = PerimeterGenerator(z_slice)
+        perimeters = perimeter_generator.createPerimeters(self.line_width, self.wall_count)
+        self.z_slicer.generate_infill_slice(z_slice, perimeter_generator, perimeters,
+                                            self.line_width, self.wall_count)
+        return z_slice
+
+    def compute_and_store(self, index):
+        # index has been added to in_flight; the layer is computed without the lock so cached
+        # layers stay readable meanwhile, and stored once it is done
+        z_slice = None
+        try:
+            z_slice = self.compute_layer(index)
+        finally:
+            with self.lock:
+                self.in_flight.discard(index)
+                if z_slice is not None:
+                    if index in self.layers:
+                        z_slice = self.layers[index]
+                    else:
+                        self.store(index, z_slice)
+                self.layer_done.notify_all()
+        return z_slice
+
+    def store(self, index, z_slice):
+        size = estimate_layer_bytes(z_slice)
+        self.layers[index] = z_slice
+        self.layer_bytes[index] = size
+        self.total_bytes += size
+
+        # evict least recently used layers, but never the one just computed
+        while self.total_bytes > self.memory_cap and len(self.layers) > 1:
+            evicted, _ = self.layers.popitem(last=False)
+            self.total_bytes -= self.layer_bytes.pop(evicted)
+            # the cap is reached, filling further would only evict layers again
+            self.fill_all = False
+
+    def prefetch(self, index):
+        # moves the focus, the background thread computes the window around it first
+        with self.lock:
+            if index != self.focus:
+                self.requested.clear()
+            self.focus = index
+        self.ensure_thread()
+        self.wake.set()
+
+    def start_background_fill(self):
+        self.fill_all = True
+        self.ensure_thread()
+        self.wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def ensure_thread(self):
+        if self.thread is None and not self.stopped:
+            self.thread = threading.Thread(target=self.background_loop, daemon=True)
+            self.thread.start()
+
+    def next_missing(self):
+        # nearest missing layer inside the prefetch window, then any missing layer while under the cap;
+        # the layer returned is marked in flight
+        focus = min(max(self.focus, 0), len(self) - 1)
+        with self.lock:
+            for offset in range(self.prefetch_window + 1):
+                for index in (focus + offset, focus - offset):
+                    if (0 <= index < len(self) and index not in self.layers and index not in self.requested
+                            and index not in self.in_flight and index not in self.failed):
+                        self.requested.add(index)
+                        self.in_flight.add(index)
+                        return index
+
+            if not self.fill_all:
+                return None
+
+            for index in range(len(self)):
+                if index not in self.layers and index not in self.in_flight and index not in self.failed:
+                    self.in_flight.add(index)
+                    return index
+        return None
+
+    def background_loop(self):
+        while not self.stopped:
+            index = self.next_missing()
+            if index is None:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+
+            # a layer that fails (e.g. invalid geometry) is reported and skipped, the thread goes on with the rest;
+            # reading it still computes it again in the reader's thread and raises there
+            try:
+                self.compute_and_store(index)
+            except Exception as e:
+                print(f"Layer {index} could not be computed: {e}")
+                with self.lock:
+                    self.failed[index] = e
+
+
+class LazyInfillSlices(Sequence):
+    # view of the InfillSlices of a LazySlices sequence, for GCodeGenerator
+
+    def __init__(self, lazy_slices):
+        self.lazy_slices = lazy_slices
+
+    def __len__(self):
+        return len(self.lazy_slices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.lazy_slices[index].infill_slice
@@ -6,6 +6,7 @@ import struct
 from Infill.InfillGenerator import InfillGenerator
 from Infill.InfillSlice import InfillSlice
 from Infill.TopBottomDetection import TopBottomDetection
+from LayerSlicing.LazySlices import LazySlices, LazyInfillSlices
 from LayerSlicing.ZSlice import ZSlice
 from Perimeters.PerimeterGenerator import PerimeterGenerator
 
@@ -39,6 +40,7 @@ class ZSlicer:
     def __init__(self):
         self.z_slices = []
         self.infill_slices = []
+        self.z_range = np.empty(0) # z values of the slicing planes
         self.vertices = np.empty((0, 3)) # list of vertices (x, y, z)
         self.edges = np.empty((0, 2), dtype=int) # list of (index1, index2) of vertices
         self.faces = np.empty((0, 3), dtype=int) # list of (index1, index2, index3) of vertices
@@ -47,33 +49,56 @@ class ZSlicer:
         self.max_z = 0
         self.file_name = ""
 
-    def generate_infill_slices(self, line_width, wall_count):
-        self.infill_slices = []
+    def generate_contours(self):
+        # PerimeterGenerator assembles the closed contour polygons of each slice
+        return [PerimeterGenerator(z_slice) for z_slice in self.get_slices()]
+
+    def generate_perimeters(self, line_width, wall_count, perimeter_generators=None):
+        if perimeter_generators is None:
+            perimeter_generators = self.generate_contours()
+
+        perimeter_results = [] # list of (PerimeterGenerator, perimeters) for each slice
 
-        for z_slice in self.get_slices():
-            z0 = z_slice.z0
-            perimeter_generator = PerimeterGenerator(z_slice)
+        for perimeter_generator in perimeter_generators:
             perimeters = perimeter_generator.createPerimeters(line_width,
                                                               wall_count)
+            perimeter_results.append((perimeter_generator, perimeters))
 
-            top_bottom_detector = TopBottomDetection(self)
-            top_polygons, bottom_polygons = top_bottom_detector.getPolygonsfromZ()
+        return perimeter_results
 
-            infill_generator = InfillGenerator(top_polygons, bottom_polygons)
-            infill = infill_generator.create_infill(
-                perimeter_generator.polygons, line_width, wall_count,
-                z_slice.z0)
-            infill_vertices, infill_edges = infill_generator.get_vertices_edges()
+    def generate_infill(self, perimeter_results, line_width, wall_count):
+        self.infill_slices = []
 
-            infill_slice = InfillSlice(z0, perimeters, infill_vertices,
-                                       infill_edges)
-            z_slice.infill_slice = infill_slice
+        for z_slice, (perimeter_generator, perimeters) in zip(self.get_slices(), perimeter_results):
+            infill_slice = self.generate_infill_slice(z_slice, perimeter_generator, perimeters,
+                                                      line_width, wall_count)
             self.infill_slices.append(infill_slice)
 
+    def generate_infill_slice(self, z_slice, perimeter_generator, perimeters, line_width, wall_count):
+        z0 = z_slice.z0
+
+        top_bottom_detector = TopBottomDetection(self)
+        top_polygons, bottom_polygons = top_bottom_detector.getPolygonsfromZ()
+
+        infill_generator = InfillGenerator(top_polygons, bottom_polygons)
+        infill = infill_generator.create_infill(
+            perimeter_generator.polygons, line_width, wall_count,
+            z_slice.z0)
+        infill_vertices, infill_edges = infill_generator.get_vertices_edges()
+
+        infill_slice = InfillSlice(z0, perimeters, infill_vertices,
+                                   infill_edges)
+        z_slice.infill_slice = infill_slice
+        return infill_slice
+
+    def generate_infill_slices(self, line_width, wall_count):
+        perimeter_results = self.generate_perimeters(line_width, wall_count)
+        self.generate_infill(perimeter_results, line_width, wall_count)
+
     def get_slices(self):
         return self.z_slices
 
-    def compute_slices_from_stl(self, file_name, specify_height=False, num=50, line_width=0.5, wall_count=4):
+    def load_stl(self, file_name):
         self.file_name = file_name
 
         is_ascii = check_if_ascii(file_name)
@@ -81,19 +106,23 @@ class ZSlicer:
         self.load_ascii_stl(file_name) if is_ascii else self.read_binary_stl(file_name)
         self.min_z, self.max_z = get_min_max_z(self.vertices)
 
+    def compute_z_range(self, specify_height=False, num=50):
         if specify_height:
             if num >= (self.max_z - self.min_z) / 2 or num <= 0:
                 print("Layer height too large for model height.")
-                return
+                return None
             z_range = np.arange(self.min_z, self.max_z + num, num)
         else:
             if num <= 1:
                 print("Number of layers must be greater than 1.")
-                return
+                return None
             z_range = np.linspace(self.min_z, self.max_z, num)
 
         z_range[-1] = self.max_z - 1e-5
+        self.z_range = z_range
+        return z_range
 
+    def slice_layers(self, z_range):
         self.z_slices = []
 
         for z in z_range:
@@ -102,6 +131,21 @@ class ZSlicer:
 
             self.z_slices.append(z_slice)
 
+    def compute_slices_from_stl(self, file_name, specify_height=False, num=50, line_width=0.5, wall_count=4,
+                                lazy=False, memory_cap=256 * 1024 * 1024):
+        self.load_stl(file_name)
+
+        z_range = self.compute_z_range(specify_height, num)
+        if z_range is None:
+            return
+
+        if lazy:
+            # layers are computed on first access, see LazySlices
+            self.z_slices = LazySlices(self, z_range, line_width, wall_count, memory_cap)
+            self.infill_slices = LazyInfillSlices(self.z_slices)
+            return
+
+        self.slice_layers(z_range)
         self.generate_infill_slices(line_width, wall_count)
 
     def load_ascii_stl(self, filename):
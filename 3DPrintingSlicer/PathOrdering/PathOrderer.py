@@ -0,0 +1,230 @@
+import time
+
+import numpy as np
+
+
+def travel_distance(paths, closed, position):
+    # total length of the non-extruding moves from position through paths in the given order
+    if not paths:
+        return 0.0
+    entries = np.array([path[0] for path in paths])
+    exits = np.array([path[0] if is_closed else path[-1] for path, is_closed in zip(paths, closed)])
+    previous = np.vstack([np.asarray(position, dtype=float)[None, :], exits[:-1]])
+    return float(np.hypot(*(entries - previous).T).sum())
+
+
+class PathOrderer:
+    # Reorders the paths of a layer to cut travel moves between them: greedy nearest neighbor over a
+    # grid of path endpoints, then a bounded 2-opt. Open paths may be reversed, closed loops keep their
+    # direction but may start at a different vertex.
+    # The greedy tour is sequential, one Python step per path: each step looks at the few grid cells
+    # around the current position, or makes one vectorized pass over all n endpoints when the nearest
+    # one is farther away, so it is O(n) steps of O(1) expected cost and O(n^2) numpy work at worst.
+    # The 2-opt passes are vectorized over all paths, O(n * window) per pass.
+
+    def __init__(self, window=32, max_passes=50, grid_threshold=64, max_ring=8):
+        self.window = window # longest run of paths a 2-opt move may reverse
+        self.max_passes = max_passes # 2-opt improvement passes per path group
+        self.grid_threshold = grid_threshold # below this many paths the nearest neighbor search is brute force
+        self.max_ring = max_ring # rings of grid cells searched around a point before searching every endpoint
+
+        self.travel_before = 0.0
+        self.travel_after = 0.0
+        self.layer_times = []
+
+    def order(self, paths, closed, position):
+        # paths: list of (N, 2) arrays, closed: whether each path is a loop (last vertex joins the first)
+        # returns the reordered paths and the position the last one ends at
+        if not paths:
+            return [], position
+
+        position = np.asarray(position, dtype=float)
+        closed = np.asarray(closed, dtype=bool)
+        self.travel_before += travel_distance(paths, closed, position)
+
+        starts = np.array([path[0] for path in paths], dtype=float)
+        ends = np.array([path[-1] for path in paths], dtype=float)
+        ends[closed] = starts[closed]
+
+        order, reversed_paths = self.nearest_neighbor(starts, ends, position)
+        order, reversed_paths = self.two_opt(starts, ends, order, reversed_paths, position)
+
+        ordered = []
+        for index, is_reversed in zip(order, reversed_paths):
+            path = paths[index]
+            ordered.append(path[::-1] if is_reversed and not closed[index] else path)
+        ordered_closed = closed[order]
+
+        ordered = self.choose_seams(ordered, ordered_closed, position)
+        self.travel_after += travel_distance(ordered, ordered_closed, position)
+
+        last = ordered[-1]
+        return ordered, (last[0] if ordered_closed[-1] else last[-1])
+
+    def order_layer(self, perimeters, infill_paths, position):
+        # perimeters are printed before infill, each group is ordered on its own
+        start_time = time.perf_counter()
+        perimeters, position = self.order(perimeters, [True] * len(perimeters), position)
+        infill_paths, position = self.order(infill_paths, [False] * len(infill_paths), position)
+        self.layer_times.append(time.perf_counter() - start_time)
+        return perimeters, infill_paths, position
+
+    def nearest_neighbor(self, starts, ends, position):
+        # greedy tour: always travel to the closest unvisited path endpoint, entering through it
+        count = len(starts)
+        points = np.vstack([starts, ends]) # endpoint k belongs to path k % count, which is reversed if k >= count
+        visited = np.zeros(count, dtype=bool)
+        order = np.empty(count, dtype=int)
+        reversed_paths = np.zeros(count, dtype=bool)
+
+        grid = EndpointGrid(points, count) if count > self.grid_threshold else None
+
+        current = position
+        for step in range(count):
+            endpoint = grid.nearest(current, visited, self.max_ring) if grid is not None else -1
+            if endpoint < 0:
+                distances = np.hypot(*(points - current).T)
+                distances[np.concatenate([visited, visited])] = np.inf
+                endpoint = int(np.argmin(distances))
+
+            index = endpoint % count
+            visited[index] = True
+            order[step] = index
+            reversed_paths[step] = endpoint >= count
+            current = starts[index] if reversed_paths[step] else ends[index]
+
+        return order, reversed_paths
+
+    def two_opt(self, starts, ends, order, reversed_paths, position):
+        # Reversing the run of paths at positions i..j swaps each path's entry and exit, so only the
+        # travel into i and out of j changes. Gains for every (i, j <= i + window) are computed at once
+        # and the best non-overlapping moves are applied together each pass.
+        count = len(order)
+        if count < 2:
+            return order, reversed_paths
+
+        order = order.copy()
+        reversed_paths = reversed_paths.copy()
+        offsets = np.arange(min(self.window, count))
+
+        for _ in range(self.max_passes):
+            entries = np.where(reversed_paths[:, None], ends[order], starts[order])
+            exits = np.where(reversed_paths[:, None], starts[order], ends[order])
+            previous = np.vstack([position[None, :], exits[:-1]])
+
+            i = np.arange(count)[:, None]
+            j = i + offsets[None, :]
+            valid = j < count
+            j = np.minimum(j, count - 1)
+            has_next = j + 1 < count
+            following = entries[np.minimum(j + 1, count - 1)]
+
+            old = np.hypot(*(previous[i] - entries[i]).transpose(2, 0, 1)) \
+                + np.where(has_next, np.hypot(*(exits[j] - following).transpose(2, 0, 1)), 0.0)
+            new = np.hypot(*(previous[i] - exits[j]).transpose(2, 0, 1)) \
+                + np.where(has_next, np.hypot(*(entries[i] - following).transpose(2, 0, 1)), 0.0)
+            gains = np.where(valid, old - new, 0.0)
+
+            best = np.argmax(gains, axis=1)
+            best_gains = gains[np.arange(count), best]
+            candidates = np.flatnonzero(best_gains > 1e-9)
+            if len(candidates) == 0:
+                break
+
+            # a move touches the travel into i and out of j, moves that share one of those cannot combine
+            taken = np.zeros(count + 1, dtype=bool)
+            for start in candidates[np.argsort(-best_gains[candidates])]:
+                end = start + best[start]
+                if taken[start:end + 2].any():
+                    continue
+                taken[start:end + 2] = True
+                order[start:end + 1] = order[start:end + 1][::-1]
+                reversed_paths[start:end + 1] = ~reversed_paths[start:end + 1][::-1]
+
+        return order, reversed_paths
+
+    def choose_seams(self, paths, closed, position):
+        # starts each loop at the vertex that minimizes the travel into it plus the travel out of it
+        paths = list(paths)
+        current = position
+        for k, path in enumerate(paths):
+            if closed[k] and len(path) > 1:
+                loop = path[:-1] if np.array_equal(path[0], path[-1]) else path
+                cost = np.hypot(*(loop - current).T)
+                if k + 1 < len(paths):
+                    cost = cost + np.hypot(*(loop - paths[k + 1][0]).T)
+                seam = int(np.argmin(cost))
+                if seam != 0:
+                    loop = np.roll(loop, -seam, axis=0)
+                    path = np.vstack([loop, loop[:1]]) if len(loop) < len(path) else loop
+                    paths[k] = path
+                current = path[0]
+            else:
+                current = path[-1]
+        return paths
+
+    def report(self):
+        if not self.layer_times:
+            return "Path ordering: no layers ordered"
+        saved = 1 - self.travel_after / self.travel_before if self.travel_before else 0.0
+        return (f"Path ordering: travel {self.travel_before:.1f}mm -> {self.travel_after:.1f}mm "
+                f"({saved:.1%} less), {np.mean(self.layer_times) * 1000:.2f}ms per layer "
+                f"over {len(self.layer_times)} layers")
+
+
+class EndpointGrid:
+    # uniform grid bucketing of path endpoints for nearest unvisited endpoint queries
+
+    def __init__(self, points, count):
+        self.points = points
+        self.count = count
+        self.origin = points.min(axis=0)
+        extent = np.maximum(points.max(axis=0) - self.origin, 1e-9)
+        # about two endpoints per cell
+        self.cell_size = max(float(np.sqrt(extent[0] * extent[1] / max(len(points) / 2, 1))), float(extent.max()) / 1024, 1e-9)
+        self.shape = (extent // self.cell_size).astype(int) + 1
+
+        cells = self.cell_of(points)
+        keys = cells[:, 0] * self.shape[1] + cells[:, 1]
+        sort = np.argsort(keys, kind='stable')
+        unique_keys, first = np.unique(keys[sort], return_index=True)
+        self.cells = dict(zip(unique_keys.tolist(), np.split(sort, first[1:])))
+
+    def cell_of(self, points):
+        return np.clip(((points - self.origin) // self.cell_size).astype(int), 0, self.shape - 1)
+
+    def nearest(self, point, visited, max_ring=None):
+        # nearest unvisited endpoint, -1 if it is not within max_ring rings of cells around the point,
+        # so a query walks at most (2 * max_ring + 1)^2 cells
+        cx, cy = self.cell_of(np.asarray(point)[None, :])[0]
+        # distance from the point to the border of its own cell, anything past ring r is at least this + r cells away
+        offset = np.asarray(point) - (self.origin + np.array([cx, cy]) * self.cell_size)
+        margin = max(0.0, float(min(offset.min(), (self.cell_size - offset).min())))
+
+        best, best_distance = -1, np.inf
+        for ring in range(int(max(self.shape)) + 1):
+            if best >= 0 and best_distance <= margin + (ring - 1) * self.cell_size:
+                break
+            if max_ring is not None and ring > max_ring:
+                return -1
+            for x in range(cx - ring, cx + ring + 1):
+                if not 0 <= x < self.shape[0]:
+                    continue
+                ys = range(cy - ring, cy + ring + 1) if abs(x - cx) == ring else (cy - ring, cy + ring)
+                for y in ys:
+                    if not 0 <= y < self.shape[1]:
+                        continue
+                    candidates = self.cells.get(x * self.shape[1] + y)
+                    if candidates is None:
+                        continue
+                    candidates = candidates[~visited[candidates % self.count]]
+                    if len(candidates) == 0:
+                        # every endpoint in this cell is used, skip it on later queries
+                        del self.cells[x * self.shape[1] + y]
+                        continue
+                    self.cells[x * self.shape[1] + y] = candidates
+                    distances = np.hypot(*(self.points[candidates] - point).T)
+                    k = int(np.argmin(distances))
+                    if distances[k] < best_distance:
+                        best, best_distance = int(candidates[k]), float(distances[k])
+        return best
@@ -0,0 +1,196 @@
+import argparse
+import hashlib
+import os
+import sys
+
+from GCode.ArcFitter import ArcFitter
+from GCode.GCodeGenerator import GCodeGenerator
+from LayerSlicing.ZSlice import ZSlice
+from LayerSlicing.ZSlicer import ZSlicer, get_min_max_z
+from PathOrdering.PathOrderer import PathOrderer
+from Perimeters.PerimeterGenerator import PerimeterGenerator
+from Pipeline.StageCache import StageCache
+
+
+class SlicingCancelled(Exception):
+    pass
+
+
+def file_content_hash(file_name, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_key(stage, upstream_key, *params):
+    # a stage is identified by its upstream result plus its own parameters
+    digest = hashlib.sha1(f"{stage}|{upstream_key}|{params!r}".encode())
+    return f"{stage}-{digest.hexdigest()}"
+
+
+class SlicingPipeline:
+    # mesh -> contours -> perimeters -> infill, each memoized in a StageCache, then G-code written from the infill
+
+    STAGES = ("mesh", "contours", "perimeters", "infill")
+
+    def __init__(self, z_slicer, cache=None, order_paths=True, workers=1, arc_tolerance=None):
+        self.z_slicer = z_slicer
+        self.cache = cache if cache is not None else StageCache()
+        self.order_paths = order_paths # reorder each layer's paths to shorten travel before writing G-code
+        self.path_orderer = None # PathOrderer of the last G-code that was actually generated
+        self.workers = workers # processes formatting G-code layers
+        self.arc_tolerance = arc_tolerance # mm, fit G2/G3 arcs to the paths when set
+        self.arc_fitter = None # ArcFitter of the last G-code that was actually generated
+        self.stage_status = {} # stage -> "cached" or "computed" for the last run
+        self.infill_key = None
+
+    def stage(self, name, key, compute):
+        hit, value = self.cache.get(key)
+        if not hit:
+            value = compute()
+            self.cache.put(key, value)
+        self.stage_status[name] = "cached" if hit else "computed"
+        return value
+
+    def run(self, file_name, specify_height=False, num=50, line_width=0.5, wall_count=4, progress=None):
+        # progress(done, total, z_slice) is called once a layer is fully computed and may
+        # raise SlicingCancelled to abort; nothing partial is stored in the cache
+        self.stage_status = {}
+        self.infill_key = None
+        z_slicer = self.z_slicer
+
+        mesh_key = stage_key("mesh", file_content_hash(file_name))
+        mesh = self.stage("mesh", mesh_key, lambda: self.load_mesh(file_name))
+        z_slicer.file_name = file_name
+        z_slicer.vertices, z_slicer.faces, z_slicer.normals, z_slicer.edges = mesh
+        z_slicer.min_z, z_slicer.max_z = get_min_max_z(z_slicer.vertices)
+
+        z_range = z_slicer.compute_z_range(specify_height, num)
+        if z_range is None:
+            return False
+
+        # keys only depend on upstream keys, so every layer stage can be looked up before computing
+        contour_key = stage_key("contours", mesh_key, bool(specify_height), float(num))
+        perimeter_key = stage_key("perimeters", contour_key, float(line_width), int(wall_count))
+        infill_key = stage_key("infill", perimeter_key)
+
+        cached = {}
+        for name, key in (("contours", contour_key), ("perimeters", perimeter_key), ("infill", infill_key)):
+            hit, value = self.cache.get(key)
+            if not hit:
+                break
+            cached[name] = value
+
+        z_slices, perimeter_generators, perimeter_results, infill_slices = self.run_layers(
+            z_range, line_width, wall_count, cached, progress)
+
+        for name, key, value in (("contours", contour_key, (z_slices, perimeter_generators)),
+                                 ("perimeters", perimeter_key, perimeter_results),
+                                 ("infill", infill_key, infill_slices)):
+            if name in cached:
+                self.stage_status[name] = "cached"
+            else:
+                self.cache.put(key, value)
+                self.stage_status[name] = "computed"
+
+        z_slicer.z_slices = z_slices
+        z_slicer.infill_slices = infill_slices
+        self.infill_key = infill_key
+        return True
+
+    def run_layers(self, z_range, line_width, wall_count, cached, progress=None):
+        # computes the missing layer stages one layer at a time so each finished layer can be reported
+        z_slicer = self.z_slicer
+
+        if "contours" in cached:
+            z_slices, perimeter_generators = cached["contours"]
+        else:
+            # all slices exist up front so layer spacing is known while the first layers are processed
+            z_slices = [ZSlice(z) for z in z_range]
+            perimeter_generators = []
+        z_slicer.z_slices = z_slices
+
+        perimeter_results = cached.get("perimeters", [])
+        infill_slices = cached.get("infill", [])
+        total = len(z_slices)
+
+        for i, z_slice in enumerate(z_slices):
+            if "contours" not in cached:
+                z_slice.slice_mesh(z_slicer.vertices, z_slicer.faces, z_slicer.normals)
+                perimeter_generators.append(PerimeterGenerator(z_slice))
+
+            if "perimeters" not in cached:
+                perimeter_generator = perimeter_generators[i]
+                perimeter_results.append(
+                    (perimeter_generator, perimeter_generator.createPerimeters(line_width, wall_count)))
+
+            if "infill" not in cached:
+                perimeter_generator, perimeters = perimeter_results[i]
+                infill_slices.append(z_slicer.generate_infill_slice(
+                    z_slice, perimeter_generator, perimeters, line_width, wall_count))
+            else:
+                z_slice.infill_slice = infill_slices[i]
+
+            if progress is not None:
+                progress(i + 1, total, z_slice)
+
+        return z_slices, perimeter_generators, perimeter_results, infill_slices
+
+    def load_mesh(self, file_name):
+        z_slicer = ZSlicer()
+        z_slicer.load_stl(file_name)
+        return z_slicer.vertices, z_slicer.faces, z_slicer.normals, z_slicer.edges
+
+    def make_generator(self):
+        self.path_orderer = PathOrderer() if self.order_paths else None
+        self.arc_fitter = ArcFitter(self.arc_tolerance) if self.arc_tolerance else None
+        return GCodeGenerator(self.z_slicer.infill_slices, self.path_orderer, self.workers,
+                              arc_fitter=self.arc_fitter)
+
+    def write_gcode(self, output_file, output_format=None):
+        # output_format as in GCodeGenerator.generate_gcode, implied by the extension by default. The G-code
+        # is not cached: it is streamed from the cached infill into the output, layer by layer.
+        if self.infill_key is None:
+            print("No infill slice information available.")
+            return False
+        return self.make_generator().generate_gcode(output_file, output_format)
+
+    def status_summary(self):
+        return ", ".join(f"{name} {status}" for name, status in self.stage_status.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Slice an STL to G-code, reusing cached stages between runs.")
+    parser.add_argument("stl_file")
+    parser.add_argument("output_file", help="G-code file, gzip/zstd compressed if it ends in .gz/.zst, binary moves for .gbin")
+    parser.add_argument("--layer-height", type=float, default=1.0)
+    parser.add_argument("--line-width", type=float, default=0.5)
+    parser.add_argument("--wall-count", type=int, default=3)
+    parser.add_argument("--cache-dir", default=".slicer_cache")
+    parser.add_argument("--max-cache-mb", type=float, default=1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes formatting G-code layers")
+    parser.add_argument("--arc-tolerance", type=float, help="Fit G2/G3 arcs within this many mm of the paths")
+    parser.add_argument("--no-path-ordering", action="store_true", help="Keep paths in the order they were generated")
+    args = parser.parse_args(argv)
+
+    cache = StageCache(cache_dir=args.cache_dir, max_disk_bytes=int(args.max_cache_mb * 1024 * 1024))
+    pipeline = SlicingPipeline(ZSlicer(), cache, order_paths=not args.no_path_ordering,
+                               workers=args.workers, arc_tolerance=args.arc_tolerance)
+
+    if not pipeline.run(args.stl_file, specify_height=True, num=args.layer_height,
+                        line_width=args.line_width, wall_count=args.wall_count):
+        return 1
+    if not pipeline.write_gcode(args.output_file):
+        return 1
+
+    print(f"Wrote {args.output_file} ({pipeline.status_summary()})")
+    for report in (pipeline.path_orderer, pipeline.arc_fitter):
+        if report is not None:
+            print(report.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
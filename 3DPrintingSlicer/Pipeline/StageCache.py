@@ -0,0 +1,92 @@
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+
+class StageCache:
+    def __init__(self, max_memory_bytes=256 << 20, cache_dir=None, max_disk_bytes=1 << 30):
+        self.max_memory_bytes = max_memory_bytes # total pickled size of the stage results kept in memory
+        self.cache_dir = cache_dir # optional directory for pickled stage results, shared between runs
+        self.max_disk_bytes = max_disk_bytes # total size of cache_dir before the oldest entries are evicted
+        self.entries = OrderedDict() # key -> (stage result, pickled size), least recently used first
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, self.entries[key][0]
+
+        if self.cache_dir:
+            path = self.disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                    size = f.tell()
+            except (OSError, EOFError, pickle.UnpicklingError):
+                value = None
+            else:
+                os.utime(path) # mark as recently used for eviction
+                self.remember(key, value, size)
+                self.hits += 1
+                return True, value
+
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        # the pickle measures the result for the memory budget and is what goes to disk
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.remember(key, value, len(data))
+
+        if self.cache_dir:
+            # write to a temporary file first so readers never see a partial pickle
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.disk_path(key))
+            self.evict_disk()
+
+    def remember(self, key, value, size):
+        # a result larger than the whole budget is not kept in memory at all
+        if key in self.entries:
+            self.memory_bytes -= self.entries.pop(key)[1]
+        if size > self.max_memory_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes:
+            self.memory_bytes -= self.entries.popitem(last=False)[1][1]
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def evict_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        self.entries.clear()
+        self.memory_bytes = 0
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
@@ -1,4 +1,5 @@
 import os
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QSlider, QLabel,
                              QCheckBox,
@@ -10,6 +11,13 @@ from PyQt5.QtGui import QFont, QPalette, QColor, QIcon
 import matplotlib
 
 from GCode.GCodeGenerator import GCodeGenerator
+from GCode.PrintTimeEstimator import format_duration
+from PathOrdering.PathOrderer import PathOrderer
+from Pipeline.SlicingPipeline import SlicingPipeline
+from Rendering.LayerLOD import LayerLOD
+from Rendering.LayerSegmentBuffer import CONTOUR, INFILL, PERIMETER, LayerSegmentBuffer, LayerSegmentSlots
+from Rendering.RedrawScheduler import RedrawScheduler
+from Rendering.SlicingWorker import SlicingWorker
 
 matplotlib.use('Qt5Agg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -27,17 +35,37 @@ class InfillVisualizer3D(QMainWindow):
         self.draw_infill = True
         self.autoplay = None
         self.z_slicer = z_slicer
+        self.pipeline = SlicingPipeline(z_slicer)
+        self.slicing_worker = None
+        self.stream_redraw_pending = False
+        self.lazy_layers = False
+        self.sliced_lazily = False  # how the current slices were made, lazy_layers may have been toggled since
+        self.lazy_memory_cap = 512 * 1024 * 1024  # bytes of computed layers kept in on-demand mode
         self.gcode_evaluator = gcode_evaluator
         self.filename = None
         self.slices = []
-        self.visible_slices = {}
-        self.visible_operation_lines = {}
+        self.slice_segments = self.new_slice_segments()
+        self.slice_slots = None  # LayerSegmentSlots of the computed layers in on-demand mode, like slice_segments
+        self.lazy_missing = 0  # visible on-demand layers not computed at the last frame
+        self.lazy_seen_count = 0  # computed on-demand layers at the last frame
+        self.gcode_segments = None  # LayerSegmentBuffer of the loaded G-code's extruding moves
+        self.drawn_lines = None  # the one collection drawing the visible layers or moves
+        self.layer_lods = {}  # LayerLOD of each segment buffer drawn with simplified lower layers
         self.draw_operation_lines = True
+        self.gcode_by_layer = True  # the slider moves through G-code layers instead of single operations
         self.generation_num = 1
         self.specify_height = True
         self.show_all_previous = True
+        self.simplify_lower_layers = True  # draw the layers below the current one at the detail the screen can show
 
         self.step_duration = 500  # milliseconds
+        self.autoplay_started = 0.0  # perf_counter time autoplay started at its current speed
+        self.autoplay_steps = 0  # autoplay steps taken since then
+        # slider and line style changes redraw through here, at most 30 frames a second
+        self.redraw_scheduler = RedrawScheduler(self.render_frame, fps=30)
+        # in on-demand mode, redraws once the background thread has computed layers that are in view
+        self.lazy_refresh_timer = QTimer()
+        self.lazy_refresh_timer.timeout.connect(self.refresh_lazy_layers)
 
         self.setupUI()
         self.setupStyle()
@@ -188,6 +216,11 @@ class InfillVisualizer3D(QMainWindow):
         autoplay_layout.addWidget(self.reset_button)
         layout.addLayout(autoplay_layout)
 
+        # G-code navigation by layer
+        self.by_layer_checkbox = QCheckBox("Step G-code By Layer")
+        self.by_layer_checkbox.setChecked(True)
+        self.by_layer_checkbox.toggled.connect(self.toggle_gcode_by_layer)
+        layout.addWidget(self.by_layer_checkbox)
 
 
         parent_layout.addWidget(group)
@@ -237,6 +270,12 @@ class InfillVisualizer3D(QMainWindow):
         wall_count_layout.addWidget(self.wall_count_input)
         layout.addLayout(wall_count_layout)
 
+        # On-demand layers for large models
+        self.lazy_layers_checkbox = QCheckBox("Compute Layers On Demand")
+        self.lazy_layers_checkbox.setChecked(False)
+        self.lazy_layers_checkbox.toggled.connect(self.toggle_lazy_layers)
+        layout.addWidget(self.lazy_layers_checkbox)
+
         # Apply button
         self.apply_button = QPushButton("Apply Changes")
         self.apply_button.clicked.connect(self.apply_all_settings)
@@ -254,6 +293,11 @@ class InfillVisualizer3D(QMainWindow):
         self.show_all_checkbox.toggled.connect(self.toggle_show_all)
         layout.addWidget(self.show_all_checkbox)
 
+        self.simplify_checkbox = QCheckBox("Simplify Lower Layers")
+        self.simplify_checkbox.setChecked(True)
+        self.simplify_checkbox.toggled.connect(self.toggle_simplify_lower_layers)
+        layout.addWidget(self.simplify_checkbox)
+
         self.show_infill_checkbox = QCheckBox("Show Infill")
         self.show_infill_checkbox.setChecked(True)
         self.show_infill_checkbox.toggled.connect(self.toggle_show_infill)
@@ -347,6 +391,12 @@ class InfillVisualizer3D(QMainWindow):
         self.progress_bar.setVisible(False)
         layout.addWidget(self.progress_bar)
 
+        # Cancel button for background slicing
+        self.cancel_button = QPushButton("Cancel Slicing")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_slicing)
+        layout.addWidget(self.cancel_button)
+
         # Status text
         self.status_text = QTextEdit()
         self.status_text.setMaximumHeight(100)
@@ -499,7 +549,7 @@ class InfillVisualizer3D(QMainWindow):
             self,
             "Select STL or G-Code file",
             "",
-            "STL Files (*.stl);;G-Code Files (*.gcode);;All Files (*)"
+            "STL Files (*.stl);;G-Code Files (*.gcode *.gcode.gz *.gcode.zst *.gbin);;All Files (*)"
         )
 
         if filename:
@@ -509,11 +559,19 @@ class InfillVisualizer3D(QMainWindow):
             self.regenerate()
 
     def write_gcode_to_file(self):
-        gcode_generator = GCodeGenerator(self.z_slicer.infill_slices)
-        finished = gcode_generator.generate_gcode(self.output_filename)
+        if self.sliced_lazily:
+            # computes any layer that is not in memory yet
+            path_orderer = PathOrderer()
+            gcode_generator = GCodeGenerator(self.z_slicer.infill_slices, path_orderer)
+            finished = gcode_generator.generate_gcode(self.output_filename)
+        else:
+            finished = self.pipeline.write_gcode(self.output_filename)
+            path_orderer = self.pipeline.path_orderer
 
         if finished:
             self.log_status(f"G-code written to {self.output_filename}")
+            if path_orderer is not None and path_orderer.layer_times:
+                self.log_status(path_orderer.report())
             self.output_filename = "output.gcode"
 
 
@@ -524,6 +582,9 @@ class InfillVisualizer3D(QMainWindow):
         if not self.filename:
             return
 
+        self.stop_slicing_worker()
+        self.stop_lazy_slices()
+
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.log_status("Processing file...")
@@ -534,26 +595,28 @@ class InfillVisualizer3D(QMainWindow):
         self.ax.set_ylabel('Y (mm)')
         self.ax.set_zlabel('Z (mm)')
 
-        self.visible_slices = {}
-        self.visible_operation_lines = {}
+        self.slice_segments = self.new_slice_segments()
+        self.slice_slots = None
+        self.gcode_segments = None
+        self.drawn_lines = None
+        self.layer_lods = {}
+
+        if self.filename.lower().endswith('.stl'):
+            self.draw_operation_lines = False
+            self.sliced_lazily = self.lazy_layers
+            if self.lazy_layers:
+                self.start_lazy_slices()
+            else:
+                self.start_slicing_worker()
+            return
 
         try:
-            if self.filename.lower().endswith('.stl'):
-                self.draw_operation_lines = False
-                self.z_slicer.compute_slices_from_stl(
-                    self.filename,
-                    specify_height=self.specify_height,
-                    num=self.generation_num,
-                    line_width=self.line_width,
-                    wall_count=self.wall_count
-                )
-                self.progress_bar.setValue(50)
-                self.load_slices()
-            else:
-                self.draw_operation_lines = True
-                self.gcode_evaluator.parse(self.filename)
-                self.progress_bar.setValue(50)
-                self.load_from_gcode()
+            self.draw_operation_lines = True
+            # the first half of the progress bar follows the bytes read
+            self.gcode_evaluator.parse(
+                self.filename, progress=lambda done, total: self.progress_bar.setValue(int(50 * done / max(total, 1))))
+            self.progress_bar.setValue(50)
+            self.load_from_gcode()
 
             self.progress_bar.setValue(100)
             self.log_status("File processed successfully!")
@@ -564,14 +627,165 @@ class InfillVisualizer3D(QMainWindow):
         finally:
             self.progress_bar.setVisible(False)
 
+    def start_slicing_worker(self):
+        self.slices = []
+        self.navigation_slider.blockSignals(True)
+        self.navigation_slider.setMaximum(0)
+        self.navigation_slider.setValue(0)
+        self.navigation_slider.blockSignals(False)
+        self.update_current_info()
+
+        worker = SlicingWorker(self.pipeline, self.filename, self.specify_height,
+                               self.generation_num, self.line_width, self.wall_count)
+        worker.layer_ready.connect(self.on_layer_ready)
+        worker.progress.connect(self.on_slicing_progress)
+        worker.completed.connect(self.on_slicing_completed)
+        worker.cancelled.connect(self.on_slicing_cancelled)
+        worker.failed.connect(self.on_slicing_failed)
+
+        self.slicing_worker = worker
+        self.cancel_button.setVisible(True)
+        worker.start()
+
+    def start_lazy_slices(self):
+        # the pipeline's infill is from an earlier model now, it must not be written for this one
+        self.pipeline.infill_key = None
+        try:
+            self.z_slicer.compute_slices_from_stl(
+                self.filename,
+                specify_height=self.specify_height,
+                num=self.generation_num,
+                line_width=self.line_width,
+                wall_count=self.wall_count,
+                lazy=True,
+                memory_cap=self.lazy_memory_cap
+            )
+            self.navigation_slider.blockSignals(True)
+            self.navigation_slider.setValue(0)
+            self.navigation_slider.blockSignals(False)
+            self.load_slices()
+
+            slices = self.z_slicer.get_slices()
+            if hasattr(slices, 'start_background_fill'):
+                slices.prefetch(0)
+                slices.start_background_fill()
+                self.lazy_refresh_timer.start(250)
+            self.log_status(f"Computing {len(slices)} layers on demand")
+        except Exception as e:
+            self.log_status(f"Error processing file: {str(e)}")
+        finally:
+            self.progress_bar.setVisible(False)
+
+    def stop_lazy_slices(self):
+        self.lazy_refresh_timer.stop()
+        slices = self.z_slicer.get_slices()
+        if hasattr(slices, 'stop'):
+            slices.stop()
+
+    def toggle_lazy_layers(self, checked):
+        self.lazy_layers = checked
+        self.log_status(f"On-demand layers: {'enabled' if checked else 'disabled'}")
+
+    def stop_slicing_worker(self):
+        if self.slicing_worker is None:
+            return
+
+        worker = self.slicing_worker
+        self.slicing_worker = None
+        # disconnect first so a late signal cannot touch the next job's layers
+        for signal in (worker.layer_ready, worker.progress, worker.completed,
+                       worker.cancelled, worker.failed):
+            signal.disconnect()
+        worker.cancel()
+        worker.wait()
+        self.cancel_button.setVisible(False)
+
+    def cancel_slicing(self):
+        if self.slicing_worker is not None:
+            self.slicing_worker.cancel()
+            self.log_status("Cancelling slicing...")
+
+    def on_layer_ready(self, index, z_slice):
+        if index != len(self.slices):
+            return
+
+        following = self.navigation_slider.value() == len(self.slices) - 1
+        self.slices.append(z_slice)
+
+        self.navigation_slider.blockSignals(True)
+        self.navigation_slider.setMaximum(len(self.slices) - 1)
+        if following:
+            self.navigation_slider.setValue(len(self.slices) - 1)
+        self.navigation_slider.blockSignals(False)
+        self.update_current_info()
+
+        if len(self.slices) == 1:
+            # bounds come from the whole mesh so the view does not jump while layers stream in
+            self.compute_axis_limits(self.z_slicer.vertices)
+
+        # redraw at most a few times per second while layers keep arriving
+        if not self.stream_redraw_pending:
+            self.stream_redraw_pending = True
+            QTimer.singleShot(250, self.flush_stream_redraw)
+
+    def flush_stream_redraw(self):
+        self.stream_redraw_pending = False
+        if self.slices and not self.draw_operation_lines:
+            self.update_graphics()
+
+    def on_slicing_progress(self, done, total):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    def on_slicing_completed(self, finished):
+        self.slicing_worker = None
+        self.cancel_button.setVisible(False)
+        self.progress_bar.setVisible(False)
+
+        if not finished:
+            self.log_status("Invalid layer settings for this model.")
+            return
+
+        self.log_status(f"Pipeline: {self.pipeline.status_summary()}")
+        self.load_slices()
+        self.log_status("File processed successfully!")
+
+    def on_slicing_cancelled(self):
+        self.slicing_worker = None
+        self.cancel_button.setVisible(False)
+        self.progress_bar.setVisible(False)
+        self.log_status(f"Slicing cancelled after {len(self.slices)} layers")
+
+    def on_slicing_failed(self, message):
+        self.slicing_worker = None
+        self.cancel_button.setVisible(False)
+        self.progress_bar.setVisible(False)
+        self.log_status(f"Error processing file: {message}")
+
+    def closeEvent(self, event):
+        self.redraw_scheduler.cancel()
+        self.stop_slicing_worker()
+        self.stop_lazy_slices()
+        super().closeEvent(event)
+
     def load_slices(self):
         self.slices = self.z_slicer.get_slices()
+        self.slice_segments = self.new_slice_segments()
+        self.layer_lods = {}
+        if hasattr(self.slices, 'prefetch'):
+            # on-demand layers are packed once computed, each into its own slot
+            self.slice_slots = {True: LayerSegmentSlots((PERIMETER, INFILL)), False: LayerSegmentSlots((CONTOUR,))}
+        else:
+            self.slice_slots = None
+            self.pack_layers(len(self.slices))
+        self.navigation_slider.blockSignals(True)
         self.navigation_slider.setMaximum(max(0, len(self.slices) - 1))
-        self.navigation_slider.setValue(0)
+        self.navigation_slider.setValue(min(self.navigation_slider.value(), len(self.slices) - 1))
+        self.navigation_slider.blockSignals(False)
         self.update_current_info()
 
         # Compute and apply axis limits for STL data
-        self.compute_axis_limits()
+        self.compute_axis_limits(self.z_slicer.vertices)
 
         # Update the graphics after bounds are set
         self.update_graphics()
@@ -581,21 +795,20 @@ class InfillVisualizer3D(QMainWindow):
             self.log_status("Error: G-code evaluator has no operations")
             return
 
-        self.navigation_slider.setMaximum(
-            max(0, len(self.gcode_evaluator.operations) - 1))
+        steps = len(self.gcode_evaluator.layers) if self.gcode_by_layer else len(self.gcode_evaluator.operations)
+        self.navigation_slider.blockSignals(True)
+        self.navigation_slider.setMaximum(max(0, steps - 1))
         self.navigation_slider.setValue(0)
+        self.navigation_slider.blockSignals(False)
 
         # Reset the gcode evaluator state
-        self.gcode_evaluator.index = 0
+        self.gcode_evaluator.seek(0)
 
-        if hasattr(self.gcode_evaluator, 'actual_position'):
-            self.gcode_evaluator.actual_position = [0, 0, 0]  # Reset to origin
-
-        # Clear any existing operation lines
-        for line_collection in self.visible_operation_lines.values():
-            if line_collection in self.ax.collections:
-                line_collection.remove()
-        self.visible_operation_lines = {}
+        # Every extruding move of the file in one array, redraws show a range of it
+        self.gcode_segments = LayerSegmentBuffer.from_gcode(self.gcode_evaluator.layers,
+                                                            self.gcode_evaluator.trajectory,
+                                                            self.gcode_evaluator.memmap_dir)
+        self.layer_lods = {}
 
         # Set default printer bounds for G-code
         self.set_printer_bounds(235, 235, 235)
@@ -603,27 +816,28 @@ class InfillVisualizer3D(QMainWindow):
         self.update_current_info()
         self.log_status(
             f"Loaded G-code with {len(self.gcode_evaluator.operations)} operations")
+        estimate = self.gcode_evaluator.estimate_print()
+        self.log_status(f"Estimated print time {format_duration(estimate.total_time)}, "
+                        f"{estimate.filament_length / 1000:.2f} m / {estimate.filament_mass:.1f} g of filament")
         self.update_graphics()
 
-    def compute_axis_limits(self):
-
-        if not self.slices:
-            return
+    def compute_axis_limits(self, vertices=None):
+        # vertices: optional (n, 3) array to fit instead of the loaded slices
+        if vertices is None and len(self.z_slicer.vertices) > 0:
+            # the mesh bounds avoid touching every slice, which would compute on-demand layers
+            vertices = self.z_slicer.vertices
 
-        x_coords = []
-        y_coords = []
-        z_coords = []
+        if vertices is None:
+            if not self.slices:
+                return
 
-        for slice_data in self.slices:
-            if len(slice_data.vertices) > 0:
-                x_coords.extend(slice_data.vertices[:, 0])
-                y_coords.extend(slice_data.vertices[:, 1])
-                z_coords.extend(slice_data.vertices[:, 2])
+            slice_vertices = [slice_data.vertices for slice_data in self.slices
+                              if len(slice_data.vertices) > 0]
+            vertices = np.concatenate(slice_vertices) if slice_vertices else np.empty((0, 3))
 
-        if x_coords:
-            x_min, x_max = min(x_coords), max(x_coords)
-            y_min, y_max = min(y_coords), max(y_coords)
-            z_min, z_max = min(z_coords), max(z_coords)
+        if len(vertices) > 0:
+            x_min, y_min, z_min = np.min(vertices, axis=0)
+            x_max, y_max, z_max = np.max(vertices, axis=0)
 
             # Add some padding
             x_range = x_max - x_min
@@ -659,6 +873,11 @@ class InfillVisualizer3D(QMainWindow):
                 self.log_status("Auto-computed bounds applied")
 
     def apply_axis_limits(self):
+        if self.set_axis_limits():
+            self.canvas.draw()
+
+    def set_axis_limits(self):
+        # limits from the bounds inputs, without drawing; False if they are not numbers
         try:
             x_min = float(self.x_min_input.text())
             x_max = float(self.x_max_input.text())
@@ -670,11 +889,11 @@ class InfillVisualizer3D(QMainWindow):
             self.ax.set_xlim(x_min, x_max)
             self.ax.set_ylim(y_min, y_max)
             self.ax.set_zlim(z_min, z_max)
-
-            self.canvas.draw()
+            return True
 
         except ValueError as e:
             self.log_status(f"Invalid bounds values: {e}")
+            return False
 
     def toggle_auto_bounds(self, checked):
         # Enable/disable manual input fields
@@ -728,146 +947,157 @@ class InfillVisualizer3D(QMainWindow):
         self.apply_axis_limits()
 
     def update_graphics(self):
-        # Don't clear existing graphics for operation lines - we want them to persist
-        if not self.draw_operation_lines:
-            # Clear existing graphics for slices
-            self.ax.clear()
-            self.ax.set_xlabel('X (mm)')
-            self.ax.set_ylabel('Y (mm)')
-            self.ax.set_zlabel('Z (mm)')
-
-        # Apply current axis limits
-        self.apply_axis_limits()
+        # The drawn collections are updated in place, the axes are only cleared when a file is loaded
+
+        # Apply current axis limits, drawn once below
+        self.set_axis_limits()
 
         current_index = self.navigation_slider.value()
 
-        if self.draw_operation_lines:
+        if self.draw_operation_lines and self.gcode_by_layer:
+            self.update_layer_lines(current_index)
+        elif self.draw_operation_lines:
             self.update_operation_lines(current_index)
         else:
             self.update_slices(current_index)
 
         self.canvas.draw()
 
+    def new_slice_segments(self):
+        # packed segments of the STL layers, by whether infill is drawn: perimeters and infill, or the contours
+        return {True: LayerSegmentBuffer((PERIMETER, INFILL)), False: LayerSegmentBuffer((CONTOUR,))}
+
+    def pack_layers(self, count):
+        # segment arrays of the first count layers, built once per layer
+        for layer in range(len(self.slice_segments[True]), count):
+            z_slice = self.slices[layer]
+            for buffer in self.slice_segments.values():
+                buffer.append_slice(z_slice)
+
+    def fill_slots(self, first, index):
+        # slots of the on-demand layers first..index: layers evicted from the slice cache are dropped,
+        # computed ones are packed, and only the current layer is computed here if it is missing
+        slots = self.slice_slots
+        for layer in slots[True].layers():
+            if not self.slices.is_computed(layer):
+                for layer_slots in slots.values():
+                    layer_slots.discard(layer)
+
+        missing = 0
+        for layer in range(first, index + 1):
+            if layer in slots[True]:
+                continue
+            z_slice = self.slices[layer] if layer == index else self.slices.computed(layer)
+            if z_slice is None:
+                missing += 1
+                continue
+            for layer_slots in slots.values():
+                layer_slots.set_slice(layer, z_slice)
+
+        self.lazy_missing = missing
+        self.lazy_seen_count = self.slices.computed_count()
+        return slots
+
+    def refresh_lazy_layers(self):
+        # the background thread fills in the layers below the current one, drawn as they arrive
+        if self.lazy_missing and not self.draw_operation_lines and self.slices.computed_count() != self.lazy_seen_count:
+            self.redraw_scheduler.request()
+
+    def draw_lines(self, polylines, color):
+        # the one collection is created on the first frame after the axes are cleared, then updated in place
+        if self.drawn_lines is None:
+            self.drawn_lines = Line3DCollection(polylines)
+            self.ax.add_collection3d(self.drawn_lines)
+        else:
+            self.drawn_lines.set_segments(polylines)
+        self.drawn_lines.set_color(color)
+        self.drawn_lines.set_linewidth(self.line_width_slider.value())
+        self.drawn_lines.set_alpha(self.alpha_slider.value() / 100.0)
+
+    def pixel_size(self):
+        # millimetres of the X axis covered by one pixel of the plot, about the detail the screen can show
+        width = max(self.ax.bbox.width, 1.0)
+        x_min, x_max = self.ax.get_xlim3d()
+        return (x_max - x_min) / width
+
+    def visible_polylines(self, buffer, first, last, stop=None):
+        # polylines of layers first..last of a buffer, the last one only up to segment stop if given;
+        # with lower layers simplified they come from the buffer's LayerLOD
+        if stop is None:
+            stop = buffer.starts[last + 1]
+        if not self.simplify_lower_layers or first == last:
+            return buffer.polylines(buffer.starts[first], stop)
+
+        if buffer not in self.layer_lods:
+            self.layer_lods[buffer] = LayerLOD(buffer)
+        return self.layer_lods[buffer].polylines(first, last, self.pixel_size(), stop)
+
     def update_slices(self, index):
         if not self.slices or index >= len(self.slices):
             return
 
-        line_width = self.line_width_slider.value()
-        alpha = self.alpha_slider.value() / 100.0
-
-        if self.show_all_previous:
-            indices = range(index + 1)
+        first = 0 if self.show_all_previous else index
+        if self.slice_slots is not None:
+            # on-demand layers: the computed ones in view, the rest appear as the background fills them in
+            slots = self.fill_slots(first, index)[self.draw_infill]
+            segments = slots.layer_polylines(first, index)
+            z = slots.z[index]
         else:
-            indices = [index]
-
-        for i in indices:
-            slice_data = self.slices[i]
-            slice_vertices = slice_data.infill_slice.all_vertices if self.draw_infill else slice_data.vertices
-            slice_edges = slice_data.infill_slice.all_edges if self.draw_infill else slice_data.edges
-            if len(slice_vertices) == 0 or len(slice_edges) == 0:
-                continue
-
-            lines = []
-            for edge in slice_edges:
-                if edge[0] < len(slice_vertices) and edge[1] < len(
-                        slice_vertices):
-                    lines.append([slice_vertices[edge[0]],
-                                  slice_vertices[edge[1]]])
+            # the visible layers are consecutive rows of the packed buffer, one polyline per layer
+            self.pack_layers(index + 1)
+            buffer = self.slice_segments[self.draw_infill]
+            segments = self.visible_polylines(buffer, first, index)
+            z = buffer.z[index]
+
+        self.draw_lines(segments, 'blue')
+        self.ax.set_title(f'Layer {index + 1}: z = {z:.2f} mm')
+
+    def update_layer_lines(self, index):
+        # The layers up to index (or just index) are one range of the file's segment buffer
+        layers = getattr(self.gcode_evaluator, 'layers', None)
+        if layers is None or self.gcode_segments is None or index < 0 or index >= len(layers):
+            return
 
-            if lines:
-                lc = Line3DCollection(lines, colors='blue',
-                                      linewidths=line_width, alpha=alpha)
-                self.ax.add_collection3d(lc)
+        first = 0 if self.show_all_previous else index
+        self.draw_lines(self.visible_polylines(self.gcode_segments, first, index), 'red')
 
-        if index < len(self.slices):
-            z_val = self.slices[index].z0 if hasattr(self.slices[index],
-                                                     'z0') else index
-            self.ax.set_title(f'Layer {index + 1}: z = {z_val:.2f} mm')
+        self.gcode_evaluator.seek_layer(index)
+        self.ax.set_title(f'Layer {index + 1}/{len(layers)}: z = {layers.z[index]:.2f} mm, '
+                          f'{layers.extrusion[index]:.1f} mm extruded')
 
     def update_operation_lines(self, index):
-        if not hasattr(self.gcode_evaluator,
-                       'operations') or index < 0 or index >= len(
-                self.gcode_evaluator.operations):
+        if self.gcode_segments is None or index < 0 or index >= len(self.gcode_evaluator.operations):
             return
 
-        # If going backwards, reset everything and rebuild from scratch
-        if index < self.gcode_evaluator.index:
-            self.gcode_evaluator.index = 0
-            self.gcode_evaluator.reset()
-            # Clear all existing lines
-            for line_collection in self.visible_operation_lines.values():
-                if line_collection in self.ax.collections:
-                    line_collection.remove()
-            self.visible_operation_lines = {}
+        # The extruding moves of operations 0..index are the first op_segments[index + 1] segments,
+        # so a redraw costs the same however the slider got here
+        layers = self.gcode_evaluator.layers
+        drawn = layers.op_segments[index + 1]
+        layer = max(layers.layer_of(index), 0)
+        self.draw_lines(self.visible_polylines(self.gcode_segments, 0, layer, drawn), 'red')
 
-        line_width = self.line_width_slider.value()
-        alpha = self.alpha_slider.value() / 100.0
-
-        lines = []
-
-        # Execute operations up to the current index
-        while self.gcode_evaluator.index <= index:
-            current_op_index = self.gcode_evaluator.index
-
-            # Store the starting position
-            start_pos = np.array(self.gcode_evaluator.actual_position.copy())
-
-            # Execute the next command
-            self.gcode_evaluator.execute_next_command()
-
-            # Get the ending position
-            end_pos = np.array(self.gcode_evaluator.actual_position.copy())
-
-            # Check if we should draw this line (extruder on, movement occurred)
-            should_draw = True
-            if hasattr(self.gcode_evaluator, 'can_draw'):
-                should_draw = self.gcode_evaluator.can_draw()
-
-            # Only create new line collection if we don't already have one for this operation
-            if (should_draw and not np.array_equal(start_pos, end_pos) and
-                    current_op_index not in self.visible_operation_lines):
-                # Create line for this single operation
-                line = np.array([
-                    [start_pos[0], start_pos[1], start_pos[2]],
-                    [end_pos[0], end_pos[1], end_pos[2]]
-                ])
-
-                lines.append(line)
-
-
-        lc = Line3DCollection(lines, colors='red',
-                              linewidths=line_width, alpha=alpha)
-        self.ax.add_collection3d(lc)
-        self.visible_operation_lines[index] = lc
-
-        # Update the title with current operation info
-        current_op = index + 1
-        total_ops = len(self.gcode_evaluator.operations)
-
-        # Try to get current position for display
-        try:
-            pos = self.gcode_evaluator.actual_position
-            pos_str = f"X:{pos[0]:.1f} Y:{pos[1]:.1f} Z:{pos[2]:.1f}"
-            self.ax.set_title(f'Operation {current_op}/{total_ops} - {pos_str}')
-        except:
-            self.ax.set_title(f'Operation {current_op}/{total_ops}')
-
-        # Log progress for debugging
-        visible_lines = len(
-            [lc for lc in self.visible_operation_lines.values() if
-             lc in self.ax.collections])
-        self.log_status(
-            f"Op {current_op}/{total_ops}: {visible_lines} line segments visible")
+        self.gcode_evaluator.seek(index + 1)
+        pos = self.gcode_evaluator.actual_position
+        self.ax.set_title(f'Operation {index + 1}/{len(self.gcode_evaluator.operations)} - '
+                          f'X:{pos[0]:.1f} Y:{pos[1]:.1f} Z:{pos[2]:.1f}')
 
     def on_slider_changed(self, value):
+        # the label follows every value, the plot only the latest one when its frame is due
         self.update_current_info()
+        self.redraw_scheduler.request()
+
+    def render_frame(self):
+        if hasattr(self.slices, 'prefetch') and not self.draw_operation_lines:
+            self.slices.prefetch(self.navigation_slider.value())
         self.update_graphics()
 
     def update_current_info(self):
         current = self.navigation_slider.value()
         maximum = self.navigation_slider.maximum()
 
-        if self.draw_operation_lines:
+        if self.draw_operation_lines and self.gcode_by_layer:
+            self.current_info.setText(f"G-code Layer: {current + 1} / {maximum + 1}")
+        elif self.draw_operation_lines:
             self.current_info.setText(
                 f"Operation: {current + 1} / {maximum + 1}")
         else:
@@ -886,6 +1116,8 @@ class InfillVisualizer3D(QMainWindow):
 
     def start_autoplay(self):
         self.autoplay = True
+        self.autoplay_started = time.perf_counter()
+        self.autoplay_steps = 0
         self.autoplay_timer.start(self.step_duration)
         self.log_status("Auto-play started")
 
@@ -920,8 +1152,14 @@ class InfillVisualizer3D(QMainWindow):
 
         step_length = 1 if self.step_duration > 220 else 10 if self.step_duration > 120 else 100 if self.step_duration > 20 else 1000
 
+        # when frames take longer than a step, the steps that came due meanwhile are skipped over
+        # so playback keeps its speed instead of falling behind
+        due = int((time.perf_counter() - self.autoplay_started) * 1000 / self.step_duration)
+        steps = max(1, due - self.autoplay_steps)
+        self.autoplay_steps += steps
+
         if current < maximum:
-            self.navigation_slider.setValue(min(current + step_length, maximum))
+            self.navigation_slider.setValue(min(current + steps * step_length, maximum))
         else:
             self.autoplay = False
             self.autoplay_timer.stop()
@@ -935,6 +1173,15 @@ class InfillVisualizer3D(QMainWindow):
         self.show_all_previous = checked
         self.update_graphics()
 
+    def toggle_simplify_lower_layers(self, checked):
+        self.simplify_lower_layers = checked
+        self.update_graphics()
+
+    def toggle_gcode_by_layer(self, checked):
+        self.gcode_by_layer = checked
+        if self.filename and self.draw_operation_lines:
+            self.load_from_gcode()
+
     def toggle_show_infill(self, checked):
         self.draw_infill = checked
         self.update_graphics()
@@ -943,11 +1190,13 @@ class InfillVisualizer3D(QMainWindow):
         self.specify_height = self.thickness_radio.isChecked()
 
     def apply_all_settings(self):
-        self.apply_generation_settings()
-        self.apply_line_width()
-        self.apply_wall_count()
+        # every setting is taken first, then the model is sliced once with all of them
+        applied = [self.apply_generation_settings(reslice=False), self.apply_line_width(reslice=False),
+                   self.apply_wall_count(reslice=False)]
+        if any(applied) and self.filename:
+            self.regenerate()
 
-    def apply_generation_settings(self):
+    def apply_generation_settings(self, reslice=True):
         try:
             value = float(self.value_input.text())
             if value <= 0:
@@ -955,39 +1204,45 @@ class InfillVisualizer3D(QMainWindow):
 
             self.generation_num = value
             self.log_status(f"Applied setting: {value}")
-            if self.filename:
+            if reslice and self.filename:
                 self.regenerate()
+            return True
 
         except ValueError as e:
             self.log_status(f"Invalid value: {e}")
+            return False
 
-    def apply_line_width(self):
+    def apply_line_width(self, reslice=True):
         try:
             line_width = float(self.line_width_input.text())
             if line_width <= 0:
                 raise ValueError("Line width must be positive")
             self.line_width = line_width
             self.log_status(f"Applied line width: {line_width} mm")
-            if self.filename:
+            if reslice and self.filename:
                 self.regenerate()
+            return True
         except ValueError as e:
             self.log_status(f"Invalid line width: {e}")
+            return False
 
-    def apply_wall_count(self):
+    def apply_wall_count(self, reslice=True):
         try:
             wall_count = int(self.wall_count_input.text())
             if wall_count < 0:
                 raise ValueError("Wall count cannot be negative")
             self.wall_count = wall_count
             self.log_status(f"Applied wall count: {wall_count}")
-            if self.filename:
+            if reslice and self.filename:
                 self.regenerate()
+            return True
         except ValueError as e:
             self.log_status(f"Invalid wall count: {e}")
+            return False
 
 
     def update_line_properties(self):
-        self.update_graphics()
+        self.redraw_scheduler.request()
 
     def reset_camera(self):
         self.ax.view_init(elev=20, azim=45)
@@ -0,0 +1,157 @@
+import numpy as np
+
+from Rendering.LayerSegmentBuffer import LayerSegmentBuffer
+
+
+def point_segment_distances(points, starts, ends):
+    # distance from each point to the segment between its start and end
+    chords = ends - starts
+    lengths = (chords ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(lengths > 0, ((points - starts) * chords).sum(axis=1) / lengths, 0.0)
+    closest = starts + np.clip(t, 0.0, 1.0)[:, None] * chords
+    return np.sqrt(((points - closest) ** 2).sum(axis=1))
+
+
+def simplify_segments(segments, kinds, layer_starts, tolerance):
+    # Douglas-Peucker over every polyline of a packed segment range at once. Consecutive segments that join
+    # end to start, in the same layer and of the same kind, form a polyline. Each pass adds, in every
+    # interval between kept points, the point farthest from the interval's chord if it is beyond
+    # tolerance, for all intervals together. Returns the simplified segments, their kinds and layer starts.
+    count = len(segments)
+    layer_starts = np.asarray(layer_starts)
+    if count == 0:
+        return np.empty((0, 2, 3)), np.empty(0, dtype=np.int8), np.zeros(len(layer_starts) + 1, dtype=np.int64)
+
+    new_chain = np.ones(count, dtype=bool)
+    new_chain[1:] = (segments[1:, 0] != segments[:-1, 1]).any(axis=1) | (kinds[1:] != kinds[:-1])
+    new_chain[layer_starts[(layer_starts > 0) & (layer_starts < count)]] = True
+
+    # points of the polylines: each chain's first start, then every segment's end
+    chains_so_far = np.cumsum(new_chain)
+    end_rows = np.arange(count) + chains_so_far
+    chain_firsts = np.flatnonzero(new_chain)
+    start_rows = chain_firsts + chains_so_far[chain_firsts] - 1
+    points = np.empty((count + len(chain_firsts), 3))
+    points[end_rows] = segments[:, 1]
+    points[start_rows] = segments[chain_firsts, 0]
+    chain_of_point = np.cumsum(np.isin(np.arange(len(points)), start_rows)) - 1
+
+    kept = np.zeros(len(points), dtype=bool)
+    kept[start_rows] = True
+    kept[np.append(start_rows[1:] - 1, len(points) - 1)] = True # chain ends
+    pending = np.flatnonzero(~kept) # points of the intervals not yet within tolerance
+
+    while len(pending):
+        kept_rows = np.flatnonzero(kept)
+        after = np.searchsorted(kept_rows, pending)
+        intervals, following = kept_rows[after - 1], kept_rows[after]
+        distances = point_segment_distances(points[pending], points[intervals], points[following])
+        beyond = distances > tolerance
+        if not beyond.any():
+            break
+
+        # the farthest point of each interval with any point beyond tolerance
+        order = np.lexsort((-distances[beyond], intervals[beyond]))
+        split, first = np.unique(intervals[beyond][order], return_index=True)
+        kept[pending[beyond][order[first]]] = True
+
+        # only the points of the intervals just split can still be beyond tolerance
+        was_split = np.zeros(len(points), dtype=bool)
+        was_split[split] = True
+        pending = pending[was_split[intervals] & ~kept[pending]]
+
+    rows = np.flatnonzero(kept)
+    joined = chain_of_point[rows[1:]] == chain_of_point[rows[:-1]]
+    simplified = np.stack([points[rows[:-1][joined]], points[rows[1:][joined]]], axis=1)
+    chain_kinds = kinds[chain_firsts][chain_of_point[rows[:-1][joined]]]
+
+    # layer of each simplified segment from the layer of its chain
+    chain_layers = np.searchsorted(layer_starts, chain_firsts, side='right') - 1
+    segment_layers = chain_layers[chain_of_point[rows[:-1][joined]]]
+    starts = np.searchsorted(segment_layers, np.arange(len(layer_starts) + 1))
+    return simplified, chain_kinds, starts
+
+
+class LayerLOD:
+    # Simplified copies of a LayerSegmentBuffer at a few tolerances, for drawing layers away from the one
+    # being looked at. A layer is drawn at the coarsest level whose tolerance stays under
+    # pixel_size * (1 + distance / falloff), distance counted in layers from the current one, which is
+    # always drawn in full. If a frame still holds more than max_segments, the farthest layers are
+    # coarsened further and then left out until it fits.
+
+    def __init__(self, buffer, tolerances=(0.05, 0.2, 0.8), falloff=10, max_segments=200000):
+        self.buffer = buffer # level 0, the full detail segments
+        self.tolerances = tuple(tolerances) # mm, increasing
+        self.falloff = falloff # layers over which the allowed error doubles
+        self.max_segments = max_segments
+        self.levels = [LayerSegmentBuffer(buffer.kinds_kept) for _ in self.tolerances]
+
+    def update(self):
+        # simplify the layers appended to the buffer since the last update, all of them in one batch
+        done, total = len(self.levels[0]), len(self.buffer)
+        if done == total:
+            return
+
+        starts = np.asarray(self.buffer.starts[done:total + 1])
+        segments = self.buffer.points[starts[0]:starts[-1], :2]
+        kinds = self.buffer.kinds[starts[0]:starts[-1]]
+        for tolerance, level in zip(self.tolerances, self.levels):
+            simplified, simplified_kinds, simplified_starts = simplify_segments(
+                segments, kinds, starts[:-1] - starts[0], tolerance)
+            for layer in range(total - done):
+                a, b = simplified_starts[layer], simplified_starts[layer + 1]
+                level.append(simplified[a:b], simplified_kinds[a:b], self.buffer.z[done + layer])
+
+    def layer_counts(self):
+        # segments of every layer at every level, (levels + 1, layers)
+        return np.array([np.diff(level.starts) for level in [self.buffer] + self.levels])
+
+    def choose_levels(self, first, current, pixel_size):
+        # level of each layer first..current, -1 for layers left out
+        self.update()
+        layers = np.arange(first, current + 1)
+        distances = current - layers
+        allowed = pixel_size * (1 + distances / self.falloff)
+        tolerances = np.array((0.0,) + self.tolerances)
+        levels = np.searchsorted(tolerances, allowed, side='right') - 1
+        levels[distances == 0] = 0
+
+        counts = self.layer_counts()[:, first:current + 1]
+        columns = np.arange(len(layers))
+        farthest_first = np.argsort(-distances, kind='stable')[:-1] # never the current layer
+
+        # raise the farthest layers one level at a time until the frame fits
+        for level in range(1, len(tolerances)):
+            total = counts[levels, columns].sum()
+            if total <= self.max_segments:
+                return levels
+            raisable = farthest_first[levels[farthest_first] < level]
+            savings = np.cumsum(counts[levels[raisable], raisable] - counts[level, raisable])
+            needed = np.searchsorted(savings, total - self.max_segments) + 1
+            levels[raisable[:needed]] = level
+
+        # then drop the farthest layers
+        total = counts[levels, columns].sum()
+        if total > self.max_segments:
+            dropped = np.cumsum(counts[levels[farthest_first], farthest_first])
+            levels[farthest_first[:np.searchsorted(dropped, total - self.max_segments) + 1]] = -1
+        return levels
+
+    def level_polylines(self, layer, level):
+        # polylines of one layer at a level, none for a layer left out
+        if level < 0:
+            return []
+        buffer = self.buffer if level == 0 else self.levels[level - 1]
+        return buffer.layer_polylines(layer, layer)
+
+    def polylines(self, first, current, pixel_size, stop=None):
+        # NaN separated polylines for layers first..current at their chosen levels; with stop the
+        # current layer is drawn in full detail only up to segment stop of the buffer
+        levels = self.choose_levels(first, current, pixel_size)
+        polylines = []
+        for layer, level in zip(range(first, current), levels[:-1]):
+            polylines.extend(self.level_polylines(layer, level))
+        end = self.buffer.starts[current + 1] if stop is None else stop
+        polylines.extend(self.buffer.polylines(self.buffer.starts[current], end))
+        return polylines
@@ -0,0 +1,182 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+from GCode.GCodeParser import GCodeEvaluator
+from Rendering.LayerLOD import LayerLOD
+from Rendering.LayerSegmentBuffer import KIND_COLORS, LayerSegmentBuffer
+
+
+DPI = 100
+ISOMETRIC_ELEVATION = 35.264 # degrees, arctan(1 / sqrt(2))
+ISOMETRIC_AZIMUTH = -45
+
+
+def new_figure(size):
+    # a size x size pixel figure drawn by Agg, without pyplot or a GUI toolkit
+    figure = Figure(figsize=(size / DPI, size / DPI), dpi=DPI, facecolor='white')
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def render_layer(path, segments, kinds, z, bounds, size, line_width=0.8):
+    # top view of one layer to a PNG: segments (n, 2, 2) in x y, one NaN separated line per kind
+    figure = new_figure(size)
+    ax = figure.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    ax.set_aspect('equal')
+    (x_min, y_min), (x_max, y_max) = bounds
+    ax.set_xlim(x_min, x_max)
+    ax.set_ylim(y_min, y_max)
+
+    for kind in np.unique(kinds):
+        selected = segments[kinds == kind]
+        points = np.full((len(selected), 3, 2), np.nan)
+        points[:, :2] = selected
+        points = points.reshape(-1, 2)
+        ax.plot(points[:, 0], points[:, 1], color=KIND_COLORS[kind], linewidth=line_width)
+
+    ax.text(0.02, 0.98, f"z = {z:.2f} mm", transform=ax.transAxes, va='top', fontsize=8)
+    figure.savefig(path, dpi=DPI)
+    return path
+
+
+def render_overview(path, buffer, size, line_width=0.4):
+    # isometric view of every layer to a PNG, layers colored by height and simplified to what the
+    # image can show
+    figure = new_figure(size)
+    ax = figure.add_axes((0, 0, 1, 1), projection='3d', proj_type='ortho')
+    ax.set_axis_off()
+    ax.view_init(elev=ISOMETRIC_ELEVATION, azim=ISOMETRIC_AZIMUTH)
+
+    points = buffer.segments.reshape(-1, 3)
+    low, high = points.min(axis=0), points.max(axis=0)
+    extent = np.maximum(high - low, 1e-6)
+    ax.set_xlim(low[0], high[0])
+    ax.set_ylim(low[1], high[1])
+    ax.set_zlim(low[2], high[2])
+    ax.set_box_aspect(extent)
+
+    # every layer is seen equally, so the level depends on the image scale alone; the overview shows the
+    # whole part, so no layer is left out to keep under a segment budget
+    lod = LayerLOD(buffer, falloff=float('inf'), max_segments=np.inf)
+    top = len(buffer) - 1
+    levels = lod.choose_levels(0, top, np.linalg.norm(extent) / size)
+    polylines, layers = [], []
+    for layer, level in enumerate(levels):
+        layer_lines = lod.level_polylines(layer, level)
+        polylines.extend(layer_lines)
+        layers.extend([layer] * len(layer_lines))
+
+    colors = colormaps['viridis'](np.asarray(layers) / max(top, 1))
+    ax.add_collection3d(Line3DCollection(polylines, colors=colors, linewidths=line_width))
+    figure.savefig(path, dpi=DPI)
+    return path
+
+
+def layer_bounds(buffer, margin=0.05):
+    # x y bounds shared by every layer's image, so the previews line up
+    points = buffer.segments.reshape(-1, 3)
+    low, high = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+    center, half = (low + high) / 2, (high - low).max() * (0.5 + margin) + 1e-6
+    return center - half, center + half
+
+
+class LayerPreviewRenderer:
+    # PNG previews of a LayerSegmentBuffer without a window: a top view of each layer and an isometric
+    # overview of the part. Layers are rendered on a pool of processes, each getting only its layer's x y
+    # segments; the overview is rendered on the pool alongside them.
+
+    def __init__(self, buffer, size=512, workers=None):
+        self.buffer = buffer
+        self.size = size # pixels, width and height of every image
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+
+    @classmethod
+    def from_file(cls, file_name, layer_height=1.0, line_width=0.5, wall_count=3, size=512, workers=None):
+        # G-code (text, compressed or binary) is parsed, STL files are sliced first
+        if file_name.lower().endswith('.stl'):
+            from LayerSlicing.ZSlicer import ZSlicer
+            from Pipeline.SlicingPipeline import SlicingPipeline
+
+            z_slicer = ZSlicer()
+            if not SlicingPipeline(z_slicer).run(file_name, specify_height=True, num=layer_height,
+                                                 line_width=line_width, wall_count=wall_count):
+                return None
+            buffer = LayerSegmentBuffer()
+            for z_slice in z_slicer.get_slices():
+                buffer.append_slice(z_slice)
+        else:
+            evaluator = GCodeEvaluator()
+            evaluator.parse(file_name)
+            buffer = LayerSegmentBuffer.from_gcode(evaluator.layers, evaluator.trajectory, evaluator.memmap_dir)
+        return cls(buffer, size, workers)
+
+    def layer_tasks(self, output_dir, layers):
+        bounds = layer_bounds(self.buffer)
+        for layer in layers:
+            path = os.path.join(output_dir, f"layer_{layer + 1:04d}.png")
+            segments = self.buffer.layer_segments(layer)[:, :, :2].astype(np.float32)
+            yield (path, segments, self.buffer.layer_kinds(layer, layer).copy(), self.buffer.z[layer], bounds, self.size)
+
+    def render(self, output_dir, layers=None, overview=True):
+        # writes layer_0001.png ... and overview.png to output_dir, returns the paths written
+        if self.buffer.size == 0:
+            print("Nothing to render: no segments in any layer.")
+            return []
+
+        os.makedirs(output_dir, exist_ok=True)
+        layers = range(len(self.buffer)) if layers is None else layers
+        overview_path = os.path.join(output_dir, "overview.png")
+
+        if self.workers <= 1:
+            paths = [render_layer(*task) for task in self.layer_tasks(output_dir, layers)]
+            if overview:
+                paths.append(render_overview(overview_path, self.buffer, self.size))
+            return paths
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # the overview is the longest task, so it starts first
+            pending_overview = executor.submit(render_overview, overview_path, self.buffer, self.size) if overview else None
+            futures = [executor.submit(render_layer, *task) for task in self.layer_tasks(output_dir, layers)]
+            paths = [future.result() for future in futures]
+            if pending_overview is not None:
+                paths.append(pending_overview.result())
+        return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PNG previews of every layer and an isometric overview of a part.")
+    parser.add_argument("input_file", help="G-code (.gcode, .gz, .zst, .gbin) or an STL to slice first")
+    parser.add_argument("output_dir")
+    parser.add_argument("--size", type=int, default=512, help="Pixels, width and height of every image")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes rendering layers")
+    parser.add_argument("--every", type=int, default=1, help="Render every nth layer")
+    parser.add_argument("--no-overview", action="store_true")
+    parser.add_argument("--layer-height", type=float, default=1.0, help="For STL input")
+    parser.add_argument("--line-width", type=float, default=0.5, help="For STL input")
+    parser.add_argument("--wall-count", type=int, default=3, help="For STL input")
+    args = parser.parse_args(argv)
+
+    renderer = LayerPreviewRenderer.from_file(args.input_file, args.layer_height, args.line_width, args.wall_count,
+                                              size=args.size, workers=args.workers)
+    if renderer is None:
+        return 1
+
+    paths = renderer.render(args.output_dir, range(0, len(renderer.buffer), max(args.every, 1)),
+                            overview=not args.no_overview)
+    if not paths:
+        return 1
+    print(f"Wrote {len(paths)} images to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,160 @@
+import argparse
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 
+from Rendering.LayerSegmentBuffer import KIND_COLORS, KIND_NAMES, LayerSegmentBuffer
 
-class LayerRenderer:
-    def __init__(self, z_slicer):
-        self.z_slicer = z_slicer
-        self.plots = []
-        self.x_dim = np.empty(2)
-        self.y_dim = np.empty(2)
-
-
-    def render_all_slices(self):
-
-        # Determine overall x and y limits across all slices
-
-        for z_slice in self.z_slicer.get_slices():
-            if len(z_slice.vertices) == 0:
-                continue
-            x_coords = z_slice.vertices[:, 0]
-            y_coords = z_slice.vertices[:, 1]
-            self.x_dim = np.array([min(self.x_dim[0], np.min(x_coords)), max(self.x_dim[1], np.max(x_coords))]) \
-                if self.x_dim.size else np.array([np.min(x_coords), np.max(x_coords)])
-            self.y_dim = np.array([min(self.y_dim[0], np.min(y_coords)), max(self.y_dim[1], np.max(y_coords))]) \
-                if self.y_dim.size else np.array([np.min(y_coords), np.max(y_coords)])
-
-        for i in range(len(self.z_slicer.get_slices())):
-            self.render_slice(i)
-
-
-    def initialize_plot(self, z_slice):
-        # for the given z_slice, plots each vertex as a point, and draws lines between connected vertices
 
-        fig, ax = plt.subplots()
-        self.plots.append(ax)
+# layers moved by each navigation key
+LAYER_KEYS = {'right': 1, 'left': -1, 'up': 10, 'down': -10, 'pageup': 100, 'pagedown': -100}
 
-        ax.set_xlim(self.x_dim[0] - 1, self.x_dim[1] + 1)
-        ax.set_ylim(self.y_dim[0] - 1, self.y_dim[1] + 1)
-
-        z = z_slice.z0
-        ax.set_title(f'Z Slice at {z:.2f}')
-
-        for vertex in z_slice.vertices:
-            ax.plot(vertex[0], vertex[1], 'bo')
-
-        for edge in z_slice.edges:
-            v1 = z_slice.vertices[edge[0]]
-            v2 = z_slice.vertices[edge[1]]
-            ax.plot([v1[0], v2[0]], [v1[1], v2[1]], 'r-')
-
-        plt.show()
 
+class LayerRenderer:
+    # 2D inspector for the layers of a slicer or G-code file, in a single figure.
+    # A layer is one LineCollection holding one NaN separated polyline per segment kind, so contours,
+    # perimeters and infill each get their own color. Changing layers swaps the collection's segments
+    # and blits it over a background saved at the last full draw; the limits are fixed to the bounds of
+    # every layer, so the background stays valid.
+    # Arrow keys move one layer (left/right) or ten (down/up), page keys a hundred, home/end go to the
+    # first and last layer, and the scroll wheel moves one layer.
+
+    def __init__(self, z_slicer=None, buffer=None):
+        self.z_slicer = z_slicer
+        self.buffer = buffer # LayerSegmentBuffer, packed from the slicer's layers on first use if None
+        self.layer = 0
+        self.figure = None
+        self.ax = None
+        self.lines = None # the LineCollection of the shown layer
+        self.label = None
+        self.background = None # the axes without the layer, saved on every full draw
 
+    def render_all_slices(self):
+        # the inspector at the first layer, every other layer is a key press away
+        self.render_slice(0)
 
     def render_slice(self, index):
-        z_slice = self.z_slicer.get_slices()[index]
-
-        self.initialize_plot(z_slice)
-
-
+        if self.open(index):
+            plt.show()
+
+    def pack(self):
+        if self.buffer is None:
+            self.buffer = LayerSegmentBuffer()
+            for z_slice in self.z_slicer.get_slices():
+                self.buffer.append_slice(z_slice)
+        return self.buffer
+
+    def bounds(self, margin=1.0):
+        points = self.buffer.segments.reshape(-1, 3)
+        if len(points) == 0:
+            return (0, 1), (0, 1)
+        low, high = points[:, :2].min(axis=0) - margin, points[:, :2].max(axis=0) + margin
+        return (low[0], high[0]), (low[1], high[1])
+
+    def open(self, index=0):
+        # the figure and its artists, shown at layer index
+        buffer = self.pack()
+        if len(buffer) == 0:
+            print("No layers to show.")
+            return False
+
+        self.figure, self.ax = plt.subplots()
+        x_limits, y_limits = self.bounds()
+        self.ax.set_xlim(*x_limits)
+        self.ax.set_ylim(*y_limits)
+        self.ax.set_aspect('equal')
+        self.ax.set_xlabel('X (mm)')
+        self.ax.set_ylabel('Y (mm)')
+
+        kinds = sorted(set(buffer.kinds_kept) & set(np.unique(buffer.kinds[:buffer.size]).tolist()))
+        self.ax.legend(handles=[Line2D([], [], color=KIND_COLORS[kind], label=KIND_NAMES[kind]) for kind in kinds],
+                       loc='upper right')
+
+        # animated artists are left out of full draws and blitted over the saved background instead
+        self.lines = LineCollection([], linewidths=0.8, animated=True)
+        self.ax.add_collection(self.lines)
+        self.label = self.ax.text(0.02, 0.98, "", transform=self.ax.transAxes, va='top', animated=True)
+
+        self.figure.canvas.mpl_connect('draw_event', self.on_draw)
+        self.figure.canvas.mpl_connect('key_press_event', self.on_key)
+        self.figure.canvas.mpl_connect('scroll_event', self.on_scroll)
+        self.show_layer(index)
+        return True
+
+    def layer_polylines(self, layer):
+        # one NaN separated (3n, 2) polyline per kind present in the layer, with its color
+        start, stop = self.buffer.starts[layer], self.buffer.starts[layer + 1]
+        points, kinds = self.buffer.points[start:stop], self.buffer.kinds[start:stop]
+        polylines, colors = [], []
+        for kind in np.unique(kinds):
+            polylines.append(points[kinds == kind].reshape(-1, 3)[:, :2])
+            colors.append(KIND_COLORS[kind])
+        return polylines, colors
+
+    def show_layer(self, layer):
+        self.layer = min(max(layer, 0), len(self.buffer) - 1)
+        polylines, colors = self.layer_polylines(self.layer)
+        self.lines.set_segments(polylines)
+        self.lines.set_color(colors)
+        self.label.set_text(f"Layer {self.layer + 1}/{len(self.buffer)}: z = {self.buffer.z[self.layer]:.2f} mm, "
+                            f"{self.buffer.starts[self.layer + 1] - self.buffer.starts[self.layer]} segments")
+        self.blit()
+
+    def blit(self):
+        canvas = self.figure.canvas
+        if self.background is None or not canvas.supports_blit:
+            canvas.draw_idle() # the layer is drawn by on_draw
+            return
+        canvas.restore_region(self.background)
+        self.ax.draw_artist(self.lines)
+        self.ax.draw_artist(self.label)
+        canvas.blit(self.ax.bbox)
+
+    def on_draw(self, event):
+        # after a full draw (first show, resize, zoom) the background is saved again and the layer drawn on top
+        canvas = self.figure.canvas
+        if not canvas.supports_blit:
+            self.ax.draw_artist(self.lines)
+            self.ax.draw_artist(self.label)
+            return
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.lines)
+        self.ax.draw_artist(self.label)
+        canvas.blit(self.ax.bbox)
+
+    def on_key(self, event):
+        if event.key in LAYER_KEYS:
+            self.show_layer(self.layer + LAYER_KEYS[event.key])
+        elif event.key == 'home':
+            self.show_layer(0)
+        elif event.key == 'end':
+            self.show_layer(len(self.buffer) - 1)
+
+    def on_scroll(self, event):
+        self.show_layer(self.layer + (1 if event.button == 'up' else -1))
+
+
+def main(argv=None):
+    from Rendering.LayerPreviewRenderer import LayerPreviewRenderer
+
+    parser = argparse.ArgumentParser(description="Step through the layers of a G-code or STL file in a 2D view.")
+    parser.add_argument("input_file", help="G-code (.gcode, .gz, .zst, .gbin) or an STL to slice first")
+    parser.add_argument("--layer", type=int, default=1, help="Layer to open at, from 1")
+    parser.add_argument("--layer-height", type=float, default=1.0, help="For STL input")
+    parser.add_argument("--line-width", type=float, default=0.5, help="For STL input")
+    parser.add_argument("--wall-count", type=int, default=3, help="For STL input")
+    args = parser.parse_args(argv)
+
+    # the preview renderer already loads either kind of file into a segment buffer
+    previews = LayerPreviewRenderer.from_file(args.input_file, args.layer_height, args.line_width, args.wall_count)
+    if previews is None:
+        return 1
+    LayerRenderer(buffer=previews.buffer).render_slice(args.layer - 1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from GCode.GCodeStream import allocate_array
+
+
+# what a segment outlines or fills, stored per segment in LayerSegmentBuffer.kinds
+CONTOUR, PERIMETER, INFILL = 0, 1, 2
+KIND_NAMES = ('contour', 'perimeter', 'infill')
+KIND_COLORS = ('tab:blue', 'tab:red', 'tab:orange')
+# words of the ;TYPE: feature names that outline the part, every other feature fills it
+PERIMETER_FEATURES = ('wall', 'perimeter', 'skirt', 'brim')
+
+
+def edge_segments(vertices, edges):
+    # (E, 2, 3) segments of an indexed edge list, edges pointing past the vertices are skipped
+    vertices = np.asarray(vertices, dtype=float)
+    edges = np.asarray(edges, dtype=np.int64)
+    if vertices.size == 0 or edges.size == 0:
+        return np.empty((0, 2, 3))
+    vertices = vertices.reshape(len(vertices), -1)
+    edges = edges.reshape(-1, 2)
+    edges = edges[(edges < len(vertices)).all(axis=1)]
+    return vertices[edges]
+
+
+def ring_segments(rings, z):
+    # (E, 2, 3) segments along closed rings of 2D or 3D points, lifted to z where they are 2D
+    pieces = []
+    for ring in rings:
+        coords = np.asarray(ring.exterior.coords if isinstance(ring, Polygon) else ring, dtype=float)
+        if len(coords) < 2:
+            continue
+        if coords.shape[1] == 2:
+            coords = np.column_stack([coords, np.full(len(coords), z)])
+        if not np.array_equal(coords[0], coords[-1]):
+            coords = np.vstack([coords, coords[:1]])
+        pieces.append(np.stack([coords[:-1], coords[1:]], axis=1))
+    return np.concatenate(pieces) if pieces else np.empty((0, 2, 3))
+
+
+def slice_segments(z_slice, kinds=(CONTOUR, PERIMETER, INFILL)):
+    # segments of one ZSlice and the kind of each: the sliced contour, then perimeters, then infill
+    parts = []
+    if CONTOUR in kinds:
+        parts.append((edge_segments(z_slice.vertices, z_slice.edges), CONTOUR))
+
+    infill_slice = z_slice.infill_slice
+    if infill_slice is not None:
+        if PERIMETER in kinds:
+            parts.append((ring_segments(infill_slice.polygons, infill_slice.z0), PERIMETER))
+        if INFILL in kinds:
+            infill_vertices = np.asarray(infill_slice.infill_vertices, dtype=float)
+            if infill_vertices.ndim == 2 and infill_vertices.shape[1] == 2:
+                infill_vertices = np.column_stack([infill_vertices, np.full(len(infill_vertices), infill_slice.z0)])
+            parts.append((edge_segments(infill_vertices, infill_slice.infill_edges), INFILL))
+
+    if not parts:
+        return np.empty((0, 2, 3)), np.empty(0, dtype=np.int8)
+    segments = np.concatenate([segments for segments, _ in parts])
+    segment_kinds = np.concatenate([np.full(len(segments), kind, dtype=np.int8) for segments, kind in parts])
+    return segments, segment_kinds
+
+
+def feature_kinds(feature_names):
+    # PERIMETER or INFILL for each ;TYPE: feature name of a G-code file
+    return np.array([PERIMETER if any(word in name.lower() for word in PERIMETER_FEATURES) else INFILL
+                     for name in feature_names], dtype=np.int8)
+
+
+def empty_points(capacity):
+    points = np.empty((capacity, 3, 3))
+    points[:, 2] = np.nan
+    return points
+
+
+class LayerSegmentBuffer:
+    # Every layer's segments packed one after another in a single array, with the kind of each segment
+    # and where each layer starts, so any run of consecutive layers is one slice of the array.
+    # Each segment is stored as start, end and a NaN point: a layer's rows flattened are one polyline
+    # that matplotlib draws as a single path broken at the NaNs, instead of one path per segment.
+    # Layers are appended in order; the arrays double when full, like GCodeStream's ColumnBuffer.
+
+    def __init__(self, kinds=(CONTOUR, PERIMETER, INFILL), capacity=1 << 14):
+        self.kinds_kept = tuple(kinds) # segment kinds taken from each slice
+        self.size = 0
+        self.points = empty_points(capacity)
+        self.kinds = np.empty(capacity, dtype=np.int8)
+        self.starts = [0] # first segment of every layer, plus the end of the last one
+        self.z = []
+
+    def __len__(self):
+        return len(self.z)
+
+    @classmethod
+    def from_gcode(cls, layers, trajectory, directory=None, chunk_segments=1 << 18):
+        # every extruding move of a parsed G-code file, from its GCodeLayers and GCodeTrajectory, copied
+        # chunk_segments at a time; with a directory (the GCodeEvaluator's memmap_dir) the packed arrays are
+        # memory mapped from temporary files in it like the parsed arrays. Moves under a wall, skirt or brim
+        # ;TYPE: are perimeters, the rest (and files without types) infill
+        count = len(layers.segments)
+        buffer = cls((PERIMETER, INFILL), capacity=1)
+        buffer.points = allocate_array((max(count, 1), 3, 3), np.float64, directory)
+        buffer.kinds = allocate_array(max(count, 1), np.int8, directory)
+        kinds = np.append(feature_kinds(trajectory.feature_names), INFILL) # feature -1 takes the last entry
+
+        for start in range(0, count, chunk_segments):
+            stop = min(start + chunk_segments, count)
+            buffer.points[start:stop, :2] = layers.segments[start:stop]
+            buffer.points[start:stop, 2] = np.nan
+            # the operation drawing each segment, the last one whose first segment is at or before it
+            ops = np.searchsorted(layers.op_segments, np.arange(start, stop), side='right') - 1
+            buffer.kinds[start:stop] = kinds[trajectory.feature[ops]]
+
+        buffer.size = count
+        buffer.starts = [int(start) for start in layers.segment_starts]
+        buffer.z = [float(z) for z in layers.z]
+        return buffer
+
+    @property
+    def segments(self):
+        # (M, 2, 3) view of every packed segment
+        return self.points[:self.size, :2]
+
+    def append(self, segments, kinds, z):
+        needed = self.size + len(segments)
+        if needed > len(self.points):
+            capacity = len(self.points)
+            while capacity < needed:
+                capacity *= 2
+            grown_points = empty_points(capacity)
+            grown_points[:self.size] = self.points[:self.size]
+            grown_kinds = np.empty(capacity, dtype=np.int8)
+            grown_kinds[:self.size] = self.kinds[:self.size]
+            self.points, self.kinds = grown_points, grown_kinds
+
+        self.points[self.size:needed, :2] = segments
+        self.kinds[self.size:needed] = kinds
+        self.size = needed
+        self.starts.append(needed)
+        self.z.append(z)
+
+    def append_slice(self, z_slice):
+        self.append(*slice_segments(z_slice, self.kinds_kept), z_slice.z0)
+
+    def layer_range(self, first, last):
+        # (n, 2, 3) segments of layers first..last inclusive, a view into the packed array
+        return self.points[self.starts[first]:self.starts[last + 1], :2]
+
+    def layer_kinds(self, first, last):
+        return self.kinds[self.starts[first]:self.starts[last + 1]]
+
+    def layer_segments(self, layer):
+        return self.layer_range(layer, layer)
+
+    def layer_polylines(self, first, last):
+        # one NaN separated (3n, 3) polyline per layer first..last, views for LineCollection.set_segments
+        return self.polylines(self.starts[first], self.starts[last + 1])
+
+    def polylines(self, start, stop):
+        # segments start..stop-1 as NaN separated polylines, split where layers begin
+        cuts = [start] + self.starts[bisect_right(self.starts, start):bisect_left(self.starts, stop)] + [stop]
+        return [self.points[a:b].reshape(-1, 3) for a, b in zip(cuts[:-1], cuts[1:])]
+
+
+class LayerSegmentSlots:
+    # Segments of layers that become available in any order, one slot per layer index, for on-demand
+    # slicing where only some layers are computed at a time. A slot holds the layer's segments in the
+    # same NaN separated (n, 3, 3) layout as LayerSegmentBuffer, so each layer is still one polyline.
+    # Slots are dropped when their layer leaves the slice cache, so they take no more memory than it.
+
+    def __init__(self, kinds=(CONTOUR, PERIMETER, INFILL)):
+        self.kinds_kept = tuple(kinds)
+        self.points = {} # layer -> (n, 3, 3) segments with the NaN row
+        self.z = {}
+
+    def __contains__(self, layer):
+        return layer in self.points
+
+    def __len__(self):
+        return len(self.points)
+
+    def layers(self):
+        return list(self.points)
+
+    def set_slice(self, layer, z_slice):
+        segments, _ = slice_segments(z_slice, self.kinds_kept)
+        points = empty_points(len(segments))
+        points[:, :2] = segments
+        self.points[layer] = points
+        self.z[layer] = z_slice.z0
+
+    def discard(self, layer):
+        self.points.pop(layer, None)
+        self.z.pop(layer, None)
+
+    def layer_polylines(self, first, last):
+        # one polyline per filled layer first..last, the missing ones are skipped
+        return [self.points[layer].reshape(-1, 3) for layer in range(first, last + 1) if layer in self.points]
@@ -0,0 +1,33 @@
+import time
+
+from PyQt5.QtCore import QTimer
+
+
+class RedrawScheduler:
+    # Coalesces redraw requests into frames: every request made before the next frame is due ends in one
+    # call of render, which draws the state current by then, so a dragged slider never queues up frames
+    # for the values it passed. Frames start at most fps times a second, from a single-shot QTimer that
+    # lets Qt handle the input events in between.
+
+    def __init__(self, render, fps=30):
+        self.render = render
+        self.frame_interval = 1.0 / fps # seconds
+        self.last_start = -float('inf')
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run)
+
+    def request(self):
+        # a frame at the next free slot; requests while one is pending join it
+        if self.timer.isActive():
+            return
+        wait = self.last_start + self.frame_interval - time.perf_counter()
+        self.timer.start(int(max(0.0, wait) * 1000))
+
+    def run(self):
+        self.timer.stop()
+        self.last_start = time.perf_counter()
+        self.render()
+
+    def cancel(self):
+        self.timer.stop()
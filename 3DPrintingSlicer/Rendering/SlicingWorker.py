@@ -0,0 +1,51 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from Pipeline.SlicingPipeline import SlicingCancelled
+
+
+class SlicingWorker(QThread):
+    progress = pyqtSignal(int, int) # layers done, total layers
+    layer_ready = pyqtSignal(int, object) # layer index, finished ZSlice with its infill_slice
+    completed = pyqtSignal(bool) # False if the slicing settings were rejected
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, pipeline, file_name, specify_height, num, line_width, wall_count):
+        super().__init__()
+        self.pipeline = pipeline
+        self.file_name = file_name
+        self.specify_height = specify_height
+        self.num = num
+        self.line_width = line_width
+        self.wall_count = wall_count
+        self.cancel_requested = False
+
+    def cancel(self):
+        # checked between layers, the layer in progress is finished first
+        self.cancel_requested = True
+
+    def run(self):
+        try:
+            finished = self.pipeline.run(
+                self.file_name,
+                specify_height=self.specify_height,
+                num=self.num,
+                line_width=self.line_width,
+                wall_count=self.wall_count,
+                progress=self.on_layer_done
+            )
+        except SlicingCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+
+        self.completed.emit(finished)
+
+    def on_layer_done(self, done, total, z_slice):
+        if self.cancel_requested:
+            raise SlicingCancelled()
+
+        self.layer_ready.emit(done - 1, z_slice)
+        self.progress.emit(done, total)
@@ -4,6 +4,7 @@ from PyQt5.QtWidgets import QApplication
 
 from Rendering.InfillVisualizer3D import InfillVisualizer3D
 from LayerSlicing.ZSlicer import ZSlicer
+from GCode.GCodeCache import GCodeCache
 from GCode.GCodeParser import GCodeEvaluator
 
 def main():
@@ -12,7 +13,7 @@ def main():
     app.setStyle('Fusion')
 
     z_slicer = ZSlicer()
-    gcode_evaluator = GCodeEvaluator()
+    gcode_evaluator = GCodeEvaluator(cache=GCodeCache(cache_dir=".gcode_cache"))
 
     window = InfillVisualizer3D(z_slicer, gcode_evaluator)
     window.show()